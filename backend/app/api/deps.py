@@ -0,0 +1,37 @@
+from fastapi import HTTPException, Request
+from app.features.chat_pdf.rag_engine import RAGEngine
+from app.features.chat_pdf.async_rag_engine import AsyncRAGEngine
+from app.features.chat_pdf.ingestion_queue import IngestionQueue
+from app.features.chat_pdf.conversation_store import ConversationStore
+
+
+def get_rag_engine(request: Request) -> RAGEngine:
+    """The engine created by the app lifespan"""
+    engine = getattr(request.app.state, "rag_engine", None)
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Service is starting up")
+    return engine
+
+
+def get_async_rag_engine(request: Request) -> AsyncRAGEngine:
+    """The async engine created by the app lifespan, for handlers running on the event loop"""
+    engine = getattr(request.app.state, "async_rag_engine", None)
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Service is starting up")
+    return engine
+
+
+def get_ingestion_queue(request: Request) -> IngestionQueue:
+    """The ingestion queue created by the app lifespan"""
+    ingestion_queue = getattr(request.app.state, "ingestion_queue", None)
+    if ingestion_queue is None:
+        raise HTTPException(status_code=503, detail="Service is starting up")
+    return ingestion_queue
+
+
+def get_conversation_store(request: Request) -> ConversationStore:
+    """The conversation store created by the app lifespan"""
+    conversation_store = getattr(request.app.state, "conversation_store", None)
+    if conversation_store is None:
+        raise HTTPException(status_code=503, detail="Service is starting up")
+    return conversation_store
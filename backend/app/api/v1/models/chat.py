@@ -1,13 +1,87 @@
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None  # conversation to continue; omitted = start a new one
 
 class ChatResponse(BaseModel):
     reply: str
+    session_id: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    prompt_tokens_saved: Optional[int] = None  # by merging overlapping chunks and the context budget
 
 class UploadResponse(BaseModel):
     message: str
     filename: str
-    chunks_count: int
\ No newline at end of file
+    chunks_count: int
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+
+class JobResponse(BaseModel):
+    job_id: str
+    filename: str
+    doc_id: Optional[str] = None
+    matter: Optional[str] = None
+    status: str
+    message: Optional[str] = None
+    stages: Dict[str, str]
+    chunks_count: int = 0
+    chunks_embedded: int = 0
+    chunks_inserted: int = 0
+    new_chunks: int = 0
+    deduplicated_chunks: int = 0
+    removed_chunks: int = 0
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class JobListResponse(BaseModel):
+    jobs: List[JobResponse]
+
+class DocumentResponse(BaseModel):
+    doc_id: str
+    doc_hash: str
+    filename: Optional[str] = None
+    chunks_count: int
+    created_at: float
+
+class DocumentListResponse(BaseModel):
+    documents: List[DocumentResponse]
+    total: int
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = 5
+    mode: Optional[str] = None  # vector, lexical, hybrid or auto; defaults to SEARCH_MODE
+    filter_conditions: Optional[Dict[str, str]] = None
+
+class SearchResult(BaseModel):
+    id: Optional[Any] = None
+    text: str
+    metadata: Dict[str, Any]
+    score: float
+    distance: Optional[float] = None
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    mode: str
+    cached: bool
+    timings_ms: Dict[str, float]
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 5
+    mode: Optional[str] = None
+    filter_conditions: Optional[Dict[str, str]] = None  # Applied to every query
+    filters: Optional[List[Optional[Dict[str, str]]]] = None  # One per query; overrides filter_conditions
+
+class BatchSearchItem(BaseModel):
+    query: str
+    results: List[SearchResult]
+    mode: str
+    cached: bool
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchItem]
+    timings_ms: Dict[str, float]
\ No newline at end of file
@@ -1,99 +1,224 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.api.v1.models.chat import ChatRequest, ChatResponse, UploadResponse
+import logging
+import json
+import os
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.api.v1.models.chat import (
+    ChatRequest, ChatResponse, UploadResponse, JobResponse, JobListResponse, SearchRequest, SearchResponse,
+    BatchSearchRequest, BatchSearchItem, BatchSearchResponse, DocumentResponse, DocumentListResponse
+)
 from app.features.chat_pdf.rag_engine import RAGEngine
+from app.features.chat_pdf.async_rag_engine import AsyncRAGEngine
+from app.features.chat_pdf.ingestion_queue import IngestionQueue, QueueFullError
+from app.features.chat_pdf.conversation_store import ConversationStore, new_session_id
+from app.api.deps import get_rag_engine, get_async_rag_engine, get_ingestion_queue, get_conversation_store
 from app.core.config import settings
+from app.utils.uploads import UploadTooLargeError, spool_upload
 
-router = APIRouter()
-
-# Initialize RAG engine
-rag_engine = RAGEngine()
+logger = logging.getLogger(__name__)
 
-# Store conversation history per session (in production, use Redis or similar)
-conversation_history = []
+router = APIRouter()
 
-@router.post("/uploadfile", response_model=UploadResponse)
-async def upload_file(file: UploadFile = File(...)):
+@router.post("/uploadfile", response_model=UploadResponse, status_code=202)
+async def upload_file(file: UploadFile = File(...), doc_id: Optional[str] = Form(None),
+                      matter: Optional[str] = Form(None),
+                      ingestion_queue: IngestionQueue = Depends(get_ingestion_queue)):
+    file_path = None
     try:
-        # Check file size from settings
-        MAX_FILE_SIZE = settings.MAX_FILE_SIZE
-        
-        # Read file content
-        file_content = await file.read()
-        
-        # Check if file size exceeds limit
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413, 
-                detail=f"File size exceeds maximum allowed size of 1MB. Your file is {len(file_content) / (1024 * 1024):.2f}MB"
-            )
-        
         file_extension = file.filename.split('.')[-1].lower()
         
-        # Process and index the document using RAG engine
-        result = rag_engine.upload_and_index_document(
-            file_bytes=file_content,
-            file_type=file_extension,
-            filename=file.filename
+        # Copy the upload to a file of our own a chunk at a time, checking the size as it goes,
+        # so even large filings are never held in memory whole
+        file_path, _ = await run_in_threadpool(
+            spool_upload,
+            file.file,
+            settings.MAX_FILE_SIZE,
+            suffix=f".{file_extension}" if file_extension.isalnum() else "",
+            directory=settings.UPLOAD_DIR,
+            chunk_size=settings.UPLOAD_CHUNK_SIZE
         )
         
-        if not result["success"]:
-            raise HTTPException(status_code=400, detail=result["message"])
+        # Queue the document for processing and indexing by the RAG engine; the job deletes the file
+        job = ingestion_queue.submit(
+            file_path=file_path,
+            file_type=file_extension,
+            filename=file.filename,
+            doc_id=doc_id,  # Replaces that document, re-embedding only changed chunks
+            matter=matter
+        )
+        file_path = None
         
         return UploadResponse(
-            message=result["message"],
+            message=job.message,
             filename=file.filename,
-            chunks_count=result.get("chunks_count", 0)
+            chunks_count=0,
+            job_id=job.job_id,
+            status=job.status
         )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"Error processing file: {e}")
+        logger.exception("Error processing file: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to process file: {e}")
+    finally:
+        if file_path is not None:
+            os.remove(file_path)
+
+
+@router.get("/jobs", response_model=JobListResponse)
+async def list_jobs(ingestion_queue: IngestionQueue = Depends(get_ingestion_queue)):
+    """List recent ingestion jobs, oldest first"""
+    return JobListResponse(jobs=[JobResponse(**job.to_dict()) for job in ingestion_queue.list_jobs()])
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, ingestion_queue: IngestionQueue = Depends(get_ingestion_queue)):
+    """Get the status and per-stage progress of an ingestion job"""
+    job = ingestion_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return JobResponse(**job.to_dict())
 
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    global conversation_history
+async def chat(request: ChatRequest, rag_engine: AsyncRAGEngine = Depends(get_async_rag_engine),
+               conversation_store: ConversationStore = Depends(get_conversation_store)):
+    # A chat without a session id starts a conversation of its own; the reply carries the new id
+    session_id = request.session_id or new_session_id()
     try:
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": request.message})
-        
-        # Get response from RAG engine
-        response = rag_engine.chat_with_context(
+        # Get response from RAG engine, with the session's history trimmed to its token budget.
+        # The engine awaits its network calls, so the event loop serves other chats meanwhile;
+        # the conversation store may be Redis, so it is called on a worker thread
+        response = await rag_engine.chat(
             query=request.message,
             top_k=5,
-            conversation_history=conversation_history[:-1]  # Exclude current message
+            conversation_history=await run_in_threadpool(conversation_store.get_history, session_id)
         )
         
-        # Add assistant response to history
-        conversation_history.append({"role": "assistant", "content": response})
+        # Add the exchange to the session's history
+        await run_in_threadpool(conversation_store.append, session_id, [
+            {"role": "user", "content": request.message},
+            {"role": "assistant", "content": response["reply"]}
+        ])
         
-        # Keep only last N messages to prevent context overflow
-        if len(conversation_history) > settings.MAX_CONVERSATION_HISTORY:
-            conversation_history = conversation_history[-settings.MAX_CONVERSATION_HISTORY:]
-        
-        return ChatResponse(reply=response)
+        return ChatResponse(session_id=session_id, **response)
         
     except Exception as e:
-        print(f"Error processing chat request: {e}")
-        return ChatResponse(reply="Sorry, I am currently unable to process your request. Please try again later.")
+        logger.exception("Error processing chat request: %s", e)
+        return ChatResponse(reply="Sorry, I am currently unable to process your request. Please try again later.",
+                            session_id=session_id)
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, rag_engine: AsyncRAGEngine = Depends(get_async_rag_engine),
+                      conversation_store: ConversationStore = Depends(get_conversation_store)):
+    """Chat with documents, streaming the session id, the sources and then the reply tokens as server-sent events
+
+    Without a session_id a new conversation starts, and its id is sent first.
+    """
+    session_id = request.session_id or new_session_id()
+    
+    async def event_stream():
+        yield f"event: session\ndata: {json.dumps({'event': 'session', 'session_id': session_id})}\n\n"
+        async for event in rag_engine.stream_chat_with_context(
+            query=request.message,
+            top_k=5,
+            conversation_history=await run_in_threadpool(conversation_store.get_history, session_id)
+        ):
+            if event["event"] == "done":
+                # Update history only once the full reply is known
+                await run_in_threadpool(conversation_store.append, session_id, [
+                    {"role": "user", "content": request.message},
+                    {"role": "assistant", "content": event["reply"]}
+                ])
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/search", response_model=SearchResponse)
+async def search(request: SearchRequest, rag_engine: AsyncRAGEngine = Depends(get_async_rag_engine)):
+    """Retrieve chunks without generating a reply, reporting the retrieval path and its latency"""
+    try:
+        return SearchResponse(**await rag_engine.search_chunks(
+            query=request.query,
+            top_k=request.top_k,
+            filter_conditions=request.filter_conditions,
+            mode=request.mode
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+def search_batch(request: BatchSearchRequest, rag_engine: RAGEngine = Depends(get_rag_engine)):
+    """Retrieve chunks for many queries with one embedding request and one vector search"""
+    if len(request.queries) > settings.MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.MAX_BATCH_QUERIES} queries are allowed per batch"
+        )
+    try:
+        batch = rag_engine.search_chunks_batch(
+            queries=request.queries,
+            top_k=request.top_k,
+            filter_conditions=request.filters if request.filters is not None else request.filter_conditions,
+            mode=request.mode
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return BatchSearchResponse(
+        results=[BatchSearchItem(query=query, **response)
+                 for query, response in zip(request.queries, batch["responses"])],
+        timings_ms=batch["timings_ms"]
+    )
 
 @router.get("/stats")
-async def get_stats():
+def get_stats(rag_engine: RAGEngine = Depends(get_rag_engine),
+              conversation_store: ConversationStore = Depends(get_conversation_store)):
     """Get statistics about the document database"""
     try:
         stats = rag_engine.get_stats()
+        stats["conversations"] = conversation_store.stats()
         return stats
     except Exception as e:
         return {"error": str(e)}
 
+@router.delete("/conversations/{session_id}")
+def delete_conversation(session_id: str, conversation_store: ConversationStore = Depends(get_conversation_store)):
+    """Forget one session's conversation history"""
+    conversation_store.delete(session_id)
+    return {"success": True, "message": f"Conversation '{session_id}' cleared"}
+
+@router.get("/documents", response_model=DocumentListResponse)
+def list_documents(limit: int = 100, offset: int = 0, rag_engine: RAGEngine = Depends(get_rag_engine)):
+    """List indexed documents, oldest first"""
+    listing = rag_engine.list_documents(limit=max(1, min(limit, 1000)), offset=max(0, offset))
+    return DocumentListResponse(documents=[DocumentResponse(**document) for document in listing["documents"]],
+                                total=listing["total"])
+
+@router.delete("/documents/{doc_id}")
+def delete_document(doc_id: str, rag_engine: RAGEngine = Depends(get_rag_engine)):
+    """Delete one document and the chunks only it referenced"""
+    result = rag_engine.delete_document(doc_id)
+    if result.get("found") is False:
+        raise HTTPException(status_code=404, detail=result["message"])
+    return result
+
 @router.delete("/clear")
-async def clear_documents():
+def clear_documents(rag_engine: RAGEngine = Depends(get_rag_engine),
+                    conversation_store: ConversationStore = Depends(get_conversation_store)):
     """Clear all documents from the database"""
-    global conversation_history
     try:
         result = rag_engine.clear_all_documents()
-        conversation_history = []  # Reset conversation history
+        conversation_store.clear()  # Reset every conversation
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,325 @@
+import logging
+import asyncio
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, Optional
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free within the acquire timeout"""
+
+
+class HTTPPoolMonitor:
+    """Counts requests in flight through an HTTP client, via its event hooks
+
+    A request counts from when it is sent, including time spent waiting for a
+    free pooled connection, until its response headers arrive, so a saturation
+    above 1.0 means requests are queueing for connections. Requests that fail
+    without a response stop counting once the client timeout has passed.
+    """
+
+    def __init__(self, max_connections: int, timeout: float = 60.0):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.peak_in_flight = 0
+        self.requests = 0
+        self._pending: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def on_request(self, request):
+        with self._lock:
+            self._pending[id(request)] = time.monotonic()
+            self.requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, len(self._pending))
+
+    def on_response(self, response):
+        with self._lock:
+            self._pending.pop(id(response.request), None)
+
+    async def on_request_async(self, request):
+        self.on_request(request)
+
+    async def on_response_async(self, response):
+        self.on_response(response)
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            expired = time.monotonic() - self.timeout
+            for key in [key for key, started in self._pending.items() if started < expired]:
+                del self._pending[key]
+            return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        in_flight = self.in_flight
+        return {
+            "max_connections": self.max_connections,
+            "in_flight": in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "saturation": round(in_flight / self.max_connections, 3)
+        }
+
+
+class BackgroundLoop:
+    """An asyncio event loop on a daemon thread, for running coroutines from sync code
+
+    Async clients are bound to the loop they are used on; running every call on
+    this one loop lets a single AsyncOpenAI client and its connections be reused.
+    """
+
+    def __init__(self, name: str = "async-clients"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro):
+        """Run a coroutine on the loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def stop(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+        self.loop.close()
+
+
+class MilvusConnectionPool:
+    """Fixed-size pool of MilvusClient connections, opened lazily on first use"""
+
+    def __init__(self, factory: Callable[[], Any], size: int = 4, acquire_timeout: float = 10.0):
+        self.factory = factory
+        self.size = max(1, size)
+        self.acquire_timeout = acquire_timeout
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.peak_in_use = 0
+        self.timeouts = 0
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Check out a client for the duration of the with block"""
+        client = self._acquire()
+        try:
+            yield client
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._idle.put(client)
+
+    def _acquire(self):
+        with self._lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            open_new = self._idle.empty() and self._opened < self.size
+            if open_new:
+                self._opened += 1
+        if open_new:
+            try:
+                return self.factory()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                    self.in_use -= 1
+                raise
+
+        with self._lock:
+            self.waiting += 1
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            with self._lock:
+                self.in_use -= 1
+                self.timeouts += 1
+            raise PoolTimeoutError(f"No Milvus connection free after {self.acquire_timeout}s")
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def proxy(self) -> "_PooledClientProxy":
+        """A client-like object whose every method call runs on a checked-out connection"""
+        return _PooledClientProxy(self)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "peak_in_use": self.peak_in_use,
+                "timeouts": self.timeouts,
+                "saturation": round(self.in_use / self.size, 3)
+            }
+
+    def close(self):
+        while not self._idle.empty():
+            client = self._idle.get_nowait()
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning("Error closing Milvus connection: %s", e)
+
+
+class _PooledClientProxy:
+    def __init__(self, pool: MilvusConnectionPool):
+        self._pool = pool
+
+    def __getattr__(self, name: str):
+        def call(*args, **kwargs):
+            with self._pool.connection() as client:
+                return getattr(client, name)(*args, **kwargs)
+        return call
+
+
+class ServiceClients:
+    """Process-wide clients shared by every request and ingestion job
+
+    One sync OpenAI client for chat and query embeddings, one AsyncOpenAI client
+    for batch embedding (run on a background loop), one AsyncOpenAI client for
+    the server's own event loop (async chat), each over a bounded keep-alive
+    connection pool, and a pool of Milvus connections.
+
+    The OpenAI clients are built, and the SDK imported, on first use, and Milvus
+    connections are opened on first use, so creating this object is cheap.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 max_connections: int = 20, max_keepalive: int = 10, timeout: float = 60.0,
+                 milvus_uri: Optional[str] = None, milvus_token: Optional[str] = None,
+                 milvus_pool_size: int = 4, milvus_pool_timeout: float = 10.0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self._lock = threading.Lock()
+        self._openai = None
+        self._async_openai = None
+        self._serving_openai = None
+
+        self.openai_monitor = HTTPPoolMonitor(max_connections, timeout)
+        self.loop = BackgroundLoop()
+        self.async_openai_monitor = HTTPPoolMonitor(max_connections, timeout)
+        self.serving_openai_monitor = HTTPPoolMonitor(max_connections, timeout)
+
+        self.milvus_pool = None
+        if milvus_uri:
+            def open_milvus():
+                from pymilvus import MilvusClient
+                return MilvusClient(uri=milvus_uri, token=milvus_token)
+            self.milvus_pool = MilvusConnectionPool(open_milvus, milvus_pool_size, milvus_pool_timeout)
+
+        self.started_at = time.time()
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive)
+
+    @property
+    def openai(self) -> "OpenAI":
+        with self._lock:
+            if self._openai is None:
+                from openai import OpenAI, DefaultHttpxClient
+                self._openai = OpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    http_client=DefaultHttpxClient(
+                        limits=self._limits(),
+                        timeout=self.timeout,
+                        event_hooks={"request": [self.openai_monitor.on_request],
+                                     "response": [self.openai_monitor.on_response]}
+                    )
+                )
+            return self._openai
+
+    @property
+    def async_openai(self) -> "AsyncOpenAI":
+        """For batch embedding; only use it on self.loop"""
+        with self._lock:
+            if self._async_openai is None:
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+                # Retries are handled by EmbeddingScheduler, so the client's own retry loop is disabled
+                self._async_openai = AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    max_retries=0,
+                    http_client=DefaultAsyncHttpxClient(
+                        limits=self._limits(),
+                        timeout=self.timeout,
+                        event_hooks={"request": [self.async_openai_monitor.on_request_async],
+                                     "response": [self.async_openai_monitor.on_response_async]}
+                    )
+                )
+            return self._async_openai
+
+    @property
+    def serving_openai(self) -> "AsyncOpenAI":
+        """Binds to the event loop of its first request: only use it from the server's loop,
+        and close it there with aclose()"""
+        with self._lock:
+            if self._serving_openai is None:
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+                self._serving_openai = AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    http_client=DefaultAsyncHttpxClient(
+                        limits=self._limits(),
+                        timeout=self.timeout,
+                        event_hooks={"request": [self.serving_openai_monitor.on_request_async],
+                                     "response": [self.serving_openai_monitor.on_response_async]}
+                    )
+                )
+            return self._serving_openai
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "openai": self.openai_monitor.stats(),
+            "async_openai": self.async_openai_monitor.stats(),
+            "serving_openai": self.serving_openai_monitor.stats()
+        }
+        if self.milvus_pool is not None:
+            stats["milvus"] = self.milvus_pool.stats()
+        return stats
+
+    async def aclose(self):
+        """Close the serving-loop client; call from that loop before close()"""
+        if self._serving_openai is not None:
+            await self._serving_openai.close()
+
+    def close(self):
+        if self._openai is not None:
+            self._openai.close()
+        if self._serving_openai is not None and not self._serving_openai.is_closed():
+            # Never used from a server loop (e.g. in scripts), so it holds no connections
+            self.loop.run(self._serving_openai.close())
+        if self._async_openai is not None:
+            self.loop.run(self._async_openai.close())
+        self.loop.stop()
+        if self.milvus_pool is not None:
+            self.milvus_pool.close()
+
+
+def create_service_clients() -> ServiceClients:
+    """Build the shared clients from settings"""
+    return ServiceClients(
+        api_key=settings.OPENAI_API_KEY or None,
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive=settings.OPENAI_MAX_KEEPALIVE,
+        timeout=settings.OPENAI_TIMEOUT,
+        milvus_uri=settings.MILVUS_HOST if settings.VECTOR_STORE_BACKEND.lower() == "milvus" else None,
+        milvus_token=settings.MILVUS_TOKEN or None,
+        milvus_pool_size=settings.MILVUS_POOL_SIZE,
+        milvus_pool_timeout=settings.MILVUS_POOL_TIMEOUT
+    )
@@ -16,19 +16,94 @@ class Settings(BaseSettings):
     # OpenAI Settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL: str = "gpt-4-turbo"
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+    EMBEDDING_BATCH_TOKENS: int = int(os.getenv("EMBEDDING_BATCH_TOKENS", "20000"))  # Max tokens per request
+    EMBEDDING_BATCH_MAX_ITEMS: int = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "2048"))
+    EMBEDDING_CONCURRENCY: int = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))  # Requests in flight at once
+    EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))  # Per client, per worker
+    OPENAI_MAX_KEEPALIVE: int = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+    OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT", "60"))
+    
+    # Embedding Cache Settings
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")  # Empty = memory only
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000"))
+    EMBEDDING_CACHE_DISK_ITEMS: int = int(os.getenv("EMBEDDING_CACHE_DISK_ITEMS", "200000"))
     
     # Milvus Settings
     MILVUS_HOST: str = os.getenv("MILVUS_HOST", "localhost")
     MILVUS_PORT: int = int(os.getenv("MILVUS_PORT", "19530"))
     MILVUS_COLLECTION_NAME: str = "legal_documents"
+    MILVUS_TOKEN: str = os.getenv("MILVUS_TOKEN", "")
+    MILVUS_POOL_SIZE: int = int(os.getenv("MILVUS_POOL_SIZE", "4"))  # Connections per worker
+    MILVUS_POOL_TIMEOUT: float = float(os.getenv("MILVUS_POOL_TIMEOUT", "10"))  # Seconds to wait for a free connection
+    MILVUS_NUM_PARTITIONS: int = int(os.getenv("MILVUS_NUM_PARTITIONS", "16"))  # Partitions the matter key hashes into
+    MILVUS_INDEX_TYPE: str = os.getenv("MILVUS_INDEX_TYPE", "AUTOINDEX")  # AUTOINDEX, HNSW, IVF_FLAT, IVF_SQ8 or IVF_PQ
+    MILVUS_INDEX_PARAMS: str = os.getenv("MILVUS_INDEX_PARAMS", "")  # JSON build params, e.g. {"M": 32}; empty = defaults
+    MILVUS_SEARCH_PARAMS: str = os.getenv("MILVUS_SEARCH_PARAMS", "")  # JSON, e.g. {"ef": 128} or {"nprobe": 32}
+    MILVUS_VECTOR_TYPE: str = os.getenv("MILVUS_VECTOR_TYPE", "float32")  # float32, float16 or int8 (new collections)
+    
+    # Vector Store Settings
+    VECTOR_STORE_BACKEND: str = os.getenv("VECTOR_STORE_BACKEND", "milvus")  # "milvus" or "numpy" (in-process)
+    NUMPY_STORE_PATH: str = os.getenv("NUMPY_STORE_PATH", "numpy_store")  # Empty = memory only
+    NUMPY_COMPACT_RATIO: float = float(os.getenv("NUMPY_COMPACT_RATIO", "0.5"))  # deleted share before compaction
+    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "1536"))  # Below the model's size = shortened (text-embedding-3)
     
     # Document Processing Settings
-    CHUNK_SIZE: int = 1000
-    CHUNK_OVERLAP: int = 200
-    MAX_FILE_SIZE: int = 1 * 1024 * 1024  # 1MB
+    CHUNK_TOKENS: int = int(os.getenv("CHUNK_TOKENS", "256"))  # Tokens of EMBEDDING_MODEL per chunk
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+    MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", str(256 * 1024 * 1024)))  # Bytes per upload
+    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "")  # Where uploads wait for indexing; empty = system temp dir
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # Bytes copied at a time
+    PDF_EXTRACT_WORKERS: int = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))  # 1 = extract in-process
+    PDF_PAGE_BATCH_SIZE: int = int(os.getenv("PDF_PAGE_BATCH_SIZE", "8"))  # Pages per worker task
+    
+    # OCR Settings (scanned PDFs)
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))  # Parallel tesseract processes
+    OCR_PAGE_BATCH_SIZE: int = int(os.getenv("OCR_PAGE_BATCH_SIZE", "2"))  # Pages rasterized per worker task
+    OCR_DPI: int = int(os.getenv("OCR_DPI", "200"))
+    OCR_LANGUAGE: str = os.getenv("OCR_LANGUAGE", "eng")
+    OCR_MIN_PAGE_CHARS: int = int(os.getenv("OCR_MIN_PAGE_CHARS", "32"))  # OCR pages with less text than this; 0 = never
+    OCR_CACHE_ENABLED: bool = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+    OCR_CACHE_PATH: str = os.getenv("OCR_CACHE_PATH", "ocr_cache.sqlite3")  # Empty = memory only
+    OCR_CACHE_MAX_ITEMS: int = int(os.getenv("OCR_CACHE_MAX_ITEMS", "100000"))
+    
+    # Deduplication Settings
+    DOCUMENT_REGISTRY_PATH: str = os.getenv("DOCUMENT_REGISTRY_PATH", "document_registry.sqlite3")
+    
+    # Ingestion Queue Settings
+    INGESTION_WORKERS: int = int(os.getenv("INGESTION_WORKERS", "2"))
+    INGESTION_QUEUE_SIZE: int = int(os.getenv("INGESTION_QUEUE_SIZE", "16"))  # Jobs waiting for a worker
+    
+    # Query Cache Settings (TTLs in seconds)
+    RETRIEVAL_CACHE_SIZE: int = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+    RETRIEVAL_CACHE_TTL: int = int(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+    ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+    ANSWER_CACHE_TTL: int = int(os.getenv("ANSWER_CACHE_TTL", "600"))
+    
+    # Retrieval Settings
+    SEARCH_MODE: str = os.getenv("SEARCH_MODE", "auto")  # vector, lexical, hybrid or auto
+    LEXICAL_INDEX_PATH: str = os.getenv("LEXICAL_INDEX_PATH", "lexical_index.jsonl")
+    LEXICAL_COMPACT_RATIO: float = float(os.getenv("LEXICAL_COMPACT_RATIO", "0.5"))  # dead log share before compaction
+    HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    MAX_BATCH_QUERIES: int = int(os.getenv("MAX_BATCH_QUERIES", "256"))
+    CONTEXT_MAX_TOKENS: int = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))  # retrieved text per prompt
+    
+    # Server Settings
+    WEB_WORKERS: int = int(os.getenv("WEB_WORKERS", "1"))  # Used by run.py
+    READY_MAX_SATURATION: float = float(os.getenv("READY_MAX_SATURATION", "1.0"))  # /ready fails at or above this
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    SLOW_REQUEST_SECONDS: float = float(os.getenv("SLOW_REQUEST_SECONDS", "5.0"))  # Slower requests are logged with their spans
     
     # Conversation Settings
-    MAX_CONVERSATION_HISTORY: int = 10
+    CONVERSATION_BACKEND: str = os.getenv("CONVERSATION_BACKEND", "memory")  # "memory" or "redis"
+    CONVERSATION_MAX_TOKENS: int = int(os.getenv("CONVERSATION_MAX_TOKENS", "2000"))  # history kept per session
+    CONVERSATION_MAX_SESSIONS: int = int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+    CONVERSATION_MAX_BYTES: int = int(os.getenv("CONVERSATION_MAX_BYTES", str(64 * 1024 * 1024)))
+    CONVERSATION_TTL: float = float(os.getenv("CONVERSATION_TTL", "86400"))  # idle seconds; 0 = never expire
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     
     class Config:
         case_sensitive = True
@@ -0,0 +1,384 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Dict, Any, Optional, Tuple
+
+# Metadata that describes a chunk's document rather than the chunk. A chunk shared by
+# several documents is stored once, with the values of the document that stored it,
+# so filters and results on these keys also go through the registry.
+DOCUMENT_KEYS = ("doc_id", "doc_hash", "filename")
+
+
+def hash_content(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_chunk(text: str, scope: Optional[str] = None) -> str:
+    """Hash chunk text with whitespace normalized, so reflowed copies of a clause match
+
+    Chunks of different scopes (matters) hash apart, so each matter keeps its own copy.
+    """
+    normalized = " ".join(text.split())
+    if scope:
+        normalized = f"{scope}\0{normalized}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def scope_hash(digest: str, scope: Optional[str] = None) -> str:
+    """A content hash within a scope; unscoped content keeps its plain hash"""
+    return hashlib.sha256(f"{scope}\0{digest}".encode("utf-8")).hexdigest() if scope else digest
+
+
+class DocumentRegistry:
+    """SQLite record of indexed documents and the chunks they reference
+
+    Each distinct chunk (by content hash) is stored in the vector store once;
+    documents reference chunks by hash, so boilerplate shared by many documents
+    is embedded and stored a single time.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    doc_hash TEXT NOT NULL,
+                    filename TEXT,
+                    chunks_count INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (doc_hash);
+                CREATE INDEX IF NOT EXISTS idx_documents_created ON documents (created_at);
+                CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents (filename);
+                CREATE TABLE IF NOT EXISTS chunks (
+                    chunk_hash TEXT PRIMARY KEY,
+                    vector_id INTEGER,
+                    doc_id TEXT,
+                    doc_hash TEXT,
+                    filename TEXT
+                );
+                CREATE TABLE IF NOT EXISTS document_chunks (
+                    doc_id TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    PRIMARY KEY (doc_id, chunk_index)
+                );
+                DROP INDEX IF EXISTS idx_document_chunks_hash;
+                CREATE INDEX IF NOT EXISTS idx_document_chunks_hash_doc ON document_chunks (chunk_hash, doc_id);
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    state TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+                INSERT OR IGNORE INTO counters (name, value) VALUES ('generation', 0);
+                INSERT OR IGNORE INTO counters (name, value) SELECT 'documents', COUNT(*) FROM documents;
+                INSERT OR IGNORE INTO counters (name, value) SELECT 'chunks', COUNT(*) FROM chunks;
+            """)
+            # The document keys a chunk was stored with; chunks recorded before they were kept have none
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+            for key in DOCUMENT_KEYS:
+                if key not in columns:
+                    self._conn.execute(f"ALTER TABLE chunks ADD COLUMN {key} TEXT")
+            self._conn.commit()
+
+    def find_document_by_hash(self, doc_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT doc_id, doc_hash, filename, chunks_count, created_at FROM documents WHERE doc_hash = ?",
+                (doc_hash,)
+            ).fetchone()
+        return self._document_row(row) if row else None
+
+    def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT doc_id, doc_hash, filename, chunks_count, created_at FROM documents WHERE doc_id = ?",
+                (doc_id,)
+            ).fetchone()
+        return self._document_row(row) if row else None
+
+    def known_chunks(self, chunk_hashes: List[str]) -> Dict[str, Optional[int]]:
+        """Return {chunk_hash: vector_id} for the hashes that are already stored"""
+        with self._lock:
+            return self._chunk_vector_ids(list(set(chunk_hashes)))
+
+    def _chunk_vector_ids(self, chunk_hashes: List[str]) -> Dict[str, Optional[int]]:
+        found = {}
+        for i in range(0, len(chunk_hashes), 500):
+            batch = chunk_hashes[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self._conn.execute(
+                f"SELECT chunk_hash, vector_id FROM chunks WHERE chunk_hash IN ({placeholders})", batch
+            ).fetchall())
+        return found
+
+    def borrowed_vector_ids(self, conditions: Dict[str, Any]) -> Optional[List[int]]:
+        """Vector ids of the chunks the documents matching {DOCUMENT_KEYS key: value} share with another
+
+        These are the chunks the matching documents reference but that were stored with
+        document keys that do not match conditions, so a filter on the stored keys misses
+        them. Returns None when no document matches.
+        """
+        values = [str(value) for value in conditions.values()]
+        where = " AND ".join(f"documents.{key} = ?" for key in conditions)
+        stored = " AND ".join(f"chunks.{key} IS ?" for key in conditions)
+        with self._lock:
+            if not self._conn.execute(f"SELECT 1 FROM documents WHERE {where} LIMIT 1", values).fetchone():
+                return None
+            rows = self._conn.execute(
+                "SELECT DISTINCT chunks.vector_id FROM documents "
+                "JOIN document_chunks ON document_chunks.doc_id = documents.doc_id "
+                "JOIN chunks ON chunks.chunk_hash = document_chunks.chunk_hash "
+                f"WHERE {where} AND chunks.vector_id IS NOT NULL AND NOT ({stored})",
+                values + values
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def chunk_owners(self, stored_doc_ids: Dict[str, Optional[str]],
+                     conditions: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+        """The documents chunks should be attributed to, for the chunks whose stored doc_id no longer fits
+
+        stored_doc_ids maps chunk hashes to the doc_id stored with each chunk. A chunk stays
+        with that document while it references the chunk and matches conditions (as for
+        borrowed_vector_ids); otherwise it goes to the oldest matching document that references
+        it. Returns {chunk_hash: {"doc_id", "doc_hash", "filename", "chunk_index"}} for the
+        chunks that move, and {chunk_hash: None} for those no matching document references.
+        """
+        where = "".join(f" AND documents.{key} = ?" for key in conditions or {})
+        values = [str(value) for value in (conditions or {}).values()]
+        owners = {}
+        with self._lock:
+            for chunk_hash, stored_doc_id in stored_doc_ids.items():
+                if stored_doc_id is not None and self._conn.execute(
+                    "SELECT 1 FROM document_chunks JOIN documents ON documents.doc_id = document_chunks.doc_id "
+                    f"WHERE document_chunks.chunk_hash = ? AND document_chunks.doc_id = ?{where}",
+                    [chunk_hash, stored_doc_id] + values
+                ).fetchone():
+                    continue
+                row = self._conn.execute(
+                    "SELECT documents.doc_id, documents.doc_hash, documents.filename, document_chunks.chunk_index "
+                    "FROM document_chunks JOIN documents ON documents.doc_id = document_chunks.doc_id "
+                    f"WHERE document_chunks.chunk_hash = ?{where} "
+                    "ORDER BY documents.created_at, document_chunks.chunk_index LIMIT 1",
+                    [chunk_hash] + values
+                ).fetchone()
+                owners[chunk_hash] = dict(zip(("doc_id", "doc_hash", "filename", "chunk_index"), row)) if row else None
+        return owners
+
+    def add_document(self, doc_id: str, doc_hash: str, filename: Optional[str], chunk_hashes: List[str],
+                     new_vector_ids: Dict[str, int]) -> Tuple[Dict[str, Optional[int]], Dict[str, Optional[int]]]:
+        """Record a document, its ordered chunk hashes and the vector ids of newly stored chunks
+
+        A document already recorded under doc_id is replaced. Returns two {chunk_hash: vector_id}
+        dicts of vectors that should be deleted from the stores: the chunks its earlier version
+        referenced that no document references any more, which are forgotten here, and the new
+        chunks another writer recorded first (see add_chunks).
+        """
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            previous = self._document_chunk_hashes(doc_id)
+            self._conn.execute("DELETE FROM document_chunks WHERE doc_id = ?", (doc_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, doc_hash, filename, chunks_count, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (doc_id, doc_hash, filename, len(chunk_hashes), time.time())
+            )
+            duplicates = self._insert_chunks(new_vector_ids, {chunk_hash: (doc_id, doc_hash, filename)
+                                                              for chunk_hash in new_vector_ids})
+            if not exists:
+                self._increment("documents", 1)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO document_chunks (doc_id, chunk_index, chunk_hash) VALUES (?, ?, ?)",
+                [(doc_id, i, chunk_hash) for i, chunk_hash in enumerate(chunk_hashes)]
+            )
+            orphaned = self._remove_orphans(previous)
+            self._conn.commit()
+        return orphaned, duplicates
+
+    def remove_document(self, doc_id: str,
+                        delete_vectors: Optional[Callable[..., None]] = None) -> Optional[Dict[str, Optional[int]]]:
+        """Forget a document; returns {chunk_hash: vector_id} of the chunks left unreferenced, or None if unknown
+
+        delete_vectors, if given, is called with those chunks before the removal is committed;
+        if it raises, the removal is rolled back and the document stays recorded, so deleting
+        it again retries the vectors rather than leaving them with no row pointing at them.
+        """
+        with self._lock:
+            if not self._conn.execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone():
+                return None
+            try:
+                previous = self._document_chunk_hashes(doc_id)
+                self._conn.execute("DELETE FROM document_chunks WHERE doc_id = ?", (doc_id,))
+                self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+                self._increment("documents", -1)
+                orphaned = self._remove_orphans(previous)
+                if delete_vectors is not None:
+                    delete_vectors(orphaned)
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+        return orphaned
+
+    def _document_chunk_hashes(self, doc_id: str) -> List[str]:
+        return [row[0] for row in self._conn.execute(
+            "SELECT chunk_hash FROM document_chunks WHERE doc_id = ? ORDER BY chunk_index", (doc_id,)
+        )]
+
+    def _remove_orphans(self, chunk_hashes: List[str]) -> Dict[str, Optional[int]]:
+        """Delete the chunks no document references any more; a chunk's references are its reference count"""
+        orphaned = {}
+        unique = list(set(chunk_hashes))
+        for i in range(0, len(unique), 500):
+            batch = unique[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            orphaned.update(self._conn.execute(
+                f"SELECT chunk_hash, vector_id FROM chunks WHERE chunk_hash IN ({placeholders}) "
+                "AND NOT EXISTS (SELECT 1 FROM document_chunks WHERE document_chunks.chunk_hash = chunks.chunk_hash)",
+                batch
+            ).fetchall())
+        self._conn.executemany("DELETE FROM chunks WHERE chunk_hash = ?", [(chunk_hash,) for chunk_hash in orphaned])
+        self._increment("chunks", -len(orphaned))
+        return orphaned
+
+    def add_chunks(self, vector_ids: Dict[str, int],
+                   metadata: Dict[str, Dict[str, Any]]) -> Dict[str, Optional[int]]:
+        """Record stored chunks ahead of the documents that reference them
+
+        metadata maps each chunk hash to the metadata the chunk was stored with, whose
+        DOCUMENT_KEYS are recorded with it. Two writers (ingestion workers, API processes, bulk loads) may embed and store the
+        same new chunk at once; the first to record it wins. Returns {chunk_hash: vector_id}
+        of the given chunks another writer recorded first: those vectors are spare copies,
+        referenced by nothing, and should be deleted from the stores.
+        """
+        stored_keys = {chunk_hash: tuple(metadata[chunk_hash].get(key) for key in DOCUMENT_KEYS)
+                       for chunk_hash in vector_ids}
+        with self._lock:
+            duplicates = self._insert_chunks(vector_ids, stored_keys)
+            self._conn.commit()
+        return duplicates
+
+    def _insert_chunks(self, vector_ids: Dict[str, int],
+                       stored_keys: Dict[str, Tuple[Any, ...]]) -> Dict[str, Optional[int]]:
+        added = self._conn.executemany(
+            f"INSERT OR IGNORE INTO chunks (chunk_hash, vector_id, {', '.join(DOCUMENT_KEYS)}) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(chunk_hash, vector_id, *stored_keys[chunk_hash]) for chunk_hash, vector_id in vector_ids.items()]
+        ).rowcount
+        self._increment("chunks", max(added, 0))
+        if added == len(vector_ids):
+            return {}
+        # Same transaction as the insert, so the rows read are the ones that won
+        recorded = self._chunk_vector_ids(list(vector_ids))
+        return {chunk_hash: vector_id for chunk_hash, vector_id in vector_ids.items()
+                if recorded.get(chunk_hash) != vector_id}
+
+    def set_vector_ids(self, vector_ids: Dict[str, int]):
+        """Point stored chunks at new vector ids, e.g. after the collection is copied"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET vector_id = ? WHERE chunk_hash = ?",
+                [(vector_id, chunk_hash) for chunk_hash, vector_id in vector_ids.items()]
+            )
+            self._conn.commit()
+
+    def list_documents(self, limit: int = -1, offset: int = 0) -> List[Dict[str, Any]]:
+        """Documents oldest first, read in order from the created_at index"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, doc_hash, filename, chunks_count, created_at FROM documents "
+                "ORDER BY created_at LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [self._document_row(row) for row in rows]
+
+    def generation(self) -> int:
+        """Counter that moves forward whenever the indexed collection changes, shared by every process"""
+        with self._lock:
+            return self._conn.execute("SELECT value FROM counters WHERE name = 'generation'").fetchone()[0]
+
+    def bump_generation(self) -> int:
+        with self._lock:
+            self._conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'generation'")
+            self._conn.commit()
+            return self._conn.execute("SELECT value FROM counters WHERE name = 'generation'").fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        """Stored documents and distinct chunks, kept as counters so reading them costs no table scan"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, value FROM counters WHERE name IN ('documents', 'chunks')"
+            ).fetchall()
+        return dict(rows)
+
+    def save_job(self, job: Dict[str, Any]):
+        """Record the state of an ingestion job, so every worker process can report it"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, status, created_at, state) VALUES (?, ?, ?, ?)",
+                (job["job_id"], job["status"], job["created_at"], json.dumps(job))
+            )
+            self._conn.commit()
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Recorded ingestion jobs, oldest first"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state FROM jobs ORDER BY created_at").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def prune_jobs(self, max_finished_jobs: int):
+        """Forget the oldest finished jobs once more than max_finished_jobs are recorded"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE status IN ('completed', 'failed') "
+                "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (max_finished_jobs,)
+            )
+            self._conn.commit()
+
+    def _increment(self, name: str, amount: int):
+        if amount:
+            self._conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (amount, name))
+
+    def clear(self):
+        with self._lock:
+            self._conn.executescript(
+                "DELETE FROM document_chunks; DELETE FROM chunks; DELETE FROM documents; "
+                "UPDATE counters SET value = 0 WHERE name IN ('documents', 'chunks');"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _document_row(row) -> Dict[str, Any]:
+        doc_id, doc_hash, filename, chunks_count, created_at = row
+        return {
+            "doc_id": doc_id,
+            "doc_hash": doc_hash,
+            "filename": filename,
+            "chunks_count": chunks_count,
+            "created_at": created_at
+        }
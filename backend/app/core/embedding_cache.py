@@ -0,0 +1,133 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List, Dict, Any, Optional
+from app.utils.cache import LRUCache
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with an in-memory LRU tier and an SQLite tier
+
+    Entries are keyed by a hash of the model name and the whitespace-normalized
+    text, so identical clauses are only ever embedded once per model. Vectors are
+    stored on disk as float32 and the disk tier evicts its least recently used
+    entries once it holds more than disk_items rows.
+    """
+
+    def __init__(self, path: Optional[str] = None, memory_items: int = 10000, disk_items: int = 200000):
+        self.memory = LRUCache(memory_items)
+        self.disk_items = disk_items
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_count = 0
+
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            self._conn.commit()
+            self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings for texts; missing entries are returned as None"""
+        keys = [self.make_key(model, text) for text in texts]
+        results = [self.memory.get(key) for key in keys]
+
+        disk_hit_count = 0
+        missing = {key for key, result in zip(keys, results) if result is None}
+        if missing and self._conn is not None:
+            found = self._load(missing)
+            for i, key in enumerate(keys):
+                if results[i] is None and key in found:
+                    results[i] = found[key]
+                    self.memory.set(key, found[key])
+                    disk_hit_count += 1
+
+        hit_count = sum(1 for result in results if result is not None)
+        with self._lock:
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+            self.disk_hits += disk_hit_count
+        return results
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings for texts in both tiers"""
+        rows = []
+        now = time.time()
+        for text, embedding in zip(texts, embeddings):
+            key = self.make_key(model, text)
+            self.memory.set(key, embedding)
+            rows.append((key, model, array("f", embedding).tobytes(), now))
+
+        if self._conn is None or not rows:
+            return
+
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._disk_count += self._conn.total_changes - before
+            excess = self._disk_count - self.disk_items
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self._disk_count -= excess
+            self._conn.commit()
+
+    def _load(self, keys) -> Dict[str, List[float]]:
+        found = {}
+        keys = list(keys)
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_items": len(self.memory),
+            "disk_items": self._disk_count
+        }
+
+    def clear(self):
+        self.memory.clear()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM embeddings")
+                self._conn.commit()
+                self._disk_count = 0
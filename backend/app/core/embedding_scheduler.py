@@ -0,0 +1,205 @@
+import asyncio
+import random
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from app.core.metrics import EMBEDDING_TOKENS
+from app.utils.tokens import count_tokens
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+def retryable_errors() -> tuple:
+    """Errors worth retrying: the request may succeed if sent again later"""
+    # The SDK is imported on first use, keeping it off the import path of the API
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+# Output size of each model; text-embedding-3 models can return shortened vectors
+NATIVE_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+
+def dimensions_kwargs(model: str, dimensions: Optional[int]) -> Dict[str, Any]:
+    """embeddings.create() arguments that make model return `dimensions`-long vectors"""
+    native = NATIVE_DIMENSIONS.get(model)
+    if not dimensions or native is None or dimensions == native:
+        return {}
+    if not model.startswith("text-embedding-3") or dimensions > native:
+        raise ValueError(f"{model} returns {native}-dimensional embeddings, not {dimensions}")
+    return {"dimensions": dimensions}
+
+
+async def _gather_or_cancel(coroutines) -> list:
+    """Like asyncio.gather, but the first failure cancels the other tasks before it is raised
+
+    A batch that fails for good fails the whole call, so its siblings stop spending quota
+    (asyncio.TaskGroup does the same, from Python 3.11).
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+
+class _AdaptiveLimiter:
+    """Concurrency limit that halves when rate limited and grows back by one per success"""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self, rate_limited: bool = False, succeeded: bool = False):
+        async with self._condition:
+            self.in_flight -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+            elif succeeded and self.limit < self.max_limit:
+                self.limit += 1
+            self._condition.notify_all()
+
+
+class EmbeddingScheduler:
+    """Embeds texts in token-packed batches sent concurrently through AsyncOpenAI
+
+    Batches are packed by token count rather than item count. Up to
+    `concurrency` requests are in flight at once, and the limit shrinks while the
+    API is rate limiting. Retryable failures are retried with jittered exponential
+    backoff, and batches the API rejects as too large are split in half. A batch
+    that fails for good cancels the others. Output order always matches input order.
+    """
+
+    def __init__(self, model: str, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 max_batch_tokens: int = 20000, max_batch_items: int = 2048, concurrency: int = 4,
+                 max_retries: int = 6, base_backoff: float = 0.5, max_backoff: float = 30.0,
+                 client: Optional["AsyncOpenAI"] = None, loop=None, dimensions: Optional[int] = None):
+        self.model = model
+        self.create_kwargs = dimensions_kwargs(model, dimensions)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # A shared client is only usable on the loop it belongs to, so embed() runs there
+        self.client = client
+        self.loop = loop
+
+    def pack_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text indexes into batches of at most max_batch_tokens / max_batch_items"""
+        batches = []
+        current, current_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text, self.model)
+            if current and (current_tokens + tokens > self.max_batch_tokens
+                            or len(current) >= self.max_batch_items):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Synchronous entry point; must not be called from a running event loop"""
+        if self.loop is not None:
+            return self.loop.run(self.aembed(texts, self.client))
+        return asyncio.run(self.aembed(texts))
+
+    async def aembed(self, texts: List[str], client: Optional["AsyncOpenAI"] = None) -> List[List[float]]:
+        """Embed texts concurrently, returning vectors in input order"""
+        if not texts:
+            return []
+
+        if client is None:
+            from openai import AsyncOpenAI
+            # Retries are handled here, so the client's own retry loop is disabled
+            async with AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0) as client:
+                return await self.aembed(texts, client)
+
+        limiter = _AdaptiveLimiter(self.concurrency)
+        batches = self.pack_batches(texts)
+        results = await _gather_or_cancel([
+            self._embed_batch(client, limiter, [texts[i] for i in batch]) for batch in batches
+        ])
+
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, batch_embeddings in zip(batches, results):
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+        return embeddings
+
+    async def _embed_batch(self, client: "AsyncOpenAI", limiter: _AdaptiveLimiter,
+                           batch: List[str]) -> List[List[float]]:
+        import openai
+
+        attempt = 0
+        while True:
+            await limiter.acquire()
+            succeeded = rate_limited = split = False
+            try:
+                response = await client.embeddings.create(input=batch, model=self.model, **self.create_kwargs)
+                succeeded = True
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    EMBEDDING_TOKENS.inc(getattr(usage, "total_tokens", 0) or 0, kind="document")
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except openai.BadRequestError as e:
+                # Token estimates can undershoot; split batches the API rejects as too large
+                if len(batch) == 1 or "token" not in str(e).lower():
+                    raise
+                split = True
+            except retryable_errors() as e:
+                rate_limited = isinstance(e, openai.RateLimitError)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+            finally:
+                await limiter.release(rate_limited=rate_limited, succeeded=succeeded)
+
+            if split:
+                half = len(batch) // 2
+                first, second = await _gather_or_cancel([
+                    self._embed_batch(client, limiter, batch[:half]),
+                    self._embed_batch(client, limiter, batch[half:])
+                ])
+                return first + second
+            await asyncio.sleep(delay)
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when the API sends it"""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(self.max_backoff, float(retry_after)) + random.uniform(0, self.base_backoff)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
@@ -1,17 +1,61 @@
+import asyncio
+import logging
 import os
-from typing import List, Dict, Any
-from openai import OpenAI
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
+from app.core.embedding_cache import EmbeddingCache
+from app.core.embedding_scheduler import EmbeddingScheduler, dimensions_kwargs
+from app.core.metrics import EMBEDDING_TOKENS, span
+
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+class _QueryEmbeddings:
+    """One batch of query embeddings: the cached ones, and the distinct queries left to embed"""
+    __slots__ = ("queries", "embeddings", "missing")
+    
+    def __init__(self, queries: List[str], cached: Optional[List[Optional[List[float]]]] = None):
+        self.queries = queries
+        self.embeddings = list(cached) if cached is not None else [None] * len(queries)
+        # Each distinct missing query is embedded once, however often it repeats
+        self.missing: Dict[str, List[int]] = {}
+        for i, embedding in enumerate(self.embeddings):
+            if embedding is None:
+                self.missing.setdefault(queries[i], []).append(i)
+    
+    def fill(self, new_embeddings: List[List[float]]):
+        """Place the embeddings of the missing queries, given in the order of missing"""
+        for positions, embedding in zip(self.missing.values(), new_embeddings):
+            for i in positions:
+                self.embeddings[i] = embedding
+    
+    def new_embeddings(self) -> Tuple[List[str], List[List[float]]]:
+        """The queries that were missing and their embeddings, for the cache"""
+        return list(self.missing), [self.embeddings[positions[0]] for positions in self.missing.values()]
+
+
 class EmbeddingGenerator:
-    def __init__(self, model: str = "text-embedding-ada-002"):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, model: str = "text-embedding-ada-002", cache: Optional[EmbeddingCache] = None,
+                 scheduler: Optional[EmbeddingScheduler] = None, client: Optional["OpenAI"] = None,
+                 dimensions: Optional[int] = None):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = client
         self.model = model
+        self.create_kwargs = dimensions_kwargs(model, dimensions)
+        # Shortened vectors are cached apart from full-size ones
+        self.cache_model = f"{model}:{dimensions}" if self.create_kwargs else model
+        self.cache = cache
+        self.scheduler = scheduler or EmbeddingScheduler(model, api_key=os.getenv("OPENAI_API_KEY"),
+                                                         dimensions=dimensions)
     
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts"""
+        """Generate embeddings for a list of texts, only calling the API for cache misses"""
         try:
             # Remove empty texts
             texts = [text for text in texts if text.strip()]
@@ -19,37 +63,108 @@ class EmbeddingGenerator:
             if not texts:
                 return []
             
-            # Generate embeddings in batches if needed
-            embeddings = []
-            batch_size = 100  # OpenAI recommends max 2048 for ada-002
-            
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                
-                response = self.client.embeddings.create(
-                    input=batch,
-                    model=self.model
-                )
-                
-                batch_embeddings = [item.embedding for item in response.data]
-                embeddings.extend(batch_embeddings)
+            if self.cache:
+                embeddings = self.cache.get_many(self.cache_model, texts)
+            else:
+                embeddings = [None] * len(texts)
             
-            return embeddings
+            # Embed each distinct missing text once, even if it repeats within the batch
+            missing = {}
+            for i, embedding in enumerate(embeddings):
+                if embedding is None:
+                    missing.setdefault(EmbeddingCache.make_key(self.cache_model, texts[i]), []).append(i)
             
+            if not missing:
+                return embeddings
+            
+            missing_texts = [texts[positions[0]] for positions in missing.values()]
+            new_embeddings = self._embed(missing_texts)
+            
+            for positions, embedding in zip(missing.values(), new_embeddings):
+                for i in positions:
+                    embeddings[i] = embedding
+            
+            if self.cache:
+                self.cache.put_many(self.cache_model, missing_texts, new_embeddings)
+            
+            return embeddings
+        
         except Exception as e:
-            print(f"Error generating embeddings: {e}")
+            logger.error("Error generating embeddings: %s", e)
             raise
     
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Call the embeddings API for texts in concurrent, token-packed batches"""
+        with span("embeddings.documents"):
+            return self.scheduler.embed(texts)
+    
     def generate_query_embedding(self, query: str) -> List[float]:
         """Generate embedding for a single query"""
+        return self.generate_query_embeddings([query])[0]
+    
+    def generate_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Generate embeddings for several queries with at most one API request"""
         try:
-            response = self.client.embeddings.create(
-                input=query,
-                model=self.model
-            )
-            
-            return response.data[0].embedding
-            
+            cached = self.cache.get_many(self.cache_model, queries) if self.cache else None
+            batch = _QueryEmbeddings(queries, cached)
+            if batch.missing:
+                with span("embeddings.query"):
+                    response = self.client.embeddings.create(**self._query_request(batch))
+                self._finish_queries(batch, response)
+                if self.cache:
+                    self.cache.put_many(self.cache_model, *batch.new_embeddings())
+            return batch.embeddings
+        
         except Exception as e:
-            print(f"Error generating query embedding: {e}")
-            raise
\ No newline at end of file
+            logger.error("Error generating query embeddings: %s", e)
+            raise
+    
+    def _query_request(self, batch: "_QueryEmbeddings") -> Dict[str, Any]:
+        """Arguments of the embeddings API request for the queries the cache did not answer"""
+        return dict(input=list(batch.missing), model=self.model, **self.create_kwargs)
+    
+    def _finish_queries(self, batch: "_QueryEmbeddings", response):
+        self._count_tokens(response)
+        batch.fill([item.embedding for item in sorted(response.data, key=lambda item: item.index)])
+    
+    @staticmethod
+    def _count_tokens(response):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            EMBEDDING_TOKENS.inc(getattr(usage, "total_tokens", 0) or 0, kind="query")
+
+
+class AsyncEmbeddingGenerator:
+    """Query embeddings through AsyncOpenAI, for code running on the server's event loop
+
+    Shares the model, dimensions and cache of an EmbeddingGenerator. Cache reads
+    and writes, which may touch SQLite, run on a worker thread.
+    """
+    
+    def __init__(self, generator: EmbeddingGenerator, client: "AsyncOpenAI"):
+        self.generator = generator
+        self.client = client
+    
+    async def generate_query_embedding(self, query: str) -> List[float]:
+        """Generate embedding for a single query"""
+        return (await self.generate_query_embeddings([query]))[0]
+    
+    async def generate_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Generate embeddings for several queries with at most one API request"""
+        generator = self.generator
+        try:
+            cached = None
+            if generator.cache:
+                cached = await asyncio.to_thread(generator.cache.get_many, generator.cache_model, queries)
+            batch = _QueryEmbeddings(queries, cached)
+            if batch.missing:
+                with span("embeddings.query"):
+                    response = await self.client.embeddings.create(**generator._query_request(batch))
+                generator._finish_queries(batch, response)
+                if generator.cache:
+                    await asyncio.to_thread(generator.cache.put_many, generator.cache_model, *batch.new_embeddings())
+            return batch.embeddings
+        
+        except Exception as e:
+            logger.error("Error generating query embeddings: %s", e)
+            raise
@@ -0,0 +1,343 @@
+import functools
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans from sub-millisecond cache lookups to multi-second chat completions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets, with their sum and count"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _render_sample(self, key, value) -> List[str]:
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text exposition format
+
+    Collectors are callables run at scrape time that return gauge samples as
+    (name, documentation, {label: value}, value) tuples, for values that live
+    elsewhere, such as cache and connection pool statistics.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], List[Tuple[str, str, Dict[str, Any], float]]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        # Collected samples are grouped by metric name, each family rendered once
+        families: Dict[str, Tuple[str, List[str]]] = {}
+        for collector in collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                logger.warning("Metrics collector %r failed: %s", collector, e)
+                continue
+            for name, documentation, labels, value in samples:
+                names = tuple(labels)
+                line = f"{name}{_format_labels(names, tuple(labels[n] for n in names))} {_format_value(value)}"
+                families.setdefault(name, (documentation, []))[1].append(line)
+        for name, (documentation, samples) in families.items():
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} gauge"] + samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "legalbot_http_requests_in_flight", "HTTP requests being handled")
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "legalbot_http_request_duration_seconds", "HTTP request latency until the response body is sent",
+    ("method", "route", "status"))
+STAGE_DURATION = REGISTRY.histogram(
+    "legalbot_stage_duration_seconds", "Latency of each pipeline stage", ("stage",))
+STAGE_ERRORS = REGISTRY.counter(
+    "legalbot_stage_errors_total", "Pipeline stages that raised", ("stage",))
+EMBEDDING_TOKENS = REGISTRY.counter(
+    "legalbot_embedding_tokens_total", "Tokens sent to the embeddings API", ("kind",))
+CHAT_TOKENS = REGISTRY.counter(
+    "legalbot_chat_tokens_total", "Chat completion tokens, prompt and completion", ("kind",))
+PROMPT_TOKENS_SAVED = REGISTRY.counter(
+    "legalbot_prompt_tokens_saved_total", "Prompt tokens saved by merging overlapping chunks")
+
+
+# Request-scoped tracing
+
+class Trace:
+    """Spans recorded while handling one request, in the order they finished"""
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, start: float, duration: float, error: bool):
+        with self._lock:
+            self.spans.append({
+                "stage": stage,
+                "start_ms": round((start - self.started) * 1000, 2),
+                "duration_ms": round(duration * 1000, 2),
+                "error": error
+            })
+
+    def server_timing(self) -> str:
+        """The spans as a Server-Timing header value, total time per stage"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span["stage"]] = totals.get(span["stage"], 0.0) + span["duration_ms"]
+        return ", ".join(f"{stage.replace('.', '-')};dur={duration:.2f}" for stage, duration in totals.items())
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("legalbot_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record_span(stage: str, duration: float, start: Optional[float] = None, error: bool = False):
+    """Record a stage timed elsewhere; start defaults to duration seconds ago"""
+    STAGE_DURATION.observe(duration, stage=stage)
+    if error:
+        STAGE_ERRORS.inc(stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, start if start is not None else time.perf_counter() - duration, duration, error)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block as a pipeline stage: a histogram observation plus a span in the request's trace"""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record_span(stage, time.perf_counter() - start, start, error)
+
+
+def traced(stage: str):
+    """Decorator form of span()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MetricsMiddleware:
+    """ASGI middleware: in-flight gauge, latency histogram and a trace per HTTP request
+
+    Adds X-Request-ID and, for the stages finished before the response starts,
+    a Server-Timing header. Requests slower than slow_request_seconds are logged
+    with their spans.
+    """
+
+    def __init__(self, app, slow_request_seconds: float = 5.0):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace = Trace(headers.get(b"x-request-id", b"").decode("latin-1") or None)
+        token = _current_trace.set(trace)
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                extra = [(b"x-request-id", trace.request_id.encode("latin-1"))]
+                timing = trace.server_timing()
+                if timing:
+                    extra.append((b"server-timing", timing.encode("latin-1")))
+                message = dict(message, headers=list(message.get("headers", [])) + extra)
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            duration = time.perf_counter() - trace.started
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                duration,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status
+            )
+            if duration >= self.slow_request_seconds:
+                logger.warning("Slow request %s %s took %.0f ms (request_id=%s): %s",
+                               scope["method"], scope["path"], duration * 1000, trace.request_id, trace.spans)
+            _current_trace.reset(token)
@@ -1,29 +1,126 @@
+import json
+import logging
 import os
+import numpy as np
+from typing import Any, Callable, List, Dict, Optional
 from pymilvus import MilvusClient, DataType
 from dotenv import load_dotenv
+from app.core.vector_store import VectorStore
+from app.core.clients import MilvusConnectionPool
+from app.core.config import settings
+from app.core.metrics import traced
 
 load_dotenv()
 
-class MilvusManager:
-    def __init__(self):
-        self.collection_name = "document_embeddings"
-        self.dimension = 1536  # OpenAI text-embedding-ada-002 dimension
+logger = logging.getLogger(__name__)
+
+# Metadata keys promoted to typed, INVERTED-indexed scalar fields: {metadata key: (field name, max length)}.
+# Filters on them are answered from the index instead of scanning the JSON metadata field.
+SCALAR_FIELDS = {
+    "doc_id": ("doc_id", 128),
+    "filename": ("filename", 512),
+    "type": ("doc_type", 32),
+    "matter": ("matter", 128),
+}
+PARTITION_KEY_FIELD = "matter"
+
+# Build and search params used when MILVUS_INDEX_PARAMS / MILVUS_SEARCH_PARAMS leave them out
+DEFAULT_INDEX_PARAMS = {
+    "HNSW": {"M": 16, "efConstruction": 200},
+    "IVF_FLAT": {"nlist": 1024},
+    "IVF_SQ8": {"nlist": 1024},
+    "IVF_PQ": {"nlist": 1024, "m": 16, "nbits": 8},
+}
+DEFAULT_SEARCH_PARAMS = {
+    "HNSW": {"ef": 64},
+    "IVF_FLAT": {"nprobe": 16},
+    "IVF_SQ8": {"nprobe": 16},
+    "IVF_PQ": {"nprobe": 16},
+}
+# Stored vector types, as DataType member names; int8 vectors need an HNSW index (Milvus 2.6+)
+# and a pymilvus recent enough to have DataType.INT8_VECTOR, so members are looked up when used
+VECTOR_TYPES = {
+    "float32": "FLOAT_VECTOR",
+    "float16": "FLOAT16_VECTOR",
+    "int8": "INT8_VECTOR",
+}
+# Index types a vector type is limited to; Milvus rejects other pairs only when the index is built
+VECTOR_INDEX_TYPES = {
+    "int8": ("HNSW",),
+}
+
+def _json_setting(value: str) -> Dict[str, Any]:
+    return json.loads(value) if value and value.strip() else {}
+
+def encode_vectors(vectors, vector_type: str) -> list:
+    """Convert float embeddings to the representation Milvus expects for vector_type
+
+    int8 vectors are scaled so each one's largest component is 127; cosine
+    similarity ignores the per-vector scale.
+    """
+    if vector_type == "float32":
+        return list(vectors)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if vector_type == "float16":
+        return list(matrix.astype(np.float16))
+    if vector_type == "int8":
+        scale = np.abs(matrix).max(axis=1, keepdims=True)
+        scale[scale == 0] = 1.0
+        return list(np.rint(matrix / scale * 127).astype(np.int8))
+    raise ValueError(f"Unknown vector type: {vector_type}")
+
+class MilvusManager(VectorStore):
+    def __init__(self, pool: Optional[MilvusConnectionPool] = None, collection_name: Optional[str] = None,
+                 dimension: Optional[int] = None, index_type: Optional[str] = None,
+                 index_params: Optional[Dict[str, Any]] = None, search_params: Optional[Dict[str, Any]] = None,
+                 vector_type: Optional[str] = None):
+        self.collection_name = collection_name or "document_embeddings"
+        self.dimension = dimension or settings.EMBEDDING_DIMENSION
         
-        # Connect to Milvus using the provided credentials
-        uri = os.getenv("MILVUS_HOST")
-        self.client = MilvusClient(
-            uri=uri,
-            token=os.getenv("MILVUS_TOKEN")
-        )
+        # Index and vector type apply to collections created from here on; search params to every search
+        self.index_type = (index_type or settings.MILVUS_INDEX_TYPE).upper()
+        self.index_params = {**DEFAULT_INDEX_PARAMS.get(self.index_type, {}),
+                             **(index_params if index_params is not None
+                                else _json_setting(settings.MILVUS_INDEX_PARAMS))}
+        self.search_params = {**DEFAULT_SEARCH_PARAMS.get(self.index_type, {}),
+                              **(search_params if search_params is not None
+                                 else _json_setting(settings.MILVUS_SEARCH_PARAMS))}
+        self.vector_type = (vector_type or settings.MILVUS_VECTOR_TYPE).lower()
+        if self.vector_type not in VECTOR_TYPES:
+            raise ValueError(f"MILVUS_VECTOR_TYPE must be one of {', '.join(VECTOR_TYPES)}")
+        index_types = VECTOR_INDEX_TYPES.get(self.vector_type)
+        if index_types is not None and self.index_type not in index_types:
+            raise ValueError(f"MILVUS_VECTOR_TYPE={self.vector_type} needs MILVUS_INDEX_TYPE "
+                             f"{' or '.join(index_types)}, not {self.index_type}")
+        self.vector_datatype = getattr(DataType, VECTOR_TYPES[self.vector_type], None)
+        if self.vector_datatype is None:
+            raise ValueError(f"MILVUS_VECTOR_TYPE={self.vector_type} needs DataType.{VECTOR_TYPES[self.vector_type]}, "
+                             f"which the installed pymilvus lacks; upgrade pymilvus or choose another vector type")
+        
+        # Connect to Milvus using the provided credentials; calls are spread over a pool of connections
+        if pool is None:
+            uri = os.getenv("MILVUS_HOST")
+            pool = MilvusConnectionPool(
+                lambda: MilvusClient(uri=uri, token=os.getenv("MILVUS_TOKEN")),
+                size=settings.MILVUS_POOL_SIZE,
+                acquire_timeout=settings.MILVUS_POOL_TIMEOUT
+            )
+        self.pool = pool
+        self.client = pool.proxy()
         
         self._create_collection()
+        self.scalar_fields = self._scalar_fields()
+        if not self.scalar_fields:
+            logger.warning("Collection '%s' has no scalar filter fields; filters scan the metadata JSON. "
+                           "Run migrate_milvus.py to upgrade it", self.collection_name)
     
-    def _create_collection(self):
+    def _create_collection(self, collection_name: Optional[str] = None):
         """Create collection if it doesn't exist"""
+        collection_name = collection_name or self.collection_name
         try:
             # Check if collection exists
-            if self.client.has_collection(self.collection_name):
-                print(f"Collection '{self.collection_name}' already exists")
+            if self.client.has_collection(collection_name):
+                logger.info("Collection '%s' already exists", collection_name)
                 return
             
             # Create collection schema
@@ -34,65 +131,136 @@ class MilvusManager:
             
             # Add fields
             schema.add_field(field_name="id", datatype=DataType.INT64, is_primary=True, auto_id=True)
-            schema.add_field(field_name="embedding", datatype=DataType.FLOAT_VECTOR, dim=self.dimension)
+            schema.add_field(field_name="embedding", datatype=self.vector_datatype, dim=self.dimension)
             schema.add_field(field_name="text", datatype=DataType.VARCHAR, max_length=65535)
             schema.add_field(field_name="metadata", datatype=DataType.JSON)
+            # Hot filter keys as typed fields; the matter is the partition key, so a matter filter
+            # only searches the partitions holding that matter
+            for field_name, max_length in SCALAR_FIELDS.values():
+                schema.add_field(field_name=field_name, datatype=DataType.VARCHAR, max_length=max_length,
+                                 is_partition_key=field_name == PARTITION_KEY_FIELD)
             
             # Create index params
-            index_params = self.client.prepare_index_params()
-            index_params.add_index(
-                field_name="embedding",
-                metric_type="COSINE",
-                index_type="AUTOINDEX"
-            )
+            index_params = self._index_params()
+            for field_name, _ in SCALAR_FIELDS.values():
+                index_params.add_index(field_name=field_name, index_type="INVERTED")
             
             # Create collection
             self.client.create_collection(
-                collection_name=self.collection_name,
+                collection_name=collection_name,
                 schema=schema,
-                index_params=index_params
+                index_params=index_params,
+                num_partitions=settings.MILVUS_NUM_PARTITIONS
             )
             
-            print(f"Collection '{self.collection_name}' created successfully")
+            logger.info("Collection '%s' created successfully", collection_name)
             
         except Exception as e:
-            print(f"Error creating collection: {e}")
+            logger.error("Error creating collection: %s", e)
+    
+    def _index_params(self):
+        """Index params for the embedding field, as configured"""
+        index_params = self.client.prepare_index_params()
+        index_params.add_index(
+            field_name="embedding",
+            metric_type="COSINE",
+            index_type=self.index_type,
+            params=self.index_params
+        )
+        return index_params
+    
+    def _search_params(self, limit: int) -> Dict[str, Any]:
+        params = dict(self.search_params)
+        # HNSW returns at most ef results
+        if "ef" in params:
+            params["ef"] = max(params["ef"], limit)
+        return {"metric_type": "COSINE", "params": params}
+    
+    def _scalar_fields(self, collection_name: Optional[str] = None) -> Dict[str, str]:
+        """{metadata key: field name} for the promoted fields this collection has"""
+        try:
+            description = self.client.describe_collection(collection_name or self.collection_name)
+        except Exception as e:
+            logger.error("Error describing collection: %s", e)
+            return {}
+        names = {field.get("name") for field in (description or {}).get("fields", [])}
+        return {key: field_name for key, (field_name, _) in SCALAR_FIELDS.items() if field_name in names}
+    
+    def _rows(self, embeddings, texts, metadata_list, scalar_fields: Dict[str, str]) -> List[Dict[str, Any]]:
+        rows = []
+        embeddings = encode_vectors(embeddings, self.vector_type)
+        for embedding, text, metadata in zip(embeddings, texts, metadata_list):
+            row = {"embedding": embedding, "text": text, "metadata": metadata}
+            for key, field_name in scalar_fields.items():
+                value = metadata.get(key)
+                row[field_name] = "" if value is None else str(value)[:SCALAR_FIELDS[key][1]]
+            rows.append(row)
+        return rows
     
+    @traced("milvus.insert")
     def insert_documents(self, embeddings, texts, metadata_list):
         """Insert documents into Milvus"""
         try:
-            data = [
-                {
-                    "embedding": embedding,
-                    "text": text,
-                    "metadata": metadata
-                }
-                for embedding, text, metadata in zip(embeddings, texts, metadata_list)
-            ]
+            data = self._rows(embeddings, texts, metadata_list, self.scalar_fields)
             
             result = self.client.insert(
                 collection_name=self.collection_name,
                 data=data
             )
             
-            print(f"Inserted {len(data)} documents")
+            logger.debug("Inserted %d documents", len(data))
             return result
             
         except Exception as e:
-            print(f"Error inserting documents: {e}")
+            logger.error("Error inserting documents: %s", e)
             raise
     
-    def search(self, query_embedding, top_k=5, filter_expr=None):
+    @staticmethod
+    def build_filter_expr(filter_conditions: Optional[Dict],
+                          scalar_fields: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """Build a Milvus boolean expression from {metadata_key: value} conditions
+
+        Keys promoted to scalar fields filter on the indexed field; others on the metadata JSON.
+        """
+        if not filter_conditions:
+            return None
+        # Example: {"filename": "document.pdf"} -> filename == "document.pdf"
+        conditions = []
+        for key, value in filter_conditions.items():
+            if key == "any_of":
+                # Alternatives: {"any_of": ({"doc_id": "a"}, {"id": (1, 2)})} -> (doc_id == "a" or id in [1, 2])
+                alternatives = [MilvusManager.build_filter_expr(alternative, scalar_fields) for alternative in value]
+                conditions.append(f"({' or '.join(alternatives)})")
+                continue
+            if key == "id":
+                # Primary keys: {"id": (1, 2)} -> id in [1, 2]
+                ids = value if isinstance(value, (tuple, list)) else (value,)
+                conditions.append(f"id in [{', '.join(str(int(vector_id)) for vector_id in ids)}]")
+                continue
+            field_name = (scalar_fields or {}).get(key)
+            target = field_name if field_name else f'metadata["{key}"]'
+            if isinstance(value, (tuple, list)):
+                quoted = ", ".join(f'"{MilvusManager._escape(item)}"' for item in value)
+                conditions.append(f"{target} in [{quoted}]")
+            else:
+                conditions.append(f'{target} == "{MilvusManager._escape(value)}"')
+        return " and ".join(conditions)
+    
+    @staticmethod
+    def _escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"')
+    
+    @traced("milvus.search")
+    def search(self, query_embedding, top_k=5, filter_conditions=None):
         """Search for similar documents"""
         try:
-            search_params = {
-                "metric_type": "COSINE",
-                "params": {}
-            }
+            filter_expr = self.build_filter_expr(filter_conditions, self.scalar_fields)
+
+            search_params = self._search_params(top_k)
             
             results = self.client.search(
                 collection_name=self.collection_name,
-                data=[query_embedding],
+                data=encode_vectors([query_embedding], self.vector_type),
                 anns_field="embedding",
                 search_params=search_params,
                 limit=top_k,
@@ -103,17 +271,138 @@ class MilvusManager:
             return results[0] if results else []
             
         except Exception as e:
-            print(f"Error searching documents: {e}")
+            logger.error("Error searching documents: %s", e)
+            raise
+    
+    @traced("milvus.search")
+    def search_batch(self, query_embeddings, top_k=5, filter_conditions=None):
+        """Search for several queries, with one Milvus request per distinct filter"""
+        try:
+            filters = filter_conditions or [None] * len(query_embeddings)
+            
+            # Milvus applies one filter expression per request, so group queries by filter
+            groups: Dict[Optional[str], List[int]] = {}
+            for i, conditions in enumerate(filters):
+                groups.setdefault(self.build_filter_expr(conditions, self.scalar_fields), []).append(i)
+            
+            search_params = self._search_params(top_k)
+            query_embeddings = encode_vectors(query_embeddings, self.vector_type)
+            
+            hits = [[] for _ in query_embeddings]
+            for filter_expr, positions in groups.items():
+                results = self.client.search(
+                    collection_name=self.collection_name,
+                    data=[query_embeddings[i] for i in positions],
+                    anns_field="embedding",
+                    search_params=search_params,
+                    limit=top_k,
+                    output_fields=["text", "metadata"],
+                    filter=filter_expr
+                )
+                for i, result in zip(positions, results or []):
+                    hits[i] = result
+            
+            return hits
+            
+        except Exception as e:
+            logger.error("Error searching documents: %s", e)
+            raise
+    
+    @traced("milvus.delete")
+    def delete(self, ids):
+        """Delete chunks by primary key"""
+        try:
+            if not ids:
+                return 0
+            result = self.client.delete(collection_name=self.collection_name, ids=list(ids))
+            return result.get("delete_count", len(ids)) if isinstance(result, dict) else len(ids)
+        except Exception as e:
+            logger.error("Error deleting documents: %s", e)
             raise
     
+    def migrate_collection(self, batch_size: int = 1000,
+                           on_batch: Optional[Callable[[List[Any], List[str], List[Dict]], None]] = None) -> Dict[str, Any]:
+        """Copy a collection created without scalar fields into the current schema, then swap it in
+
+        Rows are copied in batches to "<name>_migrating"; the old collection is then dropped and the
+        copy renamed into its place. Copied rows get new ids: on_batch(ids, texts, metadata_list) is
+        called for every batch so references to the old ids (registry, lexical index) can be rebuilt.
+        An interrupted run starts the copy over, or finishes the swap if only that was left.
+        Nothing may write to the collection meanwhile.
+        """
+        target = f"{self.collection_name}_migrating"
+        if self.scalar_fields and self.client.has_collection(target):
+            # Stopped between dropping the old collection and renaming the copy: the current
+            # collection is the empty one created at startup
+            self.client.drop_collection(self.collection_name)
+            self.client.rename_collection(target, self.collection_name)
+            self.scalar_fields = self._scalar_fields()
+            return {"success": True, "message": "Finished an interrupted migration", "migrated": 0}
+        if self.scalar_fields:
+            return {"success": True, "message": "Collection already has scalar fields", "migrated": 0}
+        
+        if self.client.has_collection(target):
+            self.client.drop_collection(target)
+        self._create_collection(target)
+        target_fields = self._scalar_fields(target)
+        
+        migrated = 0
+        iterator = self.client.query_iterator(
+            collection_name=self.collection_name,
+            batch_size=batch_size,
+            filter="",
+            output_fields=["embedding", "text", "metadata"]
+        )
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                texts = [row["text"] for row in batch]
+                metadata_list = [row.get("metadata") or {} for row in batch]
+                result = self.client.insert(
+                    collection_name=target,
+                    data=self._rows([row["embedding"] for row in batch], texts, metadata_list, target_fields)
+                )
+                if on_batch is not None:
+                    on_batch(list(result["ids"]), texts, metadata_list)
+                migrated += len(batch)
+                logger.info("Migrated %d rows", migrated)
+        finally:
+            iterator.close()
+        
+        self.client.drop_collection(self.collection_name)
+        self.client.rename_collection(target, self.collection_name)
+        self.scalar_fields = self._scalar_fields()
+        return {"success": True, "message": f"Migrated {migrated} rows to scalar fields", "migrated": migrated}
+    
+    def rebuild_index(self) -> Dict[str, Any]:
+        """Replace the embedding index with the configured index type and build params
+
+        The stored vector type cannot change in place. Searches fail until the new index is loaded.
+        """
+        self.client.release_collection(self.collection_name)
+        self.client.drop_index(self.collection_name, "embedding")
+        self.client.create_index(self.collection_name, self._index_params())
+        self.client.load_collection(self.collection_name)
+        return {"success": True, "message": f"Rebuilt the embedding index as {self.index_type}",
+                "index_type": self.index_type, "index_params": self.index_params}
+    
     def delete_collection(self):
         """Delete the collection"""
         try:
             self.client.drop_collection(self.collection_name)
-            print(f"Collection '{self.collection_name}' deleted")
+            logger.info("Collection '%s' deleted", self.collection_name)
         except Exception as e:
-            print(f"Error deleting collection: {e}")
+            logger.error("Error deleting collection: %s", e)
+    
+    def clear(self):
+        """Drop and recreate the collection"""
+        self.delete_collection()
+        self._create_collection()
+        self.scalar_fields = self._scalar_fields()
     
+    @traced("milvus.stats")
     def get_collection_stats(self):
         """Get collection statistics"""
         try:
@@ -129,5 +418,5 @@ class MilvusManager:
                 "document_count": count[0].get("count(*)") if count else 0
             }
         except Exception as e:
-            print(f"Error getting collection stats: {e}")
+            logger.error("Error getting collection stats: %s", e)
             return None
\ No newline at end of file
@@ -0,0 +1,306 @@
+import json
+import os
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+from app.core.vector_store import VectorStore
+
+
+class NumpyVectorStore(VectorStore):
+    """In-process vector store over a contiguous float32 matrix
+
+    Rows are L2-normalized on insert, so cosine top-k is one matrix-vector
+    product plus an argpartition. Metadata filters are answered from an inverted
+    index of scalar metadata values rather than by scanning rows.
+
+    With a path, vectors live in a memory-mapped .npy file (grown by doubling)
+    and texts and metadata in an append-only JSON lines file, so the store
+    reopens without re-reading every vector into memory. Deleted rows are
+    tombstoned, by a line in the same file, and skipped by searches. Once more
+    than compact_ratio of the rows (and at least compact_min_rows) are
+    tombstoned, the live rows are rewritten to new files; ids do not change.
+    """
+
+    def __init__(self, path: Optional[str] = None, dimension: int = 1536, initial_capacity: int = 1024,
+                 compact_ratio: float = 0.5, compact_min_rows: int = 1000):
+        self.path = path
+        self.dimension = dimension
+        self.initial_capacity = initial_capacity
+        self.compact_ratio = compact_ratio
+        self.compact_min_rows = compact_min_rows
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.npy")
+
+    @property
+    def _records_path(self) -> str:
+        return os.path.join(self.path, "records.jsonl")
+
+    @property
+    def _compacted_records_path(self) -> str:
+        return os.path.join(self.path, "records.compacted.jsonl")
+
+    def _reset_rows(self):
+        self._count = 0
+        self._ids: List[int] = []
+        self._texts: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._filter_index: Dict[tuple, List[int]] = {}
+        self._rows_by_id: Dict[int, int] = {}
+        self._deleted: set = set()
+        self._live = None
+
+    def _load(self):
+        self._reset_rows()
+        self._next_id = 1
+
+        if not self.path:
+            self._vectors = np.zeros((self.initial_capacity, self.dimension), dtype=np.float32)
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+        self._finish_compaction()
+        if os.path.exists(self._vectors_path):
+            self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+        else:
+            self._vectors = np.lib.format.open_memmap(
+                self._vectors_path, mode="w+", dtype=np.float32, shape=(self.initial_capacity, self.dimension)
+            )
+
+        if os.path.exists(self._records_path):
+            with open(self._records_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if "deleted" in record:
+                        self._tombstone(record["deleted"])
+                    elif "next_id" in record:
+                        self._next_id = record["next_id"]
+                    else:
+                        self._add_record(record["id"], record["text"], record["metadata"])
+
+    def _add_record(self, vector_id: int, text: str, metadata: Dict[str, Any]):
+        row = self._count
+        self._ids.append(vector_id)
+        self._texts.append(text)
+        self._metadata.append(metadata)
+        self._rows_by_id[vector_id] = row
+        self._next_id = max(self._next_id, vector_id + 1)
+        self._live = None
+        for key, value in metadata.items():
+            if isinstance(value, (str, int, float, bool)):
+                self._filter_index.setdefault((key, value), []).append(row)
+        self._count += 1
+
+    def _tombstone(self, ids) -> int:
+        rows = {self._rows_by_id.pop(vector_id) for vector_id in ids if vector_id in self._rows_by_id}
+        if rows:
+            self._deleted.update(rows)
+            self._live = None
+        return len(rows)
+
+    def _live_rows(self) -> Optional[np.ndarray]:
+        """Rows not deleted, or None when nothing is deleted and every row can be searched"""
+        if not self._deleted:
+            return None
+        if self._live is None:
+            mask = np.ones(self._count, dtype=bool)
+            mask[list(self._deleted)] = False
+            self._live = np.flatnonzero(mask)
+        return self._live
+
+    def _ensure_capacity(self, rows: int):
+        capacity = self._vectors.shape[0]
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+
+        if not self.path:
+            grown = np.zeros((capacity, self.dimension), dtype=np.float32)
+            grown[:self._count] = self._vectors[:self._count]
+            self._vectors = grown
+            return
+
+        temp_path = self._vectors_path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.float32,
+                                          shape=(capacity, self.dimension))
+        grown[:self._count] = self._vectors[:self._count]
+        grown.flush()
+        del grown
+        os.replace(temp_path, self._vectors_path)
+        self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+
+    def insert_documents(self, embeddings, texts, metadata_list) -> Dict[str, Any]:
+        """Insert documents into the matrix"""
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            start = self._count
+            self._ensure_capacity(start + len(matrix))
+            self._vectors[start:start + len(matrix)] = matrix
+
+            # Ids only grow, so an id deleted and compacted away is never reused
+            ids = list(range(self._next_id, self._next_id + len(matrix)))
+            records = []
+            for vector_id, text, metadata in zip(ids, texts, metadata_list):
+                self._add_record(vector_id, text, metadata)
+                records.append(json.dumps({"id": vector_id, "text": text, "metadata": metadata}))
+
+            if self.path:
+                self._vectors.flush()
+                with open(self._records_path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(records) + "\n")
+
+        return {"insert_count": len(ids), "ids": ids}
+
+    def _filter_rows(self, filter_conditions: Dict) -> np.ndarray:
+        return np.fromiter(sorted(self._matching_rows(filter_conditions) - self._deleted), dtype=np.int64)
+
+    def _matching_rows(self, filter_conditions: Dict) -> set:
+        rows = None
+        for key, value in filter_conditions.items():
+            values = value if isinstance(value, (tuple, list)) else (value,)
+            if key == "any_of":
+                matches = set().union(*(self._matching_rows(alternative) for alternative in values))
+            elif key == "id":
+                matches = {self._rows_by_id[vector_id] for vector_id in values if vector_id in self._rows_by_id}
+            else:
+                matches = set().union(*(self._filter_index.get((key, item), ()) for item in values))
+            rows = matches if rows is None else rows & matches
+            if not rows:
+                break
+        return rows or set()
+
+    def search(self, query_embedding, top_k: int = 5,
+               filter_conditions: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Exact cosine top-k search, optionally restricted to rows matching filter_conditions"""
+        return self.search_batch([query_embedding], top_k, [filter_conditions])[0]
+
+    def search_batch(self, query_embeddings, top_k: int = 5,
+                     filter_conditions: Optional[List[Optional[Dict]]] = None) -> List[List[Dict[str, Any]]]:
+        """Exact cosine top-k search for many queries, one matrix product per distinct filter"""
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        filters = filter_conditions or [None] * len(queries)
+
+        # Queries grouped by filter; filters may nest (any_of), so they are keyed by their repr
+        groups: Dict[str, List[int]] = {}
+        group_filters: Dict[str, Optional[Dict]] = {}
+        for i, conditions in enumerate(filters):
+            key = repr(sorted((conditions or {}).items()))
+            groups.setdefault(key, []).append(i)
+            group_filters[key] = conditions
+
+        with self._lock:
+            # A compaction replaces these rather than changing them, so rows read here stay valid
+            count = self._count
+            vectors = self._vectors[:count]
+            ids, texts, metadata = self._ids, self._texts, self._metadata
+            group_rows = {key: self._filter_rows(group_filters[key]) if group_filters[key] else self._live_rows()
+                          for key in groups}
+
+        hits = [[] for _ in range(len(queries))]
+        if count == 0 or top_k <= 0:
+            return hits
+        for key, positions in groups.items():
+            rows = group_rows[key]
+            if rows is not None and len(rows) == 0:
+                continue
+            matrix = vectors[rows] if rows is not None else vectors
+            scores = matrix @ queries[positions].T
+            k = min(top_k, len(matrix))
+            best = np.argpartition(-scores, k - 1, axis=0)[:k]
+            for column, i in enumerate(positions):
+                column_best = best[:, column]
+                column_best = column_best[np.argsort(-scores[column_best, column])]
+                for position in column_best:
+                    row = int(rows[position]) if rows is not None else int(position)
+                    hits[i].append({
+                        "id": ids[row],
+                        "distance": float(scores[position, column]),
+                        "entity": {"text": texts[row], "metadata": metadata[row]}
+                    })
+        return hits
+
+    def delete(self, ids) -> int:
+        """Tombstone chunks by id; their rows are skipped by searches until the next compaction"""
+        with self._lock:
+            removed = self._tombstone(ids)
+            if removed and self.path:
+                with open(self._records_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"deleted": list(ids)}) + "\n")
+            deleted = len(self._deleted)
+            if deleted >= self.compact_min_rows and deleted > self.compact_ratio * self._count:
+                self._compact()
+        return removed
+
+    def _compact(self):
+        """Rewrite the live rows, in order, to new vectors and records; caller holds the lock"""
+        live = self._live_rows()
+        records = [(self._ids[row], self._texts[row], self._metadata[row]) for row in live]
+        capacity = self.initial_capacity
+        while capacity < len(live):
+            capacity *= 2
+
+        if not self.path:
+            vectors = np.zeros((capacity, self.dimension), dtype=np.float32)
+            vectors[:len(live)] = self._vectors[live]
+        else:
+            temp_path = self._vectors_path + ".tmp.npy"
+            compacted = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.float32,
+                                                  shape=(capacity, self.dimension))
+            compacted[:len(live)] = self._vectors[live]
+            compacted.flush()
+            del compacted
+            temp_records = self._records_path + ".tmp"
+            with open(temp_records, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"next_id": self._next_id}) + "\n")
+                for vector_id, text, metadata in records:
+                    f.write(json.dumps({"id": vector_id, "text": text, "metadata": metadata}) + "\n")
+            # Once the compacted records are in place the compaction is committed: if the
+            # process dies before the files are swapped in, the next load finishes the swap
+            os.replace(temp_records, self._compacted_records_path)
+            self._finish_compaction()
+            vectors = np.load(self._vectors_path, mmap_mode="r+")
+
+        self._vectors = vectors
+        self._reset_rows()
+        for vector_id, text, metadata in records:
+            self._add_record(vector_id, text, metadata)
+
+    def _finish_compaction(self):
+        """Complete a compaction interrupted after both its files were written"""
+        if not os.path.exists(self._compacted_records_path):
+            return
+        temp_path = self._vectors_path + ".tmp.npy"
+        if os.path.exists(temp_path):
+            os.replace(temp_path, self._vectors_path)
+        os.replace(self._compacted_records_path, self._records_path)
+
+    def clear(self):
+        """Remove all documents and their files"""
+        with self._lock:
+            if self.path:
+                self._vectors = None
+                for file_path in (self._vectors_path, self._records_path, self._compacted_records_path):
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+            self._load()
+
+    def get_collection_stats(self) -> Optional[Dict[str, Any]]:
+        """Get collection statistics"""
+        return {
+            "collection_name": "numpy",
+            "stats": {
+                "dimension": self.dimension,
+                "capacity": int(self._vectors.shape[0]),
+                "path": self.path
+            },
+            "document_count": self._count - len(self._deleted)
+        }
@@ -0,0 +1,70 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+from app.core.config import settings
+
+
+class VectorStore(ABC):
+    """Interface RAGEngine uses to store and search chunk embeddings
+
+    Search hits use the Milvus result shape:
+    {"id": ..., "distance": <cosine similarity>, "entity": {"text": ..., "metadata": {...}}}
+    Filter conditions are {metadata_key: value} pairs that must all match. The key
+    "id" matches the store's chunk ids, and a tuple or list value matches any of its items.
+    The key "any_of" takes a tuple of such condition dicts, at least one of which must match.
+    """
+
+    @abstractmethod
+    def insert_documents(self, embeddings, texts, metadata_list) -> Dict[str, Any]:
+        """Insert chunks; returns {"insert_count": n, "ids": [...]}"""
+
+    @abstractmethod
+    def search(self, query_embedding, top_k: int = 5,
+               filter_conditions: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Return the top_k most similar chunks"""
+    
+    def search_batch(self, query_embeddings, top_k: int = 5,
+                     filter_conditions: Optional[List[Optional[Dict]]] = None) -> List[List[Dict[str, Any]]]:
+        """Return the top_k hits for each query, with an optional filter per query
+
+        Backends override this to answer all queries in as few calls as possible.
+        """
+        filters = filter_conditions or [None] * len(query_embeddings)
+        return [self.search(embedding, top_k, filters[i]) for i, embedding in enumerate(query_embeddings)]
+
+    @abstractmethod
+    def delete(self, ids: List[Any]) -> int:
+        """Remove chunks by id; returns how many were removed"""
+
+    @abstractmethod
+    def clear(self):
+        """Remove every stored chunk, leaving an empty, usable store"""
+
+    @abstractmethod
+    def get_collection_stats(self) -> Optional[Dict[str, Any]]:
+        """Return store statistics, including document_count"""
+
+
+def matches_filter(filter_conditions: Optional[Dict], chunk_id: Any, metadata: Dict[str, Any]) -> bool:
+    """Whether a chunk satisfies VectorStore filter conditions, comparing values as strings"""
+    for key, value in (filter_conditions or {}).items():
+        if key == "any_of":
+            if not any(matches_filter(alternative, chunk_id, metadata) for alternative in value):
+                return False
+            continue
+        values = value if isinstance(value, (tuple, list)) else (value,)
+        if str(chunk_id if key == "id" else metadata.get(key)) not in {str(item) for item in values}:
+            return False
+    return True
+
+
+def create_vector_store(backend: Optional[str] = None, milvus_pool=None) -> VectorStore:
+    """Build the vector store selected by VECTOR_STORE_BACKEND ("milvus" or "numpy")"""
+    backend = (backend or settings.VECTOR_STORE_BACKEND).lower()
+    if backend == "milvus":
+        from app.core.milvus_client import MilvusManager
+        return MilvusManager(pool=milvus_pool)
+    if backend == "numpy":
+        from app.core.numpy_store import NumpyVectorStore
+        return NumpyVectorStore(path=settings.NUMPY_STORE_PATH or None, dimension=settings.EMBEDDING_DIMENSION,
+                                compact_ratio=settings.NUMPY_COMPACT_RATIO)
+    raise ValueError(f"Unsupported vector store backend: {backend}")
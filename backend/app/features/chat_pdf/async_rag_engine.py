@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
+from app.core.embeddings import AsyncEmbeddingGenerator
+from app.core.metrics import record_span, span
+from app.features.chat_pdf.rag_engine import RAGEngine
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRAGEngine:
+    """Search and chat for the server's event loop, over the stores and caches of a RAGEngine
+
+    OpenAI calls go through AsyncOpenAI; vector store searches, BM25 lookups and
+    registry reads block, so they run on worker threads. A chat waiting on the
+    network then holds no thread, and many can be in flight in one process.
+    Results, caching and metrics match RAGEngine's. Indexing stays with the
+    RAGEngine and its ingestion queue.
+    """
+
+    def __init__(self, engine: RAGEngine, client: "AsyncOpenAI"):
+        self.engine = engine
+        self.openai_client = client
+        self.embedding_generator = AsyncEmbeddingGenerator(engine.embedding_generator, client)
+
+    async def collection_generation(self) -> int:
+        return await asyncio.to_thread(self.engine.document_registry.generation)
+
+    async def search_chunks(self, query: str, top_k: int = 5, filter_conditions: Optional[Dict] = None,
+                            mode: Optional[str] = None) -> Dict[str, Any]:
+        """Search chunks, as RAGEngine.search_chunks"""
+        mode = self.engine._resolve_mode(mode)
+        return await self._search_chunks(query, top_k, filter_conditions, mode, await self.collection_generation())
+
+    async def _search_chunks(self, query: str, top_k: int, filter_conditions: Optional[Dict],
+                             mode: str, generation: int) -> Dict[str, Any]:
+        batch = await self._search_chunks_batch([query], top_k, [filter_conditions], mode, generation)
+        return dict(batch["responses"][0], timings_ms=batch["timings_ms"])
+
+    async def _search_chunks_batch(self, queries: List[str], top_k: int, filters: List[Optional[Dict]],
+                                   mode: str, generation: int) -> Dict[str, Any]:
+        """RAGEngine._search_chunks_batch, with its blocking steps on worker threads"""
+        engine = self.engine
+        search = engine._start_search(queries, top_k, filters, mode, generation)
+        try:
+            if search.document_filters:
+                await asyncio.to_thread(engine._resolve_document_filters, search)
+            if search.uses_lexical():
+                await asyncio.to_thread(engine._search_lexical, search)
+
+            texts = search.vector_texts()
+            if texts:
+                start = time.perf_counter()
+                embeddings = await self.embedding_generator.generate_query_embeddings(texts)
+                search.timings["embedding"] = engine._elapsed_ms(start)
+                await asyncio.to_thread(engine._search_vectors, search, embeddings)
+
+            if search.pending:
+                await asyncio.to_thread(engine._fuse_results, search)
+        except Exception as e:
+            engine._search_failed(search, e)
+        return engine._finish_search(search)
+
+    async def _prepare_chat(self, query: str, top_k: int, filter_conditions: Optional[Dict],
+                            conversation_history: Optional[List[Dict]]) -> Dict[str, Any]:
+        generation = await self.collection_generation()
+        mode = self.engine._resolve_mode(None)
+        relevant_chunks = (await self._search_chunks(query, top_k, filter_conditions, mode, generation))["results"]
+        return self.engine._build_chat(query, relevant_chunks, conversation_history, generation)
+
+    async def chat(self, query: str, top_k: int = 5, filter_conditions: Optional[Dict] = None,
+                   conversation_history: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """Chat with documents using RAG, as RAGEngine.chat"""
+        engine = self.engine
+        prepared = None
+        try:
+            prepared = await self._prepare_chat(query, top_k, filter_conditions, conversation_history)
+            answer = engine._answer_without_model(prepared)
+            if answer is None:
+                with span("chat.completion"):
+                    response = await self.openai_client.chat.completions.create(
+                        **engine._completion_request(prepared)
+                    )
+                answer = response.choices[0].message.content
+                engine._record_answer(prepared, answer, getattr(response, "usage", None))
+            return engine._chat_reply(answer, prepared)
+
+        except Exception as e:
+            return engine._chat_reply(f"Error generating response: {str(e)}", prepared)
+
+    async def stream_chat_with_context(self, query: str, top_k: int = 5,
+                                       filter_conditions: Optional[Dict] = None,
+                                       conversation_history: Optional[List[Dict]] = None
+                                       ) -> AsyncIterator[Dict[str, Any]]:
+        """Chat with documents using RAG, yielding events as the reply is generated
+
+        Yields {"event": "sources", ...} once retrieval finishes, then one
+        {"event": "token", ...} per streamed model delta, and finally
+        {"event": "done", ...} with the full reply, time to first token and
+        total latency in milliseconds (or {"event": "error", ...}).
+        """
+        engine = self.engine
+        start = time.perf_counter()
+        elapsed_ms = lambda: round((time.perf_counter() - start) * 1000, 1)
+        first_token_ms = None
+        parts = []
+        try:
+            prepared = await self._prepare_chat(query, top_k, filter_conditions, conversation_history)
+            yield {"event": "sources", "sources": engine._sources(prepared["chunks"]), "retrieval_ms": elapsed_ms()}
+
+            answer = engine._answer_without_model(prepared)
+            if answer is not None:
+                # Nothing to generate: send the whole reply as a single token
+                first_token_ms = elapsed_ms()
+                parts.append(answer)
+                yield {"event": "token", "content": answer}
+            else:
+                completion_start = time.perf_counter()
+                stream = await self.openai_client.chat.completions.create(
+                    **engine._completion_request(prepared, stream=True)
+                )
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if not content:
+                        continue
+                    if first_token_ms is None:
+                        first_token_ms = elapsed_ms()
+                        record_span("chat.first_token", time.perf_counter() - completion_start, completion_start)
+                    parts.append(content)
+                    yield {"event": "token", "content": content}
+                record_span("chat.stream", time.perf_counter() - completion_start, completion_start)
+                engine._record_answer(prepared, "".join(parts))
+
+            yield {
+                "event": "done",
+                "reply": "".join(parts),
+                "cached": answer is not None and bool(prepared["chunks"]),
+                "prompt_tokens": prepared["prompt_tokens"],
+                "prompt_tokens_saved": prepared["prompt_tokens_saved"],
+                "time_to_first_token_ms": first_token_ms,
+                "total_ms": elapsed_ms()
+            }
+
+        except Exception as e:
+            yield {"event": "error", "message": f"Error generating response: {str(e)}", "total_ms": elapsed_ms()}
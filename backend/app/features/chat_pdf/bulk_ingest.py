@@ -0,0 +1,460 @@
+import logging
+import json
+import os
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.core.document_registry import hash_content, hash_file, hash_chunk, scope_hash
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ("pdf", "png", "jpg", "jpeg", "gif", "bmp", "tiff")
+
+# Statuses recorded in the manifest that mean a document needs no more work
+DONE_STATUSES = ("indexed", "duplicate", "empty")
+
+_END = object()
+
+
+class _Document:
+    __slots__ = ("key", "name", "path", "data", "file_type", "doc_hash", "chunks", "chunk_hashes",
+                 "pending", "new_chunks", "failed")
+
+    def __init__(self, key: str, name: str, file_type: str, path: Optional[str] = None,
+                 data: Optional[bytes] = None):
+        self.key = key
+        self.name = name
+        self.file_type = file_type
+        self.path = path
+        self.data = data
+        self.doc_hash = None
+        self.chunks: List[Dict[str, Any]] = []
+        self.chunk_hashes: List[str] = []
+        self.pending = 0
+        self.new_chunks = 0
+        self.failed = False
+
+
+class Manifest:
+    """Append-only JSON lines record of finished documents, used to resume a run"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, key: str) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and entry["status"] in DONE_STATUSES
+
+    def record(self, key: str, status: str, **fields):
+        entry = dict(key=key, status=status, finished_at=time.time(), **fields)
+        with self._lock:
+            self.entries[key] = entry
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class StageStats:
+    """Busy time and item count of one pipeline stage"""
+
+    def __init__(self, name: str, workers: int = 1):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, items: int = 1):
+        with self._lock:
+            self.busy += seconds
+            self.items += items
+
+    def utilization(self, wall: float) -> float:
+        return self.busy / (wall * self.workers) if wall > 0 else 0.0
+
+
+class BulkIngester:
+    """Index a directory or archive of documents through a pipeline of concurrent stages
+
+    read -> extract/chunk (extract_workers threads) -> embed -> insert, connected by
+    bounded queues so memory stays flat however large the source. Embedding
+    requests and vector store inserts are batched across documents. A document is
+    recorded in the manifest once all its chunks are stored, so an interrupted
+    run resumes with the documents it had not finished.
+
+    Uses the engine's document processor, embedding generator, vector store,
+    document registry and lexical index, so bulk-loaded documents are
+    deduplicated against, and searchable exactly like, uploaded ones.
+    """
+
+    def __init__(self, rag_engine, manifest_path: str, extract_workers: int = 2,
+                 embed_batch_size: int = 512, insert_batch_size: int = 1000, queue_size: int = 32,
+                 flush_interval: float = 2.0, extensions: Tuple[str, ...] = SUPPORTED_EXTENSIONS,
+                 matter: Optional[str] = None):
+        self.engine = rag_engine
+        self.matter = matter
+        self.manifest = Manifest(manifest_path)
+        self.extract_workers = max(1, extract_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.insert_batch_size = max(1, insert_batch_size)
+        self.flush_interval = flush_interval
+        self.extensions = tuple(ext.lower().lstrip(".") for ext in extensions)
+
+        self._read_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._embed_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._insert_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        # Scheduled chunk hashes -> documents waiting for them to be stored, the one embedding them first
+        self._waiting: Dict[str, List[_Document]] = {}
+        self._scheduled_docs = set()
+        self._lock = threading.Lock()
+
+        self.stages = {
+            "read": StageStats("read"),
+            "extract": StageStats("extract", self.extract_workers),
+            "embed": StageStats("embed"),
+            "insert": StageStats("insert"),
+        }
+        self.counts = {"documents": 0, "indexed": 0, "duplicate": 0, "empty": 0, "failed": 0,
+                       "skipped": 0, "chunks": 0, "new_chunks": 0}
+        self.started_at = None
+        self.finished_at = None
+
+    # Sources
+
+    def iter_source(self, source: str) -> Iterator[_Document]:
+        """Yield the documents of a directory tree, .zip or .tar(.gz/.bz2/.xz) archive not yet finished"""
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for filename in sorted(files):
+                    path = os.path.join(root, filename)
+                    key = os.path.relpath(path, source)
+                    file_type = self._file_type(filename)
+                    if file_type and self._pending(key):
+                        yield _Document(key, filename, file_type, path=path)
+        elif zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                for info in archive.infolist():
+                    file_type = self._file_type(info.filename)
+                    if not info.is_dir() and file_type and self._pending(info.filename):
+                        yield _Document(info.filename, os.path.basename(info.filename), file_type,
+                                        data=archive.read(info))
+        elif tarfile.is_tarfile(source):
+            # Streamed in archive order, so compressed tarballs are read once front to back
+            with tarfile.open(source, "r|*") as archive:
+                for member in archive:
+                    file_type = self._file_type(member.name)
+                    if member.isfile() and file_type and self._pending(member.name):
+                        yield _Document(member.name, os.path.basename(member.name), file_type,
+                                        data=archive.extractfile(member).read())
+        else:
+            raise ValueError(f"Source must be a directory, .zip or .tar archive: {source}")
+
+    def _pending(self, key: str) -> bool:
+        if self.manifest.is_done(key):
+            with self._lock:
+                self.counts["skipped"] += 1
+            return False
+        return True
+
+    def _file_type(self, filename: str) -> Optional[str]:
+        ext = os.path.splitext(filename)[1].lower().lstrip(".")
+        return ext if ext in self.extensions else None
+
+    # Pipeline
+
+    def run(self, source: str, progress_interval: float = 10.0) -> Dict[str, Any]:
+        """Ingest every not yet finished document in source and return the run summary"""
+        self.started_at = time.time()
+        threads = [threading.Thread(target=self._read_stage, args=(source,), name="ingest-read")]
+        threads += [threading.Thread(target=self._extract_stage, name=f"ingest-extract-{i}")
+                    for i in range(self.extract_workers)]
+        threads += [threading.Thread(target=self._embed_stage, name="ingest-embed"),
+                    threading.Thread(target=self._insert_stage, name="ingest-insert")]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                threads[-1].join(timeout=progress_interval)
+                if threads[-1].is_alive():
+                    logger.info(self.format_progress())
+        except KeyboardInterrupt:
+            logger.warning("Interrupted: stopping after the batches in flight; rerun with the same manifest to resume")
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.finished_at = time.time()
+            self.manifest.close()
+        return self.summary()
+
+    def _put(self, target: "queue.Queue", item):
+        """Put that gives up when the run is stopping, so no stage blocks forever"""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_stage(self, source: str):
+        try:
+            documents = self.iter_source(source)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                document = next(documents, None)
+                self.stages["read"].add(time.perf_counter() - start)
+                if document is None:
+                    break
+                self._put(self._read_queue, document)
+        except Exception as e:
+            logger.error("Error reading %s: %s", source, e)
+            self._stop.set()
+        finally:
+            for _ in range(self.extract_workers):
+                self._read_queue.put(_END)
+
+    def _extract_stage(self):
+        registry = self.engine.document_registry
+        while True:
+            document = self._read_queue.get()
+            if document is _END:
+                self._embed_queue.put(_END)
+                return
+            if self._stop.is_set():
+                continue
+
+            start = time.perf_counter()
+            try:
+                document.doc_hash = scope_hash(
+                    hash_file(document.path) if document.path else hash_content(document.data), self.matter
+                )
+                with self._lock:
+                    duplicate = document.doc_hash in self._scheduled_docs
+                    self._scheduled_docs.add(document.doc_hash)
+                if duplicate or registry.find_document_by_hash(document.doc_hash):
+                    self._finish(document, "duplicate")
+                    continue
+                document.chunks = self.engine.doc_processor.process_file(
+                    document.path, document.data, document.file_type
+                )
+                document.data = None
+                document.chunk_hashes = [hash_chunk(chunk["text"], self.matter) for chunk in document.chunks]
+                for chunk, chunk_hash in zip(document.chunks, document.chunk_hashes):
+                    chunk["metadata"].update(doc_id=document.doc_hash, doc_hash=document.doc_hash,
+                                             chunk_hash=chunk_hash, filename=document.name)
+                    if self.matter:
+                        chunk["metadata"]["matter"] = self.matter
+            except Exception as e:
+                self._finish(document, "failed", error=str(e))
+                continue
+            finally:
+                self.stages["extract"].add(time.perf_counter() - start)
+
+            if not document.chunks:
+                self._finish(document, "empty")
+                continue
+            self._put(self._embed_queue, document)
+
+    def _embed_stage(self):
+        """Collect new chunks across documents and embed them batch by batch"""
+        registry = self.engine.document_registry
+        buffer: List[Tuple[_Document, Dict[str, Any]]] = []
+        ended = 0
+        last_flush = time.monotonic()
+        while ended < self.extract_workers:
+            try:
+                document = self._embed_queue.get(timeout=0.5)
+            except queue.Empty:
+                document = None
+            if document is _END:
+                ended += 1
+            elif document is not None and not self._stop.is_set():
+                # Chunks already stored are not embedded again; chunks already scheduled by an
+                # earlier document are not either, but this one waits until they are stored
+                known = registry.known_chunks(document.chunk_hashes)
+                with self._lock:
+                    for chunk, chunk_hash in zip(document.chunks, document.chunk_hashes):
+                        if chunk_hash in known:
+                            continue
+                        waiting = self._waiting.get(chunk_hash)
+                        if waiting is None:
+                            self._waiting[chunk_hash] = [document]
+                            document.new_chunks += 1
+                            buffer.append((document, chunk))
+                        elif document in waiting:
+                            continue
+                        else:
+                            waiting.append(document)
+                        document.pending += 1
+                    # Read under the lock: once released, the insert stage may finish the document
+                    stored = document.pending == 0
+                if stored:
+                    self._put(self._insert_queue, ("document", document))
+
+            if self._stop.is_set():
+                buffer = []
+            if buffer and (len(buffer) >= self.embed_batch_size or ended == self.extract_workers
+                           or time.monotonic() - last_flush >= self.flush_interval):
+                self._embed_batch(buffer)
+                buffer = []
+                last_flush = time.monotonic()
+        if buffer:
+            self._embed_batch(buffer)
+        self._insert_queue.put(_END)
+
+    def _embed_batch(self, batch: List[Tuple[_Document, Dict[str, Any]]]):
+        start = time.perf_counter()
+        try:
+            embeddings = self.engine.embedding_generator.generate_embeddings([chunk["text"] for _, chunk in batch])
+        except Exception as e:
+            logger.error("Error embedding batch of %d chunks: %s", len(batch), e)
+            self._fail_chunks([chunk["metadata"]["chunk_hash"] for _, chunk in batch], f"Embedding failed: {e}")
+            return
+        finally:
+            self.stages["embed"].add(time.perf_counter() - start, len(batch))
+        self._put(self._insert_queue, ("rows", [
+            (document, chunk, embedding) for (document, chunk), embedding in zip(batch, embeddings)
+        ]))
+
+    def _insert_stage(self):
+        """Write embedded chunks to the vector store in batches, finishing documents as they complete"""
+        buffer = []
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._insert_queue.get(timeout=0.5)
+            except queue.Empty:
+                item = None
+            if item is _END:
+                break
+            if self._stop.is_set():
+                buffer = []
+                continue
+            if item is not None:
+                kind, payload = item
+                if kind == "document":
+                    self._finish(payload, "indexed")
+                else:
+                    buffer.extend(row for row in payload if self._wanted(row[1]["metadata"]["chunk_hash"]))
+            if buffer and (len(buffer) >= self.insert_batch_size
+                           or time.monotonic() - last_flush >= self.flush_interval):
+                self._insert_batch(buffer)
+                buffer = []
+                last_flush = time.monotonic()
+        if buffer and not self._stop.is_set():
+            self._insert_batch(buffer)
+
+    def _insert_batch(self, rows):
+        start = time.perf_counter()
+        chunk_hashes = [chunk["metadata"]["chunk_hash"] for _, chunk, _ in rows]
+        try:
+            texts = [chunk["text"] for _, chunk, _ in rows]
+            metadata_list = [chunk["metadata"] for _, chunk, _ in rows]
+            result = self.engine.vector_store.insert_documents([embedding for _, _, embedding in rows],
+                                                               texts, metadata_list)
+            ids = list(result["ids"]) if result and "ids" in result else [None] * len(rows)
+            self.engine.lexical_index.add_many(ids, texts, metadata_list)
+            # Record stored chunks at once, so a resumed run never inserts them twice; copies of
+            # chunks another writer (an API upload, another run) recorded first are deleted
+            duplicates = self.engine.document_registry.add_chunks(
+                {metadata["chunk_hash"]: vector_id for metadata, vector_id in zip(metadata_list, ids)},
+                {metadata["chunk_hash"]: metadata for metadata in metadata_list}
+            )
+            self.engine._delete_vectors(list(duplicates.values()))
+        except Exception as e:
+            logger.error("Error inserting batch of %d chunks: %s", len(rows), e)
+            self._fail_chunks(chunk_hashes, f"Insert failed: {e}")
+            return
+        finally:
+            self.stages["insert"].add(time.perf_counter() - start, len(rows))
+
+        # Stored chunks are now known to the registry, so they stop being scheduled
+        documents = {}
+        with self._lock:
+            for chunk_hash in chunk_hashes:
+                for document in self._waiting.pop(chunk_hash, ()):
+                    document.pending -= 1
+                    documents[id(document)] = document
+        for document in documents.values():
+            if document.pending == 0 and not document.failed:
+                self._finish(document, "indexed")
+        self.engine._bump_generation()
+
+    def _wanted(self, chunk_hash: str) -> bool:
+        """Whether a document that has not failed still waits for the chunk"""
+        with self._lock:
+            return any(not document.failed for document in self._waiting.get(chunk_hash, ()))
+
+    def _fail_chunks(self, chunk_hashes: List[str], error: str):
+        """Fail every document waiting for chunks that could not be stored, borrowers included"""
+        documents = {}
+        with self._lock:
+            for chunk_hash in chunk_hashes:
+                for document in self._waiting.pop(chunk_hash, ()):
+                    documents[id(document)] = document
+        for document in documents.values():
+            if not document.failed:
+                document.failed = True
+                self._finish(document, "failed", error=error)
+
+    def _finish(self, document: _Document, status: str, error: Optional[str] = None):
+        if status == "indexed":
+            self.engine.document_registry.add_document(
+                document.doc_hash, document.doc_hash, document.name, document.chunk_hashes, {}
+            )
+        fields = {"doc_hash": document.doc_hash, "chunks": len(document.chunks),
+                  "new_chunks": document.new_chunks}
+        if error:
+            fields["error"] = error
+            logger.warning("Failed to ingest %s: %s", document.key, error)
+        self.manifest.record(document.key, status, **fields)
+        with self._lock:
+            self.counts["documents"] += 1
+            self.counts[status] += 1
+            if status == "indexed":
+                self.counts["chunks"] += len(document.chunks)
+                self.counts["new_chunks"] += document.new_chunks
+        document.chunks = []
+
+    # Reporting
+
+    def summary(self) -> Dict[str, Any]:
+        wall = (self.finished_at or time.time()) - self.started_at
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            **counts,
+            "seconds": round(wall, 2),
+            "docs_per_second": round(counts["documents"] / wall, 2) if wall else 0.0,
+            "chunks_per_second": round(counts["new_chunks"] / wall, 2) if wall else 0.0,
+            "stage_utilization": {name: round(stage.utilization(wall), 3) for name, stage in self.stages.items()},
+            "queue_depths": {"read": self._read_queue.qsize(), "embed": self._embed_queue.qsize(),
+                             "insert": self._insert_queue.qsize()}
+        }
+
+    def format_progress(self) -> str:
+        summary = self.summary()
+        utilization = " ".join(f"{name}={value:.0%}" for name, value in summary["stage_utilization"].items())
+        queues = " ".join(f"{name}={depth}" for name, depth in summary["queue_depths"].items())
+        return (f"{summary['documents']} docs ({summary['failed']} failed, {summary['duplicate']} duplicate) "
+                f"{summary['new_chunks']} chunks | {summary['docs_per_second']} docs/s "
+                f"{summary['chunks_per_second']} chunks/s | busy: {utilization} | queued: {queues}")
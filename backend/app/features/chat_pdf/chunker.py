@@ -0,0 +1,173 @@
+import re
+from collections import deque
+from typing import Callable, Deque, Dict, Any, Iterable, Iterator, Optional, Tuple
+from app.utils.tokens import count_tokens
+
+# Paragraphs are separated by blank lines
+PARAGRAPH_BREAK = re.compile(r"\n[ \t\r\f\v]*\n\s*")
+
+# A unit ends at a sentence or clause terminator followed by whitespace, or just
+# before a line that opens an enumerated clause such as "(a)", "12.3" or "iv."
+UNIT_BOUNDARY = re.compile(
+    r"[.;:?!][\"')\]]*(?=\s)|(?=\n[ \t]*(?:\(?[0-9]{1,3}(?:\.[0-9]+)*[.)]|\([a-z]{1,4}\)|[ivx]{1,5}\.|[•\-*])\s)"
+)
+
+
+class _Unit:
+    __slots__ = ("text", "tokens", "page", "start", "end", "paragraph_start")
+
+    def __init__(self, text: str, tokens: int, page: Optional[int], start: int, end: int,
+                 paragraph_start: bool):
+        self.text = text
+        self.tokens = tokens
+        self.page = page
+        self.start = start
+        self.end = end
+        self.paragraph_start = paragraph_start
+
+
+class TokenChunker:
+    """Split a stream of pages into token-bounded chunks in a single pass
+
+    Text is cut into units at paragraph, sentence and clause boundaries, and
+    units are packed into chunks of at most max_tokens tokens. The last units
+    of a chunk, up to overlap_tokens, are repeated at the start of the next;
+    when the last unit alone is longer than that, its last words are repeated.
+    A unit longer than max_tokens on its own is split at word boundaries.
+
+    Each chunk records the page it starts on, the page it ends on and the
+    character offsets of its first and last unit within those pages.
+    """
+
+    def __init__(self, max_tokens: int = 256, overlap_tokens: int = 32,
+                 model: str = "text-embedding-ada-002",
+                 token_counter: Optional[Callable[[str], int]] = None):
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+        self.count_tokens = token_counter or (lambda text: count_tokens(text, model))
+
+    def chunk_text(self, text: str, page: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Chunk a single text as if it were one page"""
+        return self.chunk_pages([(page, text)])
+
+    def chunk_pages(self, pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[Dict[str, Any]]:
+        """Yield {"text", "page", "page_end", "char_start", "char_end"} for each chunk"""
+        window: Deque[_Unit] = deque()
+        window_tokens = 0
+        fresh = False  # whether the window holds units not yet emitted
+
+        for unit in self._iter_units(pages):
+            if window and window_tokens + unit.tokens > self.max_tokens:
+                if fresh:
+                    yield self._make_chunk(window)
+                last = window[-1]
+                # Keep the tail of the chunk as overlap, as long as the new unit still fits
+                while window and (window_tokens > self.overlap_tokens
+                                  or window_tokens + unit.tokens > self.max_tokens):
+                    window_tokens -= window.popleft().tokens
+                if not window:
+                    # The last unit is too long to repeat whole, so repeat its last words instead
+                    tail = self._tail_unit(last, min(self.overlap_tokens, self.max_tokens - unit.tokens))
+                    if tail is not None:
+                        window.append(tail)
+                        window_tokens = tail.tokens
+            window.append(unit)
+            window_tokens += unit.tokens
+            fresh = True
+
+        if window and fresh:
+            yield self._make_chunk(window)
+
+    def _iter_units(self, pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[_Unit]:
+        for page, text in pages:
+            if not text or text.isspace():
+                continue
+            for paragraph_start_pos, paragraph_end_pos in self._paragraph_spans(text):
+                paragraph_start = True
+                for start, end in self._unit_spans(text, paragraph_start_pos, paragraph_end_pos):
+                    raw = text[start:end]
+                    unit_text = " ".join(raw.split())
+                    if not unit_text:
+                        continue
+                    start += len(raw) - len(raw.lstrip())
+                    # One extra token allows for the separator joining the unit to the previous one
+                    tokens = self.count_tokens(unit_text) + 1
+                    if tokens <= self.max_tokens:
+                        yield _Unit(unit_text, tokens, page, start, end, paragraph_start)
+                    else:
+                        yield from self._split_long_unit(unit_text, tokens, page, start, end, paragraph_start)
+                    paragraph_start = False
+
+    @staticmethod
+    def _paragraph_spans(text: str) -> Iterator[Tuple[int, int]]:
+        start = 0
+        for match in PARAGRAPH_BREAK.finditer(text):
+            yield start, match.start()
+            start = match.end()
+        yield start, len(text)
+
+    @staticmethod
+    def _unit_spans(text: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        for match in UNIT_BOUNDARY.finditer(text, start, end):
+            if match.end() > start:
+                yield start, match.end()
+                start = match.end()
+        if start < end:
+            yield start, end
+
+    def _split_long_unit(self, text: str, tokens: int, page: Optional[int], start: int, end: int,
+                         paragraph_start: bool) -> Iterator[_Unit]:
+        """Cut an oversized unit at word boundaries into pieces that fit max_tokens"""
+        position = 0
+        while position < len(text):
+            # Estimate the piece length from the unit's characters per token, then back off to a space
+            length = max(1, len(text) * self.max_tokens // tokens)
+            while True:
+                piece_end = min(len(text), position + length)
+                if piece_end < len(text):
+                    space = text.rfind(" ", position + 1, piece_end)
+                    if space != -1:
+                        piece_end = space
+                piece = text[position:piece_end].strip()
+                piece_tokens = self.count_tokens(piece) + 1
+                if piece_tokens <= self.max_tokens or length == 1:
+                    break
+                length = max(1, length * self.max_tokens // piece_tokens - 1)
+            if piece:
+                # Offsets of pieces are approximated by the offsets of the whole unit
+                yield _Unit(piece, piece_tokens, page, start, end, paragraph_start)
+            paragraph_start = False
+            position = piece_end
+
+    def _tail_unit(self, unit: _Unit, budget: int) -> Optional[_Unit]:
+        """The longest run of the unit's last words that fits budget tokens, or None"""
+        words = unit.text.split(" ")
+        tail, tokens = None, 0
+        for i in range(len(words) - 1, 0, -1):
+            text = " ".join(words[i:])
+            text_tokens = self.count_tokens(text) + 1
+            if text_tokens > budget:
+                break
+            tail, tokens = text, text_tokens
+        if tail is None:
+            return None
+        # Whitespace in the unit was collapsed, so the start offset is approximate
+        return _Unit(tail, tokens, unit.page, max(unit.start, unit.end - len(tail)), unit.end, False)
+
+    @staticmethod
+    def _make_chunk(window: Deque[_Unit]) -> Dict[str, Any]:
+        parts = []
+        for i, unit in enumerate(window):
+            if i:
+                parts.append("\n\n" if unit.paragraph_start else " ")
+            parts.append(unit.text)
+        first, last = window[0], window[-1]
+        return {
+            "text": "".join(parts),
+            "page": first.page,
+            "page_end": last.page,
+            "char_start": first.start,
+            "char_end": last.end
+        }
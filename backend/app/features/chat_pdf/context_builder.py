@@ -0,0 +1,119 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.utils.tokens import count_tokens
+
+# Overlaps shorter than this are treated as coincidence, not repeated text
+MIN_OVERLAP_CHARS = 16
+
+
+def overlap_length(previous: str, following: str) -> int:
+    """Length of the longest suffix of previous that is also a prefix of following"""
+    probe = following[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    # Try the earliest match first: it gives the longest overlap
+    position = previous.find(probe, max(0, len(previous) - len(following)))
+    while position != -1:
+        if following.startswith(previous[position:]):
+            return len(previous) - position
+        position = previous.find(probe, position + 1)
+    return 0
+
+
+def document_key(metadata: Dict[str, Any]) -> Tuple:
+    # A shared chunk attributed to another document keeps the source it was stored with
+    if metadata.get("doc_id"):
+        return (metadata["doc_id"],)
+    return (metadata.get("doc_hash"), metadata.get("source"), metadata.get("filename"))
+
+
+class ContextBuilder:
+    """Assemble retrieved chunks into a prompt context within a token budget
+
+    Chunks are taken in score order while they fit max_tokens. Chunks of the
+    same document with consecutive chunk_index are merged into one passage,
+    and the text the chunker repeated between them as overlap is kept once,
+    so a passage costs less than its chunks did separately. Passages are
+    ordered by their best chunk's score.
+    """
+
+    def __init__(self, max_tokens: int = 3000, model: str = "gpt-4-turbo",
+                 token_counter: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max_tokens
+        self.count_tokens = token_counter or (lambda text: count_tokens(text, model))
+
+    @staticmethod
+    def format_chunk(chunk: Dict[str, Any]) -> str:
+        """A chunk as it appears in an unmerged context"""
+        metadata = chunk["metadata"]
+        return (f"[Source: {metadata.get('filename', 'Unknown')} - "
+                f"Chunk {metadata.get('chunk_index', 'Unknown')}]\n{chunk['text']}")
+
+    def build(self, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Return {"context", "tokens", "tokens_saved", "chunks_used", "passages"} for scored chunks
+
+        tokens_saved compares against every chunk formatted on its own, unmerged.
+        """
+        baseline = self.count_tokens("\n\n".join(self.format_chunk(chunk) for chunk in chunks))
+        selected: List[Dict[str, Any]] = []
+        context, tokens, passages = "", 0, []
+
+        for chunk in sorted(chunks, key=lambda chunk: chunk.get("score", 0), reverse=True):
+            candidate_passages = self._merge(selected + [chunk])
+            candidate_context = "\n\n".join(passage["text"] for passage in candidate_passages)
+            candidate_tokens = self.count_tokens(candidate_context)
+            if candidate_tokens > self.max_tokens:
+                continue  # a smaller, lower-scored chunk may still fit
+            selected.append(chunk)
+            context, tokens, passages = candidate_context, candidate_tokens, candidate_passages
+
+        return {
+            "context": context,
+            "tokens": tokens,
+            "tokens_saved": max(0, baseline - tokens),
+            "chunks_used": len(selected),
+            "passages": len(passages)
+        }
+
+    def _merge(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Group chunks into passages of consecutive chunks from one document"""
+        ordered = sorted(
+            chunks,
+            key=lambda chunk: (document_key(chunk["metadata"]), self._index(chunk) is None, self._index(chunk) or 0)
+        )
+        runs: List[List[Dict[str, Any]]] = []
+        for chunk in ordered:
+            previous = runs[-1][-1] if runs else None
+            index = self._index(chunk)
+            if (previous is not None and index is not None and self._index(previous) == index - 1
+                    and document_key(previous["metadata"]) == document_key(chunk["metadata"])):
+                runs[-1].append(chunk)
+            else:
+                runs.append([chunk])
+
+        passages = []
+        for run in runs:
+            text = run[0]["text"]
+            for chunk in run[1:]:
+                overlap = overlap_length(text, chunk["text"])
+                rest = chunk["text"][overlap:]
+                text += rest if overlap and not rest[:1].isalnum() else " " + rest
+                text = text.rstrip()
+            passages.append({
+                "text": self._format_passage(run, text),
+                "score": max(chunk.get("score", 0) for chunk in run)
+            })
+        passages.sort(key=lambda passage: passage["score"], reverse=True)
+        return passages
+
+    @staticmethod
+    def _index(chunk: Dict[str, Any]) -> Optional[int]:
+        index = chunk["metadata"].get("chunk_index")
+        return index if isinstance(index, int) else None
+
+    @classmethod
+    def _format_passage(cls, run: List[Dict[str, Any]], text: str) -> str:
+        if len(run) == 1:
+            return cls.format_chunk({"metadata": run[0]["metadata"], "text": text})
+        first, last = run[0]["metadata"], run[-1]["metadata"]
+        return (f"[Source: {first.get('filename', 'Unknown')} - "
+                f"Chunks {first.get('chunk_index')}-{last.get('chunk_index')}]\n{text}")
@@ -0,0 +1,273 @@
+import json
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.utils.tokens import count_tokens
+
+
+# Tokens the chat format adds around each message (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Rough per-message bookkeeping cost on top of the content, for the memory cap
+MESSAGE_OVERHEAD_BYTES = 120
+
+
+# Session every chat without a session id once shared, whatever the client
+LEGACY_SHARED_SESSION = "default"
+
+
+def new_session_id() -> str:
+    """A fresh session id, for a chat that does not continue an existing conversation
+
+    Unguessable, since knowing a session's id is all it takes to read its history.
+    """
+    return uuid.uuid4().hex
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def trim_start(token_counts: List[int], roles: List[str], max_tokens: int) -> int:
+    """Index of the first message to keep so the history fits max_tokens
+
+    The most recent messages are kept. A kept history never opens with an
+    assistant reply, so it always starts at a user turn.
+    """
+    total = 0
+    start = len(token_counts)
+    while start > 0 and total + token_counts[start - 1] <= max_tokens:
+        start -= 1
+        total += token_counts[start]
+    while start < len(roles) and roles[start] != "user":
+        start += 1
+    return start
+
+
+class ConversationStore(ABC):
+    """Chat history per session, trimmed to a token budget
+
+    Messages are {"role": "user" | "assistant", "content": ...} dicts, returned
+    oldest first.
+    """
+
+    def __init__(self, max_tokens: int = 2000):
+        self.max_tokens = max_tokens
+
+    @abstractmethod
+    def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        """Return the session's messages, or [] for an unknown session"""
+
+    @abstractmethod
+    def append(self, session_id: str, messages: List[Dict[str, str]]):
+        """Add messages to the session and trim it to the token budget"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Forget one session"""
+
+    @abstractmethod
+    def clear(self):
+        """Forget every session"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Return store statistics"""
+
+    def close(self):
+        """Release connections; nothing to do for in-process stores"""
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Sessions held in this process, evicted least recently used first
+
+    Eviction starts once there are more than max_sessions sessions or their
+    messages take more than about max_bytes, and sessions idle for longer
+    than ttl seconds are dropped when next looked up.
+    """
+
+    def __init__(self, max_tokens: int = 2000, max_sessions: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = None):
+        super().__init__(max_tokens)
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # session_id -> (messages as (message, tokens, bytes) tuples, last used)
+        self._sessions: "OrderedDict[str, Tuple[List[Tuple[Dict[str, str], int, int]], float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        with self._lock:
+            entries = self._touch(session_id)
+            return [dict(message) for message, _, _ in entries] if entries else []
+
+    def append(self, session_id: str, messages: List[Dict[str, str]]):
+        new_entries = [
+            ({"role": m["role"], "content": m["content"]}, message_tokens(m),
+             len(m["content"].encode("utf-8")) + MESSAGE_OVERHEAD_BYTES)
+            for m in messages
+        ]
+        with self._lock:
+            entries = self._touch(session_id) or []
+            entries = entries + new_entries
+            start = trim_start([tokens for _, tokens, _ in entries],
+                               [message["role"] for message, _, _ in entries], self.max_tokens)
+            old_size = sum(size for _, _, size in self._sessions.pop(session_id, ([], 0))[0])
+            entries = entries[start:]
+            self._bytes += sum(size for _, _, size in entries) - old_size
+            if entries:
+                self._sessions[session_id] = (entries, time.monotonic())
+                self._evict()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            entries, _ = self._sessions.pop(session_id, ([], 0))
+            self._bytes -= sum(size for _, _, size in entries)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions
+            }
+
+    def _touch(self, session_id: str):
+        """Return the session's entries and mark it most recently used; caller holds the lock"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        entries, last_used = session
+        now = time.monotonic()
+        if self.ttl is not None and now - last_used > self.ttl:
+            del self._sessions[session_id]
+            self._bytes -= sum(size for _, _, size in entries)
+            return None
+        self._sessions[session_id] = (entries, now)
+        self._sessions.move_to_end(session_id)
+        return entries
+
+    def _evict(self):
+        # The session just written is last, so it is only evicted if it alone exceeds the cap
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            _, (entries, _) = self._sessions.popitem(last=False)
+            self._bytes -= sum(size for _, _, size in entries)
+            self.evictions += 1
+
+
+class RedisConversationStore(ConversationStore):
+    """Sessions kept in Redis, so every API worker sees the same conversations
+
+    Each session is a Redis list of JSON messages that expires after ttl
+    seconds without use; configure Redis with maxmemory and a volatile-lru
+    policy to cap the memory all sessions take. A sorted set of session ids
+    by last use (index_key, never expiring) counts the sessions, so stats()
+    scans no keys; sessions Redis evicts under memory pressure stay counted
+    until their ttl runs out. client is any redis-py compatible client
+    (rpush, lrange, ltrim, expire, delete, scan_iter, zadd, zrem, zcard,
+    zremrangebyscore).
+    """
+
+    def __init__(self, client, max_tokens: int = 2000, ttl: Optional[float] = None,
+                 key_prefix: str = "legalbot:conversation:", index_key: str = "legalbot:conversations"):
+        super().__init__(max_tokens)
+        self.client = client
+        self.ttl = int(ttl) if ttl else None
+        self.key_prefix = key_prefix
+        self.index_key = index_key
+
+    def _key(self, session_id: str) -> str:
+        return self.key_prefix + session_id
+
+    def _load(self, key: str) -> List[Dict[str, Any]]:
+        return [json.loads(item) for item in self.client.lrange(key, 0, -1)]
+
+    def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        key = self._key(session_id)
+        messages = self._load(key)
+        if messages:
+            self._touch(key, session_id)
+        return [{"role": m["role"], "content": m["content"]} for m in messages]
+
+    def append(self, session_id: str, messages: List[Dict[str, str]]):
+        key = self._key(session_id)
+        # Token counts travel with each message so trimming never re-tokenizes the history
+        self.client.rpush(key, *[json.dumps({"role": m["role"], "content": m["content"],
+                                             "tokens": message_tokens(m)}) for m in messages])
+        stored = self._load(key)
+        start = trim_start([m["tokens"] for m in stored], [m["role"] for m in stored], self.max_tokens)
+        if start:
+            # Counted from the end, so messages appended meanwhile by another worker are kept
+            if start == len(stored):
+                self.delete(session_id)
+            else:
+                self.client.ltrim(key, start - len(stored), -1)
+        if start < len(stored):
+            self._touch(key, session_id)
+
+    def _touch(self, key: str, session_id: str):
+        """Restart the session's ttl and record its last use in the index"""
+        if self.ttl:
+            self.client.expire(key, self.ttl)
+        self.client.zadd(self.index_key, {session_id: time.time()})
+
+    def delete(self, session_id: str):
+        self.client.delete(self._key(session_id))
+        self.client.zrem(self.index_key, session_id)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.key_prefix + "*"))
+        self.client.delete(self.index_key, *keys)
+
+    def stats(self) -> Dict[str, Any]:
+        if self.ttl:
+            # Sessions unused for longer than the ttl have expired
+            self.client.zremrangebyscore(self.index_key, "-inf", time.time() - self.ttl)
+        return {
+            "backend": "redis",
+            "sessions": self.client.zcard(self.index_key)
+        }
+
+    def close(self):
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            close()
+
+
+def create_conversation_store(backend: Optional[str] = None, redis_client=None) -> ConversationStore:
+    """Build the store selected by CONVERSATION_BACKEND ("memory" or "redis")"""
+    backend = (backend or settings.CONVERSATION_BACKEND).lower()
+    ttl = settings.CONVERSATION_TTL or None
+    if backend == "memory":
+        return InMemoryConversationStore(
+            max_tokens=settings.CONVERSATION_MAX_TOKENS,
+            max_sessions=settings.CONVERSATION_MAX_SESSIONS,
+            max_bytes=settings.CONVERSATION_MAX_BYTES,
+            ttl=ttl
+        )
+    if backend == "redis":
+        if redis_client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("CONVERSATION_BACKEND=redis requires the redis package (pip install redis)")
+            redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        store = RedisConversationStore(redis_client, max_tokens=settings.CONVERSATION_MAX_TOKENS, ttl=ttl)
+        # Chats without a session id used to share this session; forget what it holds
+        store.delete(LEGACY_SHARED_SESSION)
+        return store
+    raise ValueError(f"Unsupported conversation backend: {backend}")
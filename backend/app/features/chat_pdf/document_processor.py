@@ -1,176 +1,423 @@
+import logging
 import os
 import io
 import base64
-from typing import List, Dict, Any
-from PIL import Image
-import PyPDF2
-import pytesseract
-from pdf2image import convert_from_path, convert_from_bytes
+import hashlib
+import mmap
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 import tempfile
+from app.core.document_registry import hash_content, hash_file
+from app.core.metrics import span, traced
+from app.utils.parallel import ordered_map
+from app.features.chat_pdf.chunker import TokenChunker
+from app.features.chat_pdf.ocr_cache import OCRCache
+
+logger = logging.getLogger(__name__)
+
+# PyPDF2, pdf2image, pytesseract and PIL are imported where they are used, so importing this
+# module (as every API worker does) costs nothing until a document is actually parsed
+
+# Per-process cache of the last opened PDF, so a worker parses each file once
+# no matter how many page batches of it it is handed
+_worker_pdf = {"key": None, "reader": None, "mapped": None}
+
+
+def _map_file(file_path: str) -> mmap.mmap:
+    """Map a file read-only. PdfReader given a path copies the whole file into memory;
+    given the mapping, it reads pages from the OS page cache instead."""
+    with open(file_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _extract_page_batch(task: Tuple[str, int, int]) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF (runs in a worker process)"""
+    import PyPDF2
+
+    file_path, start, end = task
+    key = (file_path, os.path.getmtime(file_path))
+    if _worker_pdf["key"] != key:
+        previous = _worker_pdf["mapped"]
+        _worker_pdf["mapped"] = _map_file(file_path)
+        _worker_pdf["reader"] = PyPDF2.PdfReader(_worker_pdf["mapped"])
+        _worker_pdf["key"] = key
+        if previous is not None:
+            previous.close()
+    reader = _worker_pdf["reader"]
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _init_ocr_worker():
+    # Each worker runs one tesseract at a time; stop tesseract from also
+    # spreading over every core and oversubscribing the machine
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_page_batch(task: Tuple[str, int, int, int, str]) -> List[str]:
+    """Rasterize pages first_page..last_page (1-based, inclusive) and OCR them"""
+    import pytesseract
+    from pdf2image import convert_from_path
+
+    file_path, first_page, last_page, dpi, lang = task
+    images = convert_from_path(file_path, dpi=dpi, first_page=first_page, last_page=last_page)
+    texts = []
+    for image in images:
+        texts.append(pytesseract.image_to_string(image, lang=lang))
+        image.close()
+    return texts
+
+
+# An inline image in a content stream: BI <parameters> ID <data> EI
+_INLINE_IMAGE = re.compile(rb"(?:^|\s)BI\s")
+
+
+def _stream_bytes(stream) -> bytes:
+    """The stored, still encoded, bytes of a PDF stream: enough to identify it, without decoding"""
+    data = getattr(stream, "_data", None)
+    return data if isinstance(data, bytes) else stream.get_data()
+
+
+def _hash_xobjects(resources, digest, seen: set) -> bool:
+    """Add the images and forms a resource dictionary names to digest; True if any of them draws an image"""
+    resources = resources.get_object() if resources is not None else None
+    xobjects = resources.get("/XObject") if resources is not None else None
+    if xobjects is None:
+        return False
+    xobjects = xobjects.get_object()
+    has_images = False
+    for name in sorted(xobjects):
+        xobject = xobjects[name].get_object()
+        if id(xobject) in seen:
+            continue
+        seen.add(id(xobject))
+        digest.update(name.encode("utf-8") + b"\0" + _stream_bytes(xobject))
+        if xobject.get("/Subtype") == "/Image":
+            has_images = True
+        elif xobject.get("/Subtype") == "/Form":
+            has_images = _hash_xobjects(xobject.get("/Resources"), digest, seen) or has_images
+    return has_images
+
+
+def _page_fingerprint(page) -> Tuple[str, bool]:
+    """Hash of what rasterizing a page would show, and whether the page draws any image
+
+    Covers the page's size and rotation, its content stream and the stored bytes of
+    every image and form it uses, so identical pages hash alike in any document.
+    """
+    digest = hashlib.sha256(repr((list(page.mediabox), page.get("/Rotate", 0))).encode("utf-8"))
+    contents = page.get_contents()
+    data = contents.get_data() if contents is not None else b""
+    digest.update(data)
+    has_images = _hash_xobjects(page.get("/Resources"), digest, set())
+    return digest.hexdigest(), has_images or bool(_INLINE_IMAGE.search(data))
+
+
+def _text_chars(text: str) -> int:
+    return len("".join(text.split()))
+
 
 class DocumentProcessor:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
+    def __init__(self, chunk_tokens: int = 256, chunk_overlap_tokens: int = 32,
+                 token_model: str = "text-embedding-ada-002",
+                 extract_workers: int = 1, page_batch_size: int = 8,
+                 ocr_workers: int = 1, ocr_page_batch_size: int = 2,
+                 ocr_dpi: int = 200, ocr_language: str = "eng",
+                 ocr_min_page_chars: int = 32, ocr_cache: Optional[OCRCache] = None):
+        # Chunk sizes are measured in tokens of the embedding model
+        self.chunker = TokenChunker(chunk_tokens, chunk_overlap_tokens, model=token_model)
+        # Pages are extracted in parallel when more than one worker is configured
+        self.extract_workers = max(1, extract_workers)
+        self.page_batch_size = max(1, page_batch_size)
+        self.ocr_workers = max(1, ocr_workers)
+        self.ocr_page_batch_size = max(1, ocr_page_batch_size)
+        self.ocr_dpi = ocr_dpi
+        self.ocr_language = ocr_language
+        # Pages whose text layer has fewer non-space characters than this are OCR'd (0 = never)
+        self.ocr_min_page_chars = ocr_min_page_chars
+        self.ocr_cache = ocr_cache
+        self._extract_pool = None
+        self._ocr_pool = None
     
-    def process_pdf(self, file_path: str = None, file_bytes: bytes = None) -> List[Dict[str, Any]]:
-        """Extract text from PDF and split into chunks"""
-        chunks = []
-        
+    @traced("documents.process_pdf")
+    def process_pdf(self, file_path: str = None, file_bytes: bytes = None,
+                    source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Extract text from PDF and split into chunks, OCR'ing pages without enough text"""
         try:
-            if file_path:
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    total_pages = len(pdf_reader.pages)
-                    
-                    full_text = ""
-                    for page_num in range(total_pages):
-                        page = pdf_reader.pages[page_num]
-                        text = page.extract_text()
-                        full_text += text + "\n"
-                    
-                    # If text extraction fails, try OCR
-                    if not full_text.strip():
-                        full_text = self._ocr_pdf(file_path=file_path)
-            
-            elif file_bytes:
-                pdf_file = io.BytesIO(file_bytes)
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                total_pages = len(pdf_reader.pages)
-                
-                full_text = ""
-                for page_num in range(total_pages):
-                    page = pdf_reader.pages[page_num]
-                    text = page.extract_text()
-                    full_text += text + "\n"
-                
-                # If text extraction fails, try OCR
-                if not full_text.strip():
-                    full_text = self._ocr_pdf(file_bytes=file_bytes)
-            
-            # Split text into chunks
-            chunks = self._split_text(full_text)
-            
-            # Add metadata to each chunk
-            for i, chunk in enumerate(chunks):
-                chunks[i] = {
-                    "text": chunk,
-                    "metadata": {
-                        "source": file_path if file_path else "uploaded_pdf",
-                        "type": "pdf",
-                        "chunk_index": i,
-                        "total_chunks": len(chunks)
-                    }
-                }
-            
+            chunks = list(self.iter_pdf_chunks(file_path, file_bytes, source))
+        
         except Exception as e:
-            print(f"Error processing PDF: {e}")
+            logger.error("Error processing PDF: %s", e)
             raise
         
         return chunks
     
-    def _ocr_pdf(self, file_path: str = None, file_bytes: bytes = None) -> str:
-        """Use OCR to extract text from PDF"""
+    def iter_pdf_chunks(self, file_path: str = None, file_bytes: bytes = None,
+                        source: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield the chunks of process_pdf as they are cut, so only a few pages are held at a time"""
+        source = source or (file_path if file_path else "uploaded_pdf")
+        # Scanned pages, whether the whole document or exhibits after text pages, get OCR
+        # as the pages stream past, so no more than a few pages are ever held at once
+        pages = self._ocr_sparse_pages(self.iter_pdf_pages(file_path, file_bytes), file_path, file_bytes)
+        yield from self._chunk_pages(pages, source, "pdf")
+    
+    def iter_pdf_pages(self, file_path: str = None, file_bytes: bytes = None) -> Iterator[Tuple[int, str]]:
+        """Yield (page_number, text) for each page of a PDF, in page order
+        
+        With extract_workers > 1, batches of pages are extracted on a process
+        pool while only a bounded window of batches is held in memory. Files
+        are memory-mapped rather than read in.
+        """
+        import PyPDF2
+        
+        stream = _map_file(file_path) if file_path else io.BytesIO(file_bytes)
         try:
-            if file_path:
-                images = convert_from_path(file_path)
-            else:
-                images = convert_from_bytes(file_bytes)
-            
-            full_text = ""
-            for i, image in enumerate(images):
-                text = pytesseract.image_to_string(image)
-                full_text += f"\n--- Page {i+1} ---\n{text}"
+            reader = PyPDF2.PdfReader(stream)
+            total_pages = len(reader.pages)
             
-            return full_text
+            if self.extract_workers == 1 or total_pages <= self.page_batch_size:
+                for page_num in range(total_pages):
+                    yield page_num + 1, reader.pages[page_num].extract_text() or ""
+                return
+            del reader
+        finally:
+            stream.close()
         
-        except Exception as e:
-            print(f"Error in OCR: {e}")
-            return ""
+        with self._pdf_on_disk(file_path, file_bytes) as pdf_path:
+            batches = [
+                (pdf_path, start, min(start + self.page_batch_size, total_pages))
+                for start in range(0, total_pages, self.page_batch_size)
+            ]
+            page_num = 0
+            for texts in ordered_map(self._get_extract_pool(), _extract_page_batch, batches,
+                                     window=self.extract_workers * 2):
+                for text in texts:
+                    page_num += 1
+                    yield page_num, text
     
-    def process_image(self, file_path: str = None, file_bytes: bytes = None) -> List[Dict[str, Any]]:
-        """Extract text from image using OCR"""
+    def ocr_pages(self, page_numbers: List[int], file_path: str = None,
+                  file_bytes: bytes = None) -> Dict[int, str]:
+        """OCR text of the given pages (1-based) of a PDF
+        
+        Pages that draw no image have nothing to OCR and are left out. The rest
+        are looked up in the OCR cache by page fingerprint, DPI and language;
+        only misses are rasterized, ocr_page_batch_size consecutive pages at a
+        time, on a process pool when ocr_workers > 1, and then cached.
+        """
+        import PyPDF2
+        
+        stream = _map_file(file_path) if file_path else io.BytesIO(file_bytes)
         try:
-            if file_path:
-                image = Image.open(file_path)
-            else:
-                image = Image.open(io.BytesIO(file_bytes))
-            
-            # Extract text using OCR
-            text = pytesseract.image_to_string(image)
-            
-            # Split text into chunks if needed
-            chunks = self._split_text(text)
-            
-            # Add metadata to each chunk
-            result = []
-            for i, chunk in enumerate(chunks):
-                result.append({
-                    "text": chunk,
-                    "metadata": {
-                        "source": file_path if file_path else "uploaded_image",
-                        "type": "image",
-                        "chunk_index": i,
-                        "total_chunks": len(chunks)
-                    }
-                })
-            
-            return result
+            reader = PyPDF2.PdfReader(stream)
+            keys = {}
+            for page_num in page_numbers:
+                fingerprint, has_images = _page_fingerprint(reader.pages[page_num - 1])
+                if has_images:
+                    keys[page_num] = OCRCache.make_key(fingerprint, self.ocr_dpi, self.ocr_language)
+            del reader
+        finally:
+            stream.close()
+        
+        cached = self.ocr_cache.get_many(keys.values()) if self.ocr_cache is not None and keys else {}
+        # One page per uncached key: identical pages within the document are OCR'd once
+        missing = {}
+        for page_num, key in keys.items():
+            if key not in cached:
+                missing.setdefault(key, page_num)
+        
+        texts = {}
+        if missing:
+            with self._pdf_on_disk(file_path, file_bytes) as pdf_path:
+                # Runs of consecutive pages, each rasterized with one pdftoppm call
+                runs = []
+                for page_num in sorted(missing.values()):
+                    if runs and page_num == runs[-1][-1] + 1 and len(runs[-1]) < self.ocr_page_batch_size:
+                        runs[-1].append(page_num)
+                    else:
+                        runs.append([page_num])
+                batches = [(pdf_path, run[0], run[-1], self.ocr_dpi, self.ocr_language) for run in runs]
+                
+                if self.ocr_workers == 1 or len(batches) == 1:
+                    results = map(_ocr_page_batch, batches)
+                else:
+                    results = ordered_map(self._get_ocr_pool(), _ocr_page_batch, batches,
+                                          window=self.ocr_workers * 2)
+                
+                for run, run_texts in zip(runs, results):
+                    texts.update(zip(run, run_texts))
             
-        except Exception as e:
-            print(f"Error processing image: {e}")
-            raise
+            if self.ocr_cache is not None:
+                self.ocr_cache.put_many({key: texts[page_num] for key, page_num in missing.items()})
+        
+        found = {**cached, **{key: texts[page_num] for key, page_num in missing.items()}}
+        return {page_num: found[key] for page_num, key in keys.items()}
     
-    def _split_text(self, text: str) -> List[str]:
-        """Split text into overlapping chunks"""
-        if not text.strip():
-            return []
+    @contextmanager
+    def _pdf_on_disk(self, file_path: str = None, file_bytes: bytes = None) -> Iterator[str]:
+        """Yield a path to the PDF, spilling in-memory uploads to a temporary file once"""
+        if file_path:
+            yield file_path
+            return
         
-        # Clean text
-        text = text.replace('\n\n', ' ').replace('\n', ' ').strip()
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+            temp_file.write(file_bytes)
+        try:
+            yield temp_file.name
+        finally:
+            os.remove(temp_file.name)
+    
+    def _get_extract_pool(self) -> ProcessPoolExecutor:
+        if self._extract_pool is None:
+            # spawn rather than fork: the API process runs ingestion on threads
+            self._extract_pool = ProcessPoolExecutor(
+                max_workers=self.extract_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._extract_pool
+    
+    def _get_ocr_pool(self) -> ProcessPoolExecutor:
+        if self._ocr_pool is None:
+            self._ocr_pool = ProcessPoolExecutor(
+                max_workers=self.ocr_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_ocr_worker
+            )
+        return self._ocr_pool
+    
+    def close(self):
+        """Shut down the extraction and OCR worker pools, if they were started"""
+        for pool in (self._extract_pool, self._ocr_pool):
+            if pool is not None:
+                pool.shutdown(wait=True)
+        self._extract_pool = None
+        self._ocr_pool = None
+    
+    def _chunk_pages(self, pages: Iterable[Tuple[Optional[int], str]], source: str,
+                     doc_type: str) -> Iterator[Dict[str, Any]]:
+        """Split a stream of (page_number, text) pairs into chunks tagged with their pages and offsets
+        
+        Chunks are yielded as they are cut; a document's chunk count is recorded in the
+        document registry once it is indexed, not in each chunk.
+        """
+        for chunk_index, chunk in enumerate(self.chunker.chunk_pages(pages)):
+            metadata = {
+                "source": source,
+                "type": doc_type,
+                "chunk_index": chunk_index,
+                "char_start": chunk["char_start"],
+                "char_end": chunk["char_end"]
+            }
+            if chunk["page"] is not None:
+                metadata["page"] = chunk["page"]
+                metadata["page_end"] = chunk["page_end"]
+            yield {"text": chunk["text"], "metadata": metadata}
+    
+    def _ocr_sparse_pages(self, pages: Iterable[Tuple[int, str]], file_path: str = None,
+                          file_bytes: bytes = None) -> Iterator[Tuple[int, str]]:
+        """Pass pages through, replacing the text of sparse pages with their OCR text where OCR found more
         
-        # If text is shorter than chunk size, return as is
-        if len(text) <= self.chunk_size:
-            return [text]
+        Sparse pages are OCR'd ocr_workers * ocr_page_batch_size at a time, so every
+        OCR worker has a run of pages. Pages after the first sparse page of a batch
+        wait in a buffer of at most four batches' worth, and leave it in page order.
+        """
+        batch_size = self.ocr_workers * self.ocr_page_batch_size
+        buffered: List[Tuple[int, str]] = []
+        sparse: List[int] = []
+        with ExitStack() as stack:
+            pdf_path = file_path
+            for page_num, text in pages:
+                if _text_chars(text) < self.ocr_min_page_chars:
+                    sparse.append(page_num)
+                elif not sparse:
+                    yield page_num, text
+                    continue
+                buffered.append((page_num, text))
+                if len(sparse) >= batch_size or len(buffered) >= 4 * batch_size:
+                    if pdf_path is None:
+                        # Uploads are written to disk once, for the whole document
+                        pdf_path = stack.enter_context(self._pdf_on_disk(file_path, file_bytes))
+                    yield from self._ocr_buffered(buffered, sparse, pdf_path)
+                    buffered, sparse = [], []
+            if sparse:
+                yield from self._ocr_buffered(buffered, sparse, pdf_path, file_bytes)
+    
+    def _ocr_buffered(self, pages: List[Tuple[int, str]], sparse: List[int], file_path: str = None,
+                      file_bytes: bytes = None) -> List[Tuple[int, str]]:
+        try:
+            with span("documents.ocr"):
+                ocr_texts = self.ocr_pages(sparse, file_path, file_bytes)
+        except Exception as e:
+            # Keep whatever text the pages did have
+            logger.error("Error in OCR: %s", e)
+            return pages
         
-        chunks = []
-        start = 0
+        return [
+            (page_num, ocr_texts[page_num]
+             if _text_chars(ocr_texts.get(page_num, "")) > _text_chars(text) else text)
+            for page_num, text in pages
+        ]
+    
+    @traced("documents.process_image")
+    def process_image(self, file_path: str = None, file_bytes: bytes = None,
+                      source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Extract text from image using OCR"""
+        import pytesseract
+        from PIL import Image
         
-        while start < len(text):
-            # Find the end of the chunk
-            end = start + self.chunk_size
+        try:
+            key = None
+            if self.ocr_cache is not None:
+                digest = hash_file(file_path) if file_path else hash_content(file_bytes)
+                key = OCRCache.make_key(f"image:{digest}", 0, self.ocr_language)
+            text = self.ocr_cache.get_many([key]).get(key) if key is not None else None
             
-            # If this is not the last chunk, try to break at a sentence or word boundary
-            if end < len(text):
-                # Try to find a sentence boundary
-                for sep in ['. ', '? ', '! ', '\n']:
-                    last_sep = text.rfind(sep, start, end)
-                    if last_sep != -1:
-                        end = last_sep + len(sep)
-                        break
+            if text is None:
+                if file_path:
+                    image = Image.open(file_path)
                 else:
-                    # If no sentence boundary, try word boundary
-                    last_space = text.rfind(' ', start, end)
-                    if last_space != -1:
-                        end = last_space + 1
-            
-            chunks.append(text[start:end].strip())
+                    image = Image.open(io.BytesIO(file_bytes))
+                
+                # Extract text using OCR
+                text = pytesseract.image_to_string(image, lang=self.ocr_language)
+                if key is not None:
+                    self.ocr_cache.put_many({key: text})
             
-            # Move start position with overlap
-            start = end - self.chunk_overlap
+            # Split text into chunks if needed
+            source = source or (file_path if file_path else "uploaded_image")
+            return list(self._chunk_pages([(None, text)], source, "image"))
         
-        return chunks
+        except Exception as e:
+            logger.error("Error processing image: %s", e)
+            raise
+    
+    def _split_text(self, text: str) -> List[str]:
+        """Split text into overlapping, token-bounded chunks"""
+        return [chunk["text"] for chunk in self.chunker.chunk_text(text)]
     
     def process_file(self, file_path: str = None, file_bytes: bytes = None, 
-                     file_type: str = None) -> List[Dict[str, Any]]:
-        """Process file based on type"""
+                     file_type: str = None, source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Process file based on type; source, if given, replaces the path in chunk metadata"""
+        file_type = self._file_type(file_path, file_type)
+        if file_type == "pdf":
+            return self.process_pdf(file_path, file_bytes, source)
+        return self.process_image(file_path, file_bytes, source)
+    
+    def iter_file_chunks(self, file_path: str = None, file_bytes: bytes = None,
+                         file_type: str = None, source: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield the chunks of process_file as they are cut; an image is OCR'd whole first"""
+        file_type = self._file_type(file_path, file_type)
+        if file_type == "pdf":
+            return self.iter_pdf_chunks(file_path, file_bytes, source)
+        return iter(self.process_image(file_path, file_bytes, source))
+    
+    @staticmethod
+    def _file_type(file_path: Optional[str], file_type: Optional[str]) -> str:
+        """The file's extension, or file_type if it has none; raises ValueError for unsupported types"""
         if file_path:
             _, ext = os.path.splitext(file_path.lower())
             file_type = ext[1:] if ext else file_type
-        
-        if file_type in ['pdf']:
-            return self.process_pdf(file_path, file_bytes)
-        elif file_type in ['png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff']:
-            return self.process_image(file_path, file_bytes)
-        else:
-            raise ValueError(f"Unsupported file type: {file_type}")
\ No newline at end of file
+        if file_type not in ['pdf', 'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff']:
+            raise ValueError(f"Unsupported file type: {file_type}")
+        return file_type
\ No newline at end of file
@@ -0,0 +1,192 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+INGESTION_STAGES = ["extract", "chunk", "embed", "insert"]
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue has no free slots"""
+
+
+class IngestionJob:
+    def __init__(self, filename: str, doc_id: Optional[str] = None, matter: Optional[str] = None,
+                 file_path: Optional[str] = None):
+        self.job_id = uuid.uuid4().hex
+        self.filename = filename
+        self.file_path = file_path  # Spooled upload, deleted when the job finishes
+        self.doc_id = doc_id
+        self.matter = matter
+        self.status = "queued"  # queued -> running -> completed | failed
+        self.message = "Document queued for indexing"
+        self.stages = {stage: "pending" for stage in INGESTION_STAGES}
+        self.chunks_count = 0
+        self.chunks_embedded = 0
+        self.chunks_inserted = 0
+        self.new_chunks = 0
+        self.deduplicated_chunks = 0
+        self.removed_chunks = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def update_progress(self, stage: str, status: str, **counts):
+        """Record the status of a pipeline stage and any chunk counts it reports"""
+        self.stages[stage] = status
+        for key, value in counts.items():
+            if hasattr(self, key):
+                setattr(self, key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "doc_id": self.doc_id,
+            "matter": self.matter,
+            "status": self.status,
+            "message": self.message,
+            "stages": dict(self.stages),
+            "chunks_count": self.chunks_count,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_inserted": self.chunks_inserted,
+            "new_chunks": self.new_chunks,
+            "deduplicated_chunks": self.deduplicated_chunks,
+            "removed_chunks": self.removed_chunks,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "IngestionJob":
+        """A job recorded by to_dict, e.g. by another worker process"""
+        job = cls(state["filename"], state["doc_id"], state["matter"])
+        for key, value in state.items():
+            setattr(job, key, dict(value) if key == "stages" else value)
+        return job
+
+
+class IngestionQueue:
+    """Bounded background queue that indexes uploaded documents on a worker pool
+
+    Jobs run in the process that accepted them, but their state is recorded in the
+    document registry as it changes, so any worker process can report any job.
+    """
+
+    def __init__(self, rag_engine, max_workers: int = 2, max_pending: int = 16,
+                 max_finished_jobs: int = 200):
+        self.rag_engine = rag_engine
+        self.registry = rag_engine.document_registry
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        # One slot per running or waiting job; submit fails fast once they are all taken
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, file_bytes: Optional[bytes] = None, file_type: str = None, filename: str = None,
+               doc_id: Optional[str] = None, matter: Optional[str] = None,
+               file_path: Optional[str] = None) -> IngestionJob:
+        """Queue a document for indexing, replacing the document doc_id if given, and return its job immediately
+
+        The document is file_bytes or, for large uploads, the file at file_path, which the job
+        takes over and deletes once it finishes. If submit raises, the file is left to the caller.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError("Ingestion queue is full, please retry later")
+
+        job = IngestionJob(filename, doc_id, matter, file_path)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune_finished_jobs()
+        self._save(job)
+        self.registry.prune_jobs(self.max_finished_jobs)
+
+        try:
+            self._executor.submit(self._run, job, file_bytes, file_type)
+        except Exception:
+            self._slots.release()
+            raise
+        return job
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            state = self.registry.get_job(job_id)
+            job = IngestionJob.from_dict(state) if state else None
+        return job
+
+    def list_jobs(self, all_workers: bool = True) -> List[IngestionJob]:
+        """Retained jobs, oldest first: those of every worker process, or only this one's"""
+        with self._lock:
+            local = dict(self._jobs)
+        if not all_workers:
+            return list(local.values())
+        return [local.get(state["job_id"]) or IngestionJob.from_dict(state) for state in self.registry.list_jobs()]
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def _save(self, job: IngestionJob):
+        try:
+            self.registry.save_job(job.to_dict())
+        except Exception as e:
+            logger.warning("Could not record ingestion job %s: %s", job.job_id, e)
+
+    def _run(self, job: IngestionJob, file_bytes: Optional[bytes], file_type: str):
+        job.status = "running"
+        job.message = "Indexing document"
+        job.started_at = time.time()
+        self._save(job)
+
+        def report(stage: str, status: str, **counts):
+            job.update_progress(stage, status, **counts)
+            self._save(job)
+
+        try:
+            result = self.rag_engine.upload_and_index_document(
+                file_path=job.file_path,
+                file_bytes=file_bytes,
+                file_type=file_type,
+                filename=job.filename,
+                source=job.filename if job.file_path else None,
+                progress_callback=report,
+                doc_id=job.doc_id,
+                matter=job.matter
+            )
+            job.status = "completed" if result["success"] else "failed"
+            job.message = result["message"]
+            job.chunks_count = result.get("chunks_count", job.chunks_count)
+            job.new_chunks = result.get("new_chunks", 0)
+            job.deduplicated_chunks = result.get("deduplicated_chunks", 0)
+            job.removed_chunks = result.get("removed_chunks", 0)
+            job.doc_id = result.get("doc_id", job.doc_id)
+        except Exception as e:
+            logger.exception("Error running ingestion job %s: %s", job.job_id, e)
+            job.status = "failed"
+            job.message = f"Error processing document: {e}"
+        finally:
+            if job.file_path is not None:
+                try:
+                    os.remove(job.file_path)
+                except OSError as e:
+                    logger.warning("Could not remove upload %s: %s", job.file_path, e)
+                job.file_path = None
+            job.finished_at = time.time()
+            self._save(job)
+            self._slots.release()
+
+    def _prune_finished_jobs(self):
+        """Drop the oldest finished jobs once more than max_finished_jobs are retained"""
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job.status in ("completed", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
@@ -0,0 +1,261 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+from app.core.vector_store import matches_filter
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process owns the log
+    fcntl = None
+
+# Citations such as "12.3(b)" are kept whole; other tokens are runs of letters/digits
+TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)+(?:\([a-z0-9]+\))*|\d+(?:\([a-z0-9]+\))+|[a-z0-9]+")
+CITATION_PART = re.compile(r"^(\d+(?:\.\d+)*)\(")
+PHRASE_PATTERN = re.compile(r'"([^"]+)"|“([^”]+)”')
+EXACT_TERM_PATTERN = re.compile(
+    r'"[^"]+"|“[^”]+”|§|\b(?:section|sec|article|art|clause|rule|schedule|exhibit)\.?\s*\d|\b\d+\.\d+',
+    re.IGNORECASE
+)
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; a citation like 12.3(b) also yields its base number 12.3"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        base = CITATION_PART.match(token)
+        if base:
+            tokens.append(base.group(1))
+    return tokens
+
+
+def is_exact_term_query(query: str) -> bool:
+    """True for queries naming quoted terms, section numbers or other citations"""
+    return bool(EXACT_TERM_PATTERN.search(query))
+
+
+class BM25Index:
+    """Incrementally maintained BM25 inverted index over chunk text
+
+    Chunks are keyed by their vector store id. With a path, every change is
+    appended to a JSON lines log and applied by replaying the log, so several
+    processes sharing the file (API workers, ingestion jobs) stay in step:
+    each one catches up on new entries before it searches.
+
+    Writers hold an exclusive lock on path + ".lock". Once more than
+    compact_ratio of the log's entries (and at least compact_min_entries) are
+    removals or removed chunks, the log is replaced by a snapshot holding one
+    entry per live chunk; readers see the new file and replay it.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75,
+                 compact_ratio: float = 0.5, compact_min_entries: int = 1000):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.compact_min_entries = compact_min_entries
+        self._lock = threading.Lock()
+        self._reset()
+        with self._lock:
+            self._catch_up()
+
+    def _reset(self):
+        self._postings: Dict[str, Dict[Any, int]] = {}
+        self._doc_lengths: Dict[Any, int] = {}
+        self._docs: Dict[Any, tuple] = {}
+        self._total_length = 0
+        self._log_offset = 0
+        self._log_inode = None
+        self._log_entries = 0
+
+    def _catch_up(self):
+        """Apply log entries written since the last call, by this or any other process"""
+        if not self.path:
+            return
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            if self._log_offset:
+                self._reset()  # Cleared by another process
+            return
+        with f:
+            # The open file, not the path, which a compaction may have replaced since
+            stat = os.fstat(f.fileno())
+            if stat.st_ino != self._log_inode or stat.st_size < self._log_offset:
+                self._reset()
+                self._log_inode = stat.st_ino
+            if stat.st_size == self._log_offset:
+                return
+            f.seek(self._log_offset)
+            data = f.read()
+        # Only whole lines: another process may be midway through an append
+        data = data[:data.rfind(b"\n") + 1]
+        for line in data.splitlines():
+            self._apply(json.loads(line))
+            self._log_entries += 1
+        self._log_offset += len(data)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock between the processes writing the log"""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _apply(self, entry: Dict[str, Any]):
+        if entry["op"] == "add":
+            self._add(entry["id"], entry["text"], entry["metadata"])
+        elif entry["op"] == "remove":
+            self._remove(entry["ids"])
+
+    def _write(self, entries: List[Dict[str, Any]]):
+        if not entries:
+            return
+        if not self.path:
+            for entry in entries:
+                self._apply(entry)
+            return
+        with self._file_lock():
+            self._append(self.path, entries)
+            self._catch_up()
+            dead = self._log_entries - len(self._docs)
+            if self._log_entries >= self.compact_min_entries and dead > self.compact_ratio * self._log_entries:
+                self._compact()
+
+    @staticmethod
+    def _append(path: str, entries: List[Dict[str, Any]]):
+        # One O_APPEND write per batch keeps lines whole for readers
+        data = ("\n".join(json.dumps(entry) for entry in entries) + "\n").encode("utf-8")
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+
+    def _compact(self):
+        """Replace the log with one add entry per live chunk; caller holds both locks and has caught up"""
+        temp_path = self.path + ".compact"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for doc_id, (text, metadata) in self._docs.items():
+                f.write(json.dumps({"op": "add", "id": doc_id, "text": text, "metadata": metadata}) + "\n")
+        os.replace(temp_path, self.path)
+        stat = os.stat(self.path)
+        self._log_inode = stat.st_ino
+        self._log_offset = stat.st_size
+        self._log_entries = len(self._docs)
+
+    def _add(self, doc_id, text: str, metadata: Dict[str, Any]):
+        if doc_id in self._docs:
+            self._remove([doc_id])
+        term_counts = Counter(tokenize(text))
+        for term, count in term_counts.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+        length = sum(term_counts.values())
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        self._docs[doc_id] = (text, metadata)
+
+    def _remove(self, doc_ids):
+        for doc_id in doc_ids:
+            if doc_id not in self._docs:
+                continue
+            text, _ = self._docs.pop(doc_id)
+            for term in set(tokenize(text)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def add_many(self, doc_ids: List[Any], texts: List[str], metadata_list: List[Dict[str, Any]]):
+        with self._lock:
+            self._write([
+                {"op": "add", "id": doc_id, "text": text, "metadata": metadata}
+                for doc_id, text, metadata in zip(doc_ids, texts, metadata_list)
+            ])
+
+    def remove_many(self, doc_ids: List[Any]):
+        with self._lock:
+            self._write([{"op": "remove", "ids": list(doc_ids)}])
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            if self.path:
+                with self._file_lock():
+                    if os.path.exists(self.path):
+                        os.remove(self.path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._catch_up()
+            return len(self._docs)
+
+    def search(self, query: str, top_k: int = 5,
+               filter_conditions: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Rank chunks by BM25; quoted phrases and citations in the query must appear verbatim"""
+        terms = set(tokenize(query))
+        citations = [term for term in terms if "." in term or "(" in term]
+        phrases = [(a or b).lower() for a, b in PHRASE_PATTERN.findall(query)]
+        if not terms:
+            return []
+
+        with self._lock:
+            self._catch_up()
+            doc_count = len(self._docs)
+            if doc_count == 0:
+                return []
+            average_length = self._total_length / doc_count
+            scores: Dict[Any, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            results = []
+            for doc_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                text, metadata = self._docs[doc_id]
+                if filter_conditions and not matches_filter(filter_conditions, doc_id, metadata):
+                    continue
+                if any(doc_id not in self._postings.get(term, ()) for term in citations):
+                    continue
+                if phrases and not all(phrase in text.lower() for phrase in phrases):
+                    continue
+                results.append({"id": doc_id, "text": text, "metadata": metadata, "score": score})
+                if len(results) >= top_k:
+                    break
+        return results
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], top_k: int,
+                           k: int = 60) -> List[Dict[str, Any]]:
+    """Fuse ranked result lists by summing 1 / (k + rank) per chunk id"""
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.setdefault(result["id"], dict(result, score=0.0))
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda result: result["score"], reverse=True)[:top_k]
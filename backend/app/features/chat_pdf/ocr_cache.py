@@ -0,0 +1,89 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+
+class OCRCache:
+    """Persistent cache of OCR text, keyed by what was OCR'd and how
+
+    Keys hash a fingerprint of the page or image together with the DPI and
+    tesseract language, so re-ingesting or re-chunking a document, or the same
+    scanned exhibit appearing in another document, never runs tesseract again.
+    The least recently used entries are evicted past max_items.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_items: int = 100000):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_pages (key TEXT PRIMARY KEY, text TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_pages_last_used ON ocr_pages (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM ocr_pages").fetchone()[0]
+
+    @staticmethod
+    def make_key(fingerprint: str, dpi: int, language: str) -> str:
+        return hashlib.sha256(f"{fingerprint}\0{dpi}\0{language}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """OCR text for the keys that are cached"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, text FROM ocr_pages WHERE key IN ({placeholders})", batch
+                ).fetchall())
+            if found:
+                self._conn.executemany(
+                    "UPDATE ocr_pages SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, texts: Dict[str, str]):
+        if not texts:
+            return
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO ocr_pages (key, text, last_used) VALUES (?, ?, ?)",
+                [(key, text, now) for key, text in texts.items()]
+            )
+            self._count += self._conn.total_changes - before
+            excess = self._count - self.max_items
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM ocr_pages WHERE key IN "
+                    "(SELECT key FROM ocr_pages ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self._count -= excess
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "items": self._count
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM ocr_pages")
+            self._conn.commit()
+            self._count = 0
@@ -1,152 +1,709 @@
+import logging
 import os
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import hashlib
+import json
+import threading
+import time
+from itertools import islice
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from dotenv import load_dotenv
-from app.core.milvus_client import MilvusManager
+from app.core.vector_store import create_vector_store
+from app.core.clients import ServiceClients
 from app.features.chat_pdf.document_processor import DocumentProcessor
+from app.features.chat_pdf.ocr_cache import OCRCache
 from app.core.embeddings import EmbeddingGenerator
+from app.core.embedding_cache import EmbeddingCache
+from app.core.embedding_scheduler import EmbeddingScheduler
+from app.core.document_registry import (
+    DOCUMENT_KEYS, DocumentRegistry, hash_content, hash_file, hash_chunk, scope_hash
+)
+from app.features.chat_pdf.lexical_index import BM25Index, is_exact_term_query, reciprocal_rank_fusion
+from app.features.chat_pdf.context_builder import ContextBuilder
+from app.features.chat_pdf.conversation_store import message_tokens
+from app.core.config import settings
+from app.core.metrics import CHAT_TOKENS, PROMPT_TOKENS_SAVED, record_span, span
+from app.utils.cache import LRUCache
+from app.utils.tokens import count_tokens
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Chunks of an upload looked up in the registry at a time as they stream out of extraction
+CHUNK_LOOKUP_BATCH = 500
+
+
+class _Search:
+    """One batched search as it goes through the retrieval steps of RAGEngine"""
+    __slots__ = ("queries", "top_k", "filters", "document_filters", "responses", "cache_keys", "pending",
+                 "modes", "lexical", "vector", "timings")
+    
+    def __init__(self, queries: List[str], top_k: int, filters: List[Optional[Dict]]):
+        self.queries = queries
+        self.top_k = top_k
+        self.filters = list(filters)
+        # The DOCUMENT_KEYS conditions of pending queries' filters, answered from the registry
+        self.document_filters: Dict[int, Dict[str, Any]] = {}
+        self.responses: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        self.cache_keys: List[Tuple] = []
+        # Queries the cache did not answer, and the path each takes once auto mode is settled
+        self.pending: List[int] = []
+        self.modes: Dict[int, str] = {}
+        self.lexical: Dict[int, List[Dict[str, Any]]] = {}
+        self.vector: Dict[int, List[Dict[str, Any]]] = {}
+        self.timings: Dict[str, float] = {}
+    
+    def uses_lexical(self) -> bool:
+        return any(self.modes[i] != "vector" for i in self.pending)
+    
+    def vector_queries(self) -> Tuple[List[int], int]:
+        """The pending queries needing a vector search, and how many hits to fetch for each"""
+        vector_queries = [i for i in self.pending if self.modes[i] in ("vector", "hybrid")]
+        hybrid = any(self.modes[i] == "hybrid" for i in vector_queries)
+        return vector_queries, max(self.top_k, settings.HYBRID_CANDIDATES) if hybrid else self.top_k
+    
+    def vector_texts(self) -> List[str]:
+        return [self.queries[i] for i in self.vector_queries()[0]]
+
+
 class RAGEngine:
-    def __init__(self):
-        self.milvus_manager = MilvusManager()
-        self.doc_processor = DocumentProcessor()
-        self.embedding_generator = EmbeddingGenerator()
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, clients: Optional[ServiceClients] = None):
+        # Shared, pooled clients; without them the engine opens its own connections
+        self.clients = clients
+        self.vector_store = create_vector_store(milvus_pool=clients.milvus_pool if clients else None)
+        ocr_cache = None
+        if settings.OCR_CACHE_ENABLED:
+            ocr_cache = OCRCache(path=settings.OCR_CACHE_PATH, max_items=settings.OCR_CACHE_MAX_ITEMS)
+        self.doc_processor = DocumentProcessor(
+            chunk_tokens=settings.CHUNK_TOKENS,
+            chunk_overlap_tokens=settings.CHUNK_OVERLAP_TOKENS,
+            token_model=settings.EMBEDDING_MODEL,
+            extract_workers=settings.PDF_EXTRACT_WORKERS,
+            page_batch_size=settings.PDF_PAGE_BATCH_SIZE,
+            ocr_workers=settings.OCR_WORKERS,
+            ocr_page_batch_size=settings.OCR_PAGE_BATCH_SIZE,
+            ocr_dpi=settings.OCR_DPI,
+            ocr_language=settings.OCR_LANGUAGE,
+            ocr_min_page_chars=settings.OCR_MIN_PAGE_CHARS,
+            ocr_cache=ocr_cache
+        )
+        embedding_cache = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            embedding_cache = EmbeddingCache(
+                path=settings.EMBEDDING_CACHE_PATH,
+                memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+                disk_items=settings.EMBEDDING_CACHE_DISK_ITEMS
+            )
+        embedding_scheduler = EmbeddingScheduler(
+            settings.EMBEDDING_MODEL,
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_batch_tokens=settings.EMBEDDING_BATCH_TOKENS,
+            max_batch_items=settings.EMBEDDING_BATCH_MAX_ITEMS,
+            concurrency=settings.EMBEDDING_CONCURRENCY,
+            max_retries=settings.EMBEDDING_MAX_RETRIES,
+            dimensions=settings.EMBEDDING_DIMENSION,
+            client=clients.async_openai if clients else None,
+            loop=clients.loop if clients else None
+        )
+        if clients is not None:
+            self.openai_client = clients.openai
+        else:
+            from openai import OpenAI
+            self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.embedding_generator = EmbeddingGenerator(
+            model=settings.EMBEDDING_MODEL,
+            cache=embedding_cache,
+            scheduler=embedding_scheduler,
+            client=self.openai_client,
+            dimensions=settings.EMBEDDING_DIMENSION
+        )
         self.chat_model = "gpt-4-turbo"
+        self.context_builder = ContextBuilder(settings.CONTEXT_MAX_TOKENS, model=self.chat_model)
+        
+        # Tracks indexed documents and chunk hashes for deduplication
+        self.document_registry = DocumentRegistry(settings.DOCUMENT_REGISTRY_PATH or ":memory:")
+        # Content hashes and document ids being indexed right now
+        self._indexing_keys = set()
+        self._indexing_lock = threading.Lock()
+        
+        # BM25 index over the same chunks, keyed by vector store id
+        self.lexical_index = BM25Index(settings.LEXICAL_INDEX_PATH or None,
+                                       compact_ratio=settings.LEXICAL_COMPACT_RATIO)
+        
+        # Query-side caches. Keys include the collection generation, which moves
+        # forward whenever the indexed documents change, so stale entries are never read.
+        # The generation lives in the registry, so every worker process sees the same one.
+        self.retrieval_cache = LRUCache(settings.RETRIEVAL_CACHE_SIZE, ttl=settings.RETRIEVAL_CACHE_TTL)
+        self.answer_cache = LRUCache(settings.ANSWER_CACHE_SIZE, ttl=settings.ANSWER_CACHE_TTL)
+    
+    @property
+    def collection_generation(self) -> int:
+        return self.document_registry.generation()
+    
+    def _bump_generation(self):
+        """Invalidate cached retrievals and answers after the collection changes"""
+        self.document_registry.bump_generation()
+        self.retrieval_cache.clear()
+        self.answer_cache.clear()
+    
+    def close(self):
+        """Release worker pools; shared clients are closed by their owner"""
+        self.doc_processor.close()
+    
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
     
     def upload_and_index_document(self, file_path: str = None, file_bytes: bytes = None, 
-                                  file_type: str = None, filename: str = None) -> Dict[str, Any]:
-        """Process, embed, and store document in Milvus"""
+                                  file_type: str = None, filename: str = None,
+                                  progress_callback: Optional[Callable[..., None]] = None,
+                                  doc_id: Optional[str] = None, matter: Optional[str] = None,
+                                  source: Optional[str] = None) -> Dict[str, Any]:
+        """Process, embed, and store document in the vector store
+        
+        progress_callback, if given, is called as progress_callback(stage, status, **counts)
+        for each of the extract, chunk, embed and insert stages.
+        
+        doc_id names the document; it defaults to the content hash. Indexing under an
+        existing doc_id replaces that document: only chunks whose content changed are
+        embedded, and chunks no longer referenced by any document are deleted.
+        
+        matter, if given, tags every chunk for filtering (and Milvus partitioning);
+        deduplication only shares content within the same matter.
+        
+        source overrides the "source" recorded in chunk metadata (by default file_path), e.g.
+        when file_path is a temporary copy of an upload.
+        """
+        report = progress_callback or (lambda stage, status, **counts: None)
+        stage = "extract"
+        doc_hash = scope_hash(hash_file(file_path) if file_path else hash_content(file_bytes), matter)
+        keys = {doc_hash, doc_id or doc_hash}
+        
+        # Identical content is indexed once; concurrent uploads of it, or to the same doc_id, are skipped too
+        with self._indexing_lock:
+            if doc_id is None:
+                existing = self.document_registry.find_document_by_hash(doc_hash)
+            else:
+                existing = self.document_registry.get_document(doc_id)
+                if existing is not None and existing["doc_hash"] != doc_hash:
+                    existing = None  # An edited version, which replaces it
+            if existing is None and not keys & self._indexing_keys:
+                self._indexing_keys.update(keys)
+                existing = False
+        doc_id = doc_id or doc_hash
+        if existing is not False:
+            for skipped_stage in ("extract", "chunk", "embed", "insert"):
+                report(skipped_stage, "skipped")
+            chunks_count = existing["chunks_count"] if existing else 0
+            return {
+                "success": True,
+                "message": "Document is already indexed" if existing else "Document is already being indexed",
+                "doc_id": existing["doc_id"] if existing else doc_id,
+                "chunks_count": chunks_count,
+                "new_chunks": 0,
+                "deduplicated_chunks": chunks_count,
+                "duplicate": True
+            }
+        
         try:
-            # Process document to extract text chunks
-            chunks = self.doc_processor.process_file(file_path, file_bytes, file_type)
+            # Chunks stream out of extraction; only those whose content is not stored yet are
+            # kept, to be embedded and inserted, so the rest never pile up in memory
+            report("extract", "running")
+            chunk_hashes = []
+            new_chunks = []
+            seen = set()
+            chunks = self.doc_processor.iter_file_chunks(file_path, file_bytes, file_type, source=source)
+            for batch in iter(lambda: list(islice(chunks, CHUNK_LOOKUP_BATCH)), []):
+                batch_hashes = [hash_chunk(chunk["text"], matter) for chunk in batch]
+                seen.update(self.document_registry.known_chunks(batch_hashes))
+                chunk_hashes.extend(batch_hashes)
+                for chunk, chunk_hash in zip(batch, batch_hashes):
+                    if chunk_hash in seen:
+                        continue
+                    seen.add(chunk_hash)
+                    chunk["metadata"]["doc_id"] = doc_id
+                    chunk["metadata"]["doc_hash"] = doc_hash
+                    chunk["metadata"]["chunk_hash"] = chunk_hash
+                    if matter:
+                        chunk["metadata"]["matter"] = matter
+                    new_chunks.append(chunk)
+            report("extract", "completed")
             
-            if not chunks:
+            stage = "chunk"
+            report("chunk", "completed", chunks_count=len(chunk_hashes))
+            if not chunk_hashes:
                 return {"success": False, "message": "No text could be extracted from the document"}
             
             # Extract texts and metadata
-            texts = [chunk["text"] for chunk in chunks]
-            metadata_list = [chunk["metadata"] for chunk in chunks]
+            texts = [chunk["text"] for chunk in new_chunks]
+            metadata_list = [chunk["metadata"] for chunk in new_chunks]
             
             # Add filename to metadata if provided
             if filename:
                 for metadata in metadata_list:
                     metadata["filename"] = filename
             
-            # Generate embeddings
-            embeddings = self.embedding_generator.generate_embeddings(texts)
+            new_vector_ids = {}
+            if new_chunks:
+                # Generate embeddings
+                stage = "embed"
+                report("embed", "running")
+                embeddings = self.embedding_generator.generate_embeddings(texts)
+                report("embed", "completed", chunks_embedded=len(embeddings))
+                
+                # Store in the vector store
+                stage = "insert"
+                report("insert", "running")
+                result = self.vector_store.insert_documents(embeddings, texts, metadata_list)
+                ids = list(result["ids"]) if result and "ids" in result else [None] * len(new_chunks)
+                new_vector_ids = {metadata["chunk_hash"]: vector_id
+                                  for metadata, vector_id in zip(metadata_list, ids)}
+                self.lexical_index.add_many(ids, texts, metadata_list)
+                report("insert", "completed", chunks_inserted=len(embeddings))
+            else:
+                report("embed", "skipped")
+                report("insert", "skipped")
             
-            # Store in Milvus
-            self.milvus_manager.insert_documents(embeddings, texts, metadata_list)
+            # Chunks another worker stored meanwhile are kept once: our copies are deleted
+            orphaned, duplicates = self.document_registry.add_document(
+                doc_id, doc_hash, filename, chunk_hashes, new_vector_ids
+            )
+            self._delete_vectors(list(orphaned.values()) + list(duplicates.values()))
+            self._bump_generation()
             
+            stored = len(new_chunks) - len(duplicates)
+            deduplicated = len(chunk_hashes) - stored
             return {
                 "success": True,
-                "message": f"Successfully indexed {len(chunks)} chunks from document",
-                "chunks_count": len(chunks)
+                "message": f"Successfully indexed {len(chunk_hashes)} chunks from document "
+                           f"({stored} new, {deduplicated} deduplicated, {len(orphaned)} removed)",
+                "doc_id": doc_id,
+                "chunks_count": len(chunk_hashes),
+                "new_chunks": stored,
+                "deduplicated_chunks": deduplicated,
+                "removed_chunks": len(orphaned)
             }
-            
+        
         except Exception as e:
+            report(stage, "failed")
             return {"success": False, "message": f"Error processing document: {str(e)}"}
+        finally:
+            with self._indexing_lock:
+                self._indexing_keys.difference_update(keys)
+    
+    def delete_document(self, doc_id: str) -> Dict[str, Any]:
+        """Delete one document, and the chunks no other document shares, without touching the rest"""
+        try:
+            # The vectors go first, inside the registry's transaction: if deleting them fails the
+            # document stays recorded, and deleting it again finishes the job
+            orphaned = self.document_registry.remove_document(
+                doc_id, lambda chunks: self._delete_vectors(list(chunks.values()))
+            )
+            if orphaned is None:
+                return {"success": False, "found": False, "message": f"Document '{doc_id}' not found"}
+            self._bump_generation()
+            return {
+                "success": True,
+                "message": f"Document '{doc_id}' deleted ({len(orphaned)} chunks removed)",
+                "removed_chunks": len(orphaned)
+            }
+        except Exception as e:
+            return {"success": False, "message": f"Error deleting document: {str(e)}"}
+    
+    def list_documents(self, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+        """Indexed documents, oldest first, with the total count"""
+        return {
+            "documents": self.document_registry.list_documents(limit, offset),
+            "total": self.document_registry.counts().get("documents", 0)
+        }
+    
+    def _delete_vectors(self, vector_ids: List[Any]):
+        """Remove chunks from the vector store and the lexical index"""
+        vector_ids = [vector_id for vector_id in vector_ids if vector_id is not None]
+        if vector_ids:
+            self.vector_store.delete(vector_ids)
+            self.lexical_index.remove_many(vector_ids)
+    
+    SEARCH_MODES = ("vector", "lexical", "hybrid", "auto")
     
     def search_similar_chunks(self, query: str, top_k: int = 5, 
-                              filter_conditions: Optional[Dict] = None) -> List[Dict[str, Any]]:
+                              filter_conditions: Optional[Dict] = None,
+                              mode: Optional[str] = None) -> List[Dict[str, Any]]:
         """Search for similar chunks in the vector database"""
+        return self.search_chunks(query, top_k, filter_conditions, mode)["results"]
+    
+    def search_chunks(self, query: str, top_k: int = 5, filter_conditions: Optional[Dict] = None,
+                      mode: Optional[str] = None) -> Dict[str, Any]:
+        """Search chunks and report the retrieval path taken and its per-path latency
+
+        mode is "vector", "lexical", "hybrid" (both, fused by reciprocal rank) or
+        "auto", which answers exact-term queries such as citations and quoted
+        defined terms lexically without an embedding call and uses hybrid otherwise.
+        """
+        mode = self._resolve_mode(mode)
+        return self._search_chunks(query, top_k, filter_conditions, mode, self.collection_generation)
+    
+    def search_similar_chunks_batch(self, queries: List[str], top_k: int = 5,
+                                    filter_conditions=None,
+                                    mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """Search for several queries at once; returns one result list per query"""
+        return [response["results"] for response in
+                self.search_chunks_batch(queries, top_k, filter_conditions, mode)["responses"]]
+    
+    def search_chunks_batch(self, queries: List[str], top_k: int = 5, filter_conditions=None,
+                            mode: Optional[str] = None) -> Dict[str, Any]:
+        """Search for several queries with one embedding request and one vector store call
+
+        filter_conditions is either one dict applied to every query or a list with
+        one dict (or None) per query. Returns {"responses": [...], "timings_ms": {...}},
+        with a {"results", "mode", "cached"} response per query.
+        """
+        mode = self._resolve_mode(mode)
+        if isinstance(filter_conditions, list):
+            if len(filter_conditions) != len(queries):
+                raise ValueError("filter_conditions must have one entry per query")
+            filters = filter_conditions
+        else:
+            filters = [filter_conditions] * len(queries)
+        return self._search_chunks_batch(queries, top_k, filters, mode, self.collection_generation)
+    
+    def _resolve_mode(self, mode: Optional[str]) -> str:
+        mode = (mode or settings.SEARCH_MODE).lower()
+        if mode not in self.SEARCH_MODES:
+            raise ValueError(f"Unsupported search mode: {mode}")
+        return mode
+    
+    def _search_chunks(self, query: str, top_k: int, filter_conditions: Optional[Dict],
+                       mode: str, generation: int) -> Dict[str, Any]:
+        batch = self._search_chunks_batch([query], top_k, [filter_conditions], mode, generation)
+        return dict(batch["responses"][0], timings_ms=batch["timings_ms"])
+    
+    def _search_chunks_batch(self, queries: List[str], top_k: int, filters: List[Optional[Dict]],
+                             mode: str, generation: int) -> Dict[str, Any]:
+        search = self._start_search(queries, top_k, filters, mode, generation)
         try:
-            # Generate query embedding
-            query_embedding = self.embedding_generator.generate_query_embedding(query)
-            
-            # Build filter expression if conditions provided
-            filter_expr = None
-            if filter_conditions:
-                # Example: {"filename": "document.pdf"}
-                conditions = []
-                for key, value in filter_conditions.items():
-                    conditions.append(f'metadata["{key}"] == "{value}"')
-                filter_expr = " and ".join(conditions)
-            
-            # Search in Milvus
-            results = self.milvus_manager.search(query_embedding, top_k, filter_expr)
+            self._resolve_document_filters(search)
+            self._search_lexical(search)
             
-            # Format results
-            formatted_results = []
-            for hit in results:
-                formatted_results.append({
-                    "text": hit.get("entity", {}).get("text", ""),
-                    "metadata": hit.get("entity", {}).get("metadata", {}),
-                    "distance": hit.get("distance", 0),
-                    "score": 1 - hit.get("distance", 0)  # Convert distance to similarity score
-                })
-            
-            return formatted_results
+            # Vector path: one embedding request and one batched search for every query that needs it
+            texts = search.vector_texts()
+            if texts:
+                start = time.perf_counter()
+                embeddings = self.embedding_generator.generate_query_embeddings(texts)
+                search.timings["embedding"] = self._elapsed_ms(start)
+                self._search_vectors(search, embeddings)
             
+            self._fuse_results(search)
         except Exception as e:
-            print(f"Error searching documents: {e}")
-            return []
+            self._search_failed(search, e)
+        return self._finish_search(search)
+    
+    # The steps of _search_chunks_batch, shared with AsyncRAGEngine, which runs the
+    # blocking ones on worker threads and awaits the query embeddings
+    
+    def _start_search(self, queries: List[str], top_k: int, filters: List[Optional[Dict]],
+                      mode: str, generation: int) -> _Search:
+        """A search with its answers from the retrieval cache filled in"""
+        search = _Search(queries, top_k, filters)
+        for i, query in enumerate(queries):
+            cache_key = (
+                generation,
+                self._normalize_query(query),
+                top_k,
+                tuple(sorted((filters[i] or {}).items())),
+                mode
+            )
+            search.cache_keys.append(cache_key)
+            cached = self.retrieval_cache.get(cache_key)
+            if cached is not None:
+                search.responses[i] = dict(cached, cached=True)
+            else:
+                search.pending.append(i)
+                search.modes[i] = mode
+                conditions = {key: value for key, value in (filters[i] or {}).items() if key in DOCUMENT_KEYS}
+                if conditions:
+                    search.document_filters[i] = conditions
+        return search
+    
+    def _resolve_document_filters(self, search: _Search):
+        """Widen filters on document keys to the chunks the matching documents share with others
+
+        A chunk shared by several documents is stored once, with the document keys of the one
+        that stored it first, so the stored keys alone miss a document's shared chunks. The
+        filter keeps its conditions on the stored (indexed) keys and also accepts the ids of
+        those shared chunks, which are few however large the document.
+        """
+        for i, conditions in search.document_filters.items():
+            vector_ids = self.document_registry.borrowed_vector_ids(conditions)
+            if vector_ids is None:
+                search.pending.remove(i)
+                search.responses[i] = {"results": [], "mode": search.modes[i], "cached": False}
+            elif vector_ids:
+                other = {key: value for key, value in search.filters[i].items() if key not in DOCUMENT_KEYS}
+                search.filters[i] = dict(other, any_of=(conditions, {"id": tuple(sorted(vector_ids))}))
+    
+    def _search_lexical(self, search: _Search):
+        """BM25 results for the pending queries that use them; settles where auto mode sends each query"""
+        start = time.perf_counter()
+        candidates = max(search.top_k, settings.HYBRID_CANDIDATES)
+        for i in search.pending:
+            query, filter_conditions = search.queries[i], search.filters[i]
+            if search.modes[i] == "auto":
+                search.modes[i] = "hybrid"
+                if is_exact_term_query(query):
+                    search.lexical[i] = self.lexical_index.search(query, search.top_k, filter_conditions)
+                    search.modes[i] = "lexical" if search.lexical[i] else "vector"
+                    continue
+            if search.modes[i] in ("lexical", "hybrid"):
+                limit = search.top_k if search.modes[i] == "lexical" else candidates
+                search.lexical[i] = self.lexical_index.search(query, limit, filter_conditions)
+        if search.lexical:
+            search.timings["lexical"] = self._elapsed_ms(start)
+    
+    def _search_vectors(self, search: _Search, embeddings: List[List[float]]):
+        """Vector store hits for the queries of search.vector_texts(), given their embeddings"""
+        start = time.perf_counter()
+        vector_queries, limit = search.vector_queries()
+        hits = self.vector_store.search_batch(embeddings, limit, [search.filters[i] for i in vector_queries])
+        search.timings["vector"] = self._elapsed_ms(start)
+        for i, query_hits in zip(vector_queries, hits):
+            search.vector[i] = self._format_hits(query_hits)
+    
+    def _fuse_results(self, search: _Search):
+        """Fill in the pending responses from each path's results, caching the non-empty ones"""
+        start = time.perf_counter()
+        for i in search.pending:
+            mode = search.modes[i]
+            if mode == "lexical":
+                results = [dict(result, distance=None) for result in search.lexical[i]]
+            elif mode == "vector":
+                results = search.vector[i][:search.top_k]
+            else:
+                results = reciprocal_rank_fusion(
+                    [search.vector[i], [dict(result, distance=None) for result in search.lexical[i]]],
+                    search.top_k, k=settings.RRF_K
+                )
+            results = self._attribute_results(results, search.document_filters.get(i))
+            search.responses[i] = {"results": results, "mode": mode, "cached": False}
+            # Empty results are not cached: they may come from a transient failure
+            if results:
+                self.retrieval_cache.set(search.cache_keys[i], {"results": results, "mode": mode})
+        if any(search.modes[i] == "hybrid" for i in search.pending):
+            search.timings["fusion"] = self._elapsed_ms(start)
+    
+    def _attribute_results(self, results: List[Dict[str, Any]],
+                           conditions: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Give each result the document keys of a document that references its chunk and matches conditions
+
+        Results of chunks whose stored document was deleted, or, under a document filter,
+        of chunks stored by another document, are relabelled; the stores are left as they are.
+        Results no matching document references any more (their stored keys matched the
+        filter, but that document was deleted or re-indexed) are dropped.
+        """
+        stored = {result["metadata"]["chunk_hash"]: result["metadata"].get("doc_id")
+                  for result in results if result["metadata"].get("chunk_hash")}
+        owners = self.document_registry.chunk_owners(stored, conditions) if stored else {}
+        if not owners:
+            return results
+        attributed = []
+        for result in results:
+            chunk_hash = result["metadata"].get("chunk_hash")
+            if chunk_hash not in owners:
+                attributed.append(result)
+            elif owners[chunk_hash] is not None:
+                attributed.append(dict(result, metadata=dict(result["metadata"], **owners[chunk_hash])))
+        return attributed
+    
+    @staticmethod
+    def _search_failed(search: _Search, error: Exception):
+        logger.error("Error searching documents: %s", error)
+        for i in search.pending:
+            if search.responses[i] is None:
+                search.responses[i] = {"results": [], "mode": search.modes[i], "cached": False}
+    
+    @staticmethod
+    def _finish_search(search: _Search) -> Dict[str, Any]:
+        for stage, elapsed_ms in search.timings.items():
+            record_span(f"retrieval.{stage}", elapsed_ms / 1000)
+        return {"responses": search.responses, "timings_ms": search.timings}
+    
+    @staticmethod
+    def _elapsed_ms(start: float) -> float:
+        return round((time.perf_counter() - start) * 1000, 2)
+    
+    @staticmethod
+    def _format_hits(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        formatted_results = []
+        for hit in hits:
+            formatted_results.append({
+                "id": hit.get("id"),
+                "text": hit.get("entity", {}).get("text", ""),
+                "metadata": hit.get("entity", {}).get("metadata", {}),
+                "distance": hit.get("distance", 0),
+                "score": hit.get("distance", 0)  # With the COSINE metric, "distance" is the similarity
+            })
+        return formatted_results
+    
+    NO_CONTEXT_REPLY = (
+        "I couldn't find any relevant information in the uploaded documents. "
+        "Please make sure you've uploaded documents first."
+    )
+    
+    def _prepare_chat(self, query: str, top_k: int, filter_conditions: Optional[Dict],
+                      conversation_history: Optional[List[Dict]]) -> Dict[str, Any]:
+        """Retrieve context for a query and build the chat messages and answer cache key"""
+        generation = self.collection_generation
+        
+        # Search for relevant chunks
+        mode = self._resolve_mode(None)
+        relevant_chunks = self._search_chunks(query, top_k, filter_conditions, mode, generation)["results"]
+        return self._build_chat(query, relevant_chunks, conversation_history, generation)
+    
+    def _build_chat(self, query: str, relevant_chunks: List[Dict[str, Any]],
+                    conversation_history: Optional[List[Dict]], generation: int) -> Dict[str, Any]:
+        """Chat messages and answer cache key for a query and its retrieved chunks"""
+        if not relevant_chunks:
+            return {"chunks": [], "answer_key": None, "messages": None, "prompt_tokens": 0, "prompt_tokens_saved": 0}
+        
+        # Identical question, retrieved chunks and conversation so far give the same answer
+        history_fingerprint = hashlib.sha256(
+            json.dumps(conversation_history or [], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        answer_key = (
+            generation,
+            self._normalize_query(query),
+            tuple(chunk["id"] for chunk in relevant_chunks),
+            history_fingerprint
+        )
+        
+        # Build context from relevant chunks: best first, within the token budget, neighbours merged
+        with span("chat.context"):
+            context = self.context_builder.build(relevant_chunks)
+        
+        # Build messages for chat
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "You are a helpful assistant that answers questions based on the provided context. "
+                    "Always cite the source of your information when answering. "
+                    "If the context doesn't contain relevant information, say so clearly."
+                )
+            }
+        ]
+        
+        # Add conversation history if provided
+        if conversation_history:
+            messages.extend(conversation_history)
+        
+        # Add current query with context
+        messages.append({
+            "role": "user",
+            "content": f"Context:\n{context['context']}\n\nQuestion: {query}"
+        })
+        
+        return {
+            "chunks": relevant_chunks,
+            "answer_key": answer_key,
+            "messages": messages,
+            "prompt_tokens": sum(message_tokens(message) for message in messages),
+            "prompt_tokens_saved": context["tokens_saved"]
+        }
     
     def chat_with_context(self, query: str, top_k: int = 5, 
                           filter_conditions: Optional[Dict] = None,
                           conversation_history: Optional[List[Dict]] = None) -> str:
         """Chat with documents using RAG"""
+        return self.chat(query, top_k, filter_conditions, conversation_history)["reply"]
+    
+    def chat(self, query: str, top_k: int = 5, filter_conditions: Optional[Dict] = None,
+             conversation_history: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """Chat with documents using RAG; returns the reply with the prompt's token count and tokens saved"""
+        prepared = None
         try:
-            # Search for relevant chunks
-            relevant_chunks = self.search_similar_chunks(query, top_k, filter_conditions)
-            
-            if not relevant_chunks:
-                return "I couldn't find any relevant information in the uploaded documents. Please make sure you've uploaded documents first."
-            
-            # Build context from relevant chunks
-            context = "\n\n".join([
-                f"[Source: {chunk['metadata'].get('filename', 'Unknown')} - "
-                f"Chunk {chunk['metadata'].get('chunk_index', 'Unknown')}]\n{chunk['text']}"
-                for chunk in relevant_chunks
-            ])
-            
-            # Build messages for chat
-            messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful assistant that answers questions based on the provided context. "
-                        "Always cite the source of your information when answering. "
-                        "If the context doesn't contain relevant information, say so clearly."
-                    )
-                }
-            ]
-            
-            # Add conversation history if provided
-            if conversation_history:
-                messages.extend(conversation_history)
-            
-            # Add current query with context
-            messages.append({
-                "role": "user",
-                "content": f"Context:\n{context}\n\nQuestion: {query}"
-            })
-            
-            # Generate response
-            response = self.openai_client.chat.completions.create(
-                model=self.chat_model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            return response.choices[0].message.content
-            
+            prepared = self._prepare_chat(query, top_k, filter_conditions, conversation_history)
+            answer = self._answer_without_model(prepared)
+            if answer is None:
+                # Generate response
+                with span("chat.completion"):
+                    response = self.openai_client.chat.completions.create(**self._completion_request(prepared))
+                answer = response.choices[0].message.content
+                self._record_answer(prepared, answer, getattr(response, "usage", None))
+            return self._chat_reply(answer, prepared)
+        
         except Exception as e:
-            return f"Error generating response: {str(e)}"
+            return self._chat_reply(f"Error generating response: {str(e)}", prepared)
+    
+    # The steps of chat, shared with AsyncRAGEngine, which also streams replies
+    
+    def _answer_without_model(self, prepared: Dict[str, Any]) -> Optional[str]:
+        """The reply when no completion is needed: nothing was retrieved, or the answer is cached"""
+        if not prepared["chunks"]:
+            return self.NO_CONTEXT_REPLY
+        return self.answer_cache.get(prepared["answer_key"])
+    
+    def _completion_request(self, prepared: Dict[str, Any], stream: bool = False) -> Dict[str, Any]:
+        request = {"model": self.chat_model, "messages": prepared["messages"], "temperature": 0.7, "max_tokens": 1000}
+        if stream:
+            request["stream"] = True
+        return request
+    
+    def _record_answer(self, prepared: Dict[str, Any], answer: str, usage=None):
+        """Count a generated answer's tokens and cache it"""
+        self._count_chat_tokens(prepared, answer, usage)
+        self.answer_cache.set(prepared["answer_key"], answer)
+    
+    @staticmethod
+    def _chat_reply(text: str, prepared: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "reply": text,
+            "prompt_tokens": prepared["prompt_tokens"] if prepared else 0,
+            "prompt_tokens_saved": prepared["prompt_tokens_saved"] if prepared else 0
+        }
+    
+    @staticmethod
+    def _sources(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "filename": chunk["metadata"].get("filename"),
+                "chunk_index": chunk["metadata"].get("chunk_index"),
+                "page": chunk["metadata"].get("page"),
+                "score": chunk["score"]
+            }
+            for chunk in chunks
+        ]
+    
+    def _count_chat_tokens(self, prepared: Dict[str, Any], answer: Optional[str], usage=None):
+        """Count a completion's tokens, from the API's usage when given, else estimated"""
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or prepared["prompt_tokens"]
+        completion_tokens = getattr(usage, "completion_tokens", None) or count_tokens(answer or "", self.chat_model)
+        CHAT_TOKENS.inc(prompt_tokens, kind="prompt")
+        CHAT_TOKENS.inc(completion_tokens, kind="completion")
+        PROMPT_TOKENS_SAVED.inc(prepared["prompt_tokens_saved"])
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get statistics about the vector database"""
-        return self.milvus_manager.get_collection_stats()
+        """Get statistics about the vector database, from maintained counters rather than a count query"""
+        counts = self.document_registry.counts()
+        stats = {
+            "collection_name": getattr(self.vector_store, "collection_name", settings.VECTOR_STORE_BACKEND),
+            "document_count": counts.get("chunks", 0),
+            "documents": counts.get("documents", 0)
+        }
+        if self.embedding_generator.cache:
+            stats["embedding_cache"] = self.embedding_generator.cache.stats()
+        stats["retrieval_cache"] = self.retrieval_cache.stats()
+        stats["answer_cache"] = self.answer_cache.stats()
+        stats["lexical_index_chunks"] = len(self.lexical_index)
+        stats["collection_generation"] = self.collection_generation
+        return stats
     
     def clear_all_documents(self):
         """Clear all documents from the database"""
         try:
-            self.milvus_manager.delete_collection()
-            self.milvus_manager = MilvusManager()  # Recreate collection
+            self.vector_store.clear()
+            self.document_registry.clear()
+            self.lexical_index.clear()
+            self._bump_generation()
             return {"success": True, "message": "All documents cleared successfully"}
         except Exception as e:
             return {"success": False, "message": f"Error clearing documents: {str(e)}"}
\ No newline at end of file
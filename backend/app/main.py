@@ -1,13 +1,112 @@
+import asyncio
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
+from typing import Callable
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.api.v1.routes import chat_pdf
+from app.core.clients import create_service_clients
+from app.core.config import settings
+from app.core.metrics import REGISTRY, MetricsMiddleware
+from app.utils.uploads import UploadLimitMiddleware
+from app.features.chat_pdf.rag_engine import RAGEngine
+from app.features.chat_pdf.async_rag_engine import AsyncRAGEngine
+from app.features.chat_pdf.ingestion_queue import IngestionQueue
+from app.features.chat_pdf.conversation_store import create_conversation_store
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI(title="LegalBot API", version="1.0.0")
+logging.basicConfig(level=settings.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+def service_metrics(clients, rag_engine, ingestion_queue):
+    """Collector for /metrics: cache, connection pool and ingestion queue gauges, read at scrape time"""
+    def collect():
+        samples = []
+        caches = {"retrieval": rag_engine.retrieval_cache, "answer": rag_engine.answer_cache,
+                  "embedding": rag_engine.embedding_generator.cache, "ocr": rag_engine.doc_processor.ocr_cache}
+        for name, cache in caches.items():
+            if cache is None:
+                continue
+            stats = cache.stats()
+            samples.append(("legalbot_cache_hits", "Cache hits", {"cache": name}, stats["hits"]))
+            samples.append(("legalbot_cache_misses", "Cache misses", {"cache": name}, stats["misses"]))
+            samples.append(("legalbot_cache_hit_ratio", "Cache hits over lookups", {"cache": name}, stats["hit_rate"]))
+        for pool, stats in clients.stats().items():
+            in_flight = stats.get("in_flight", stats.get("in_use", 0))
+            samples.append(("legalbot_pool_in_flight", "Requests using each client pool", {"pool": pool}, in_flight))
+            samples.append(("legalbot_pool_saturation", "Pool usage over its limit", {"pool": pool}, stats["saturation"]))
+        statuses = {}
+        for job in ingestion_queue.list_jobs(all_workers=False):
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        for status, count in statuses.items():
+            samples.append(("legalbot_ingestion_jobs", "Retained ingestion jobs by status", {"status": status}, count))
+        return samples
+    return collect
+
+def start_engine(app: FastAPI, clients) -> Callable:
+    """Build the engine and the services on top of it, returning its metrics collector"""
+    rag_engine = RAGEngine(clients=clients)
+    # Uploads are indexed in the background so parsing and embedding never block the event loop
+    ingestion_queue = IngestionQueue(
+        rag_engine,
+        max_workers=settings.INGESTION_WORKERS,
+        max_pending=settings.INGESTION_QUEUE_SIZE
+    )
+    # Chat and search on the event loop itself, over the same stores and caches
+    app.state.async_rag_engine = AsyncRAGEngine(rag_engine, clients.serving_openai)
+    app.state.ingestion_queue = ingestion_queue
+    # Set last: readiness and the engine dependencies wait for it
+    app.state.rag_engine = rag_engine
+    collector = service_metrics(clients, rag_engine, ingestion_queue)
+    REGISTRY.add_collector(collector)
+    return collector
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Built once per worker process, after the server has started, and shared by every request
+    clients = create_service_clients()
+    conversation_store = create_conversation_store()
+    app.state.clients = clients
+    app.state.conversation_store = conversation_store
+    # Building the engine connects to the vector store and opens its caches and indexes. It runs
+    # on a worker thread so the server answers /health at once; /ready and the engine's routes
+    # return 503 until it is done
+    startup = asyncio.create_task(asyncio.to_thread(start_engine, app, clients))
+    
+    def log_startup(task: asyncio.Task):
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            app.state.startup_error = str(task.exception())
+            logger.error("Engine startup failed: %s", task.exception(), exc_info=task.exception())
+        else:
+            logger.info("Engine ready %.2fs after startup began", time.time() - clients.started_at)
+    
+    startup.add_done_callback(log_startup)
+    try:
+        yield
+    finally:
+        collector = None
+        try:
+            collector = await startup
+        except Exception:
+            pass  # Logged by log_startup
+        if collector is not None:
+            REGISTRY.remove_collector(collector)
+            # Let running ingestion jobs finish before their clients go away
+            app.state.ingestion_queue.shutdown(wait=True)
+            app.state.rag_engine.close()
+        conversation_store.close()
+        await clients.aclose()
+        clients.close()
+
+app = FastAPI(title="LegalBot API", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -18,6 +117,12 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Stop oversized uploads while they arrive, before the form is spooled
+app.add_middleware(UploadLimitMiddleware, max_file_bytes=settings.MAX_FILE_SIZE)
+
+# Per-request latency histograms, stage spans and X-Request-ID / Server-Timing headers
+app.add_middleware(MetricsMiddleware, slow_request_seconds=settings.SLOW_REQUEST_SECONDS)
+
 # Include routers
 app.include_router(
     chat_pdf.router,
@@ -30,5 +135,29 @@ def read_root():
     return {"message": "LegalBot Backend API v1.0.0", "status": "running"}
 
 @app.get("/health")
-def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+def health_check(request: Request):
+    """Liveness: the process is up. Reports connection pool usage."""
+    clients = getattr(request.app.state, "clients", None)
+    return {"status": "healthy", "pools": clients.stats() if clients else {}}
+
+@app.get("/ready")
+def readiness_check(request: Request):
+    """Readiness: the engine is built and no connection pool is saturated"""
+    clients = getattr(request.app.state, "clients", None)
+    startup_error = getattr(request.app.state, "startup_error", None)
+    if startup_error is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": startup_error})
+    if getattr(request.app.state, "rag_engine", None) is None or clients is None:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    
+    pools = clients.stats()
+    saturated = [name for name, pool in pools.items()
+                 if pool["saturation"] >= settings.READY_MAX_SATURATION]
+    if saturated:
+        return JSONResponse(status_code=503, content={"status": "saturated", "saturated": saturated, "pools": pools})
+    return {"status": "ready", "pools": pools}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: latency histograms, token counts, cache hit rates and in-flight gauges"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
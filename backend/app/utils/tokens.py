@@ -0,0 +1,34 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English text with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """The tiktoken encoding for model, or None when tiktoken is not installed"""
+    # Imported on first use, so importing the app (as every API worker does) loads no tokenizer
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed: token counts for %s are estimated as characters / %d, "
+                       "so chunk and prompt budgets are approximate (pip install tiktoken)",
+                       model, CHARS_PER_TOKEN)
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "text-embedding-ada-002") -> int:
+    """Count the tokens in text for model, estimating from its length only when tiktoken is missing"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
@@ -0,0 +1,81 @@
+import os
+import tempfile
+from typing import BinaryIO, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+
+class UploadTooLargeError(Exception):
+    """An upload grew past the allowed size while being read"""
+
+    def __init__(self, max_bytes: int, received: int):
+        self.max_bytes = max_bytes
+        self.received = received
+        super().__init__(f"File size exceeds maximum allowed size of {max_bytes / (1024 * 1024):.4g}MB")
+
+
+def spool_upload(source: BinaryIO, max_bytes: int, suffix: str = "", directory: Optional[str] = None,
+                 chunk_size: int = 1024 * 1024) -> Tuple[str, int]:
+    """Copy a file object to a new temporary file chunk by chunk, returning (path, size)
+
+    At most chunk_size bytes are held in memory. The size is checked after every
+    chunk: past max_bytes the partial file is deleted and UploadTooLargeError raised.
+    The caller owns the returned file and must delete it.
+    """
+    fd, path = tempfile.mkstemp(prefix="legalbot-upload-", suffix=suffix, dir=directory or None)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: source.read(chunk_size), b""):
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes, size)
+                out.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, size
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware capping request bodies on upload paths before the form is parsed
+
+    Requests declaring a larger Content-Length are answered 413 without reading
+    the body; otherwise body chunks are counted as they arrive and reading stops
+    at the limit, so an oversized upload is never spooled in full. The limit is
+    max_file_bytes plus overhead_bytes for the multipart framing and form fields.
+    """
+
+    def __init__(self, app, max_file_bytes: int, overhead_bytes: int = 1024 * 1024,
+                 paths: Tuple[str, ...] = ("/uploadfile",)):
+        self.app = app
+        self.max_file_bytes = max_file_bytes
+        self.max_bytes = max_file_bytes + overhead_bytes
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].endswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope.get("headers") or []).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_bytes:
+            response = JSONResponse({"detail": str(UploadTooLargeError(self.max_file_bytes, int(declared)))},
+                                    status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside form parsing; FastAPI passes HTTPExceptions through as the response
+                    raise HTTPException(status_code=413, detail=str(UploadTooLargeError(self.max_file_bytes, received)))
+            return message
+
+        await self.app(scope, limited_receive, send)
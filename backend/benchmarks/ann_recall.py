@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+"""
+Recall against latency for Milvus ANN index types, vector types and dimensions.
+
+Builds one temporary collection per (index, vector type, dimension) case with
+MilvusManager, then sweeps the search parameter (ef for HNSW, nprobe for IVF)
+and reports recall@k against exact cosine search over the full-size float32
+vectors, per-query latency, build time and raw vector bytes. Reduced
+dimensions are taken as the leading components, renormalized, which is how
+text-embedding-3 shortens its vectors.
+
+Vectors are clustered synthetic ones unless --vectors names a .npy file of real
+embeddings (rows = vectors). --fake runs against the in-process fake Milvus,
+whose search is exact: use it to check the script, not to compare indexes.
+
+Usage (from backend/):
+    python -m benchmarks.ann_recall --uri http://localhost:19530 --vectors 50000
+    python -m benchmarks.ann_recall --indexes "HNSW:M=32,efConstruction=256;IVF_SQ8:nlist=512" \\
+        --vector-types float32,float16 --dimensions 1536,512 --output ann.json
+"""
+import argparse
+import sys
+import os
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.clients import MilvusConnectionPool
+from app.core.milvus_client import MilvusManager
+from benchmarks.report import summarize, write_results
+
+VECTOR_BYTES = {"float32": 4, "float16": 2, "int8": 1}
+
+
+def parse_indexes(spec: str) -> list:
+    """"HNSW:M=16,efConstruction=200;IVF_FLAT:nlist=1024" -> [("HNSW", {...}), ("IVF_FLAT", {...})]"""
+    indexes = []
+    for part in filter(None, (p.strip() for p in spec.split(";"))):
+        index_type, _, params = part.partition(":")
+        parsed = {}
+        for item in filter(None, params.split(",")):
+            key, _, value = item.partition("=")
+            parsed[key.strip()] = float(value) if "." in value else int(value)
+        indexes.append((index_type.strip().upper(), parsed))
+    return indexes
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def make_vectors(count: int, queries: int, dimension: int, clusters: int, seed: int):
+    """Clustered unit vectors, with queries drawn from the same clusters"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+
+    def sample(n):
+        points = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dimension)).astype(np.float32)
+        return normalize(points)
+
+    return sample(count), sample(queries)
+
+
+def load_vectors(path: str, queries: int, seed: int):
+    """Hold out random rows of a saved embedding matrix as queries"""
+    matrix = normalize(np.load(path).astype(np.float32))
+    order = np.random.default_rng(seed).permutation(len(matrix))
+    return matrix[order[queries:]], matrix[order[:queries]]
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def wait_for_index(client, collection_name: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = client.describe_index(collection_name, "embedding") or {}
+        if not info.get("pending_index_rows") and info.get("state", "Finished") == "Finished":
+            return
+        time.sleep(0.5)
+    raise TimeoutError(f"Index of {collection_name} not built after {timeout}s")
+
+
+def sweep_values(index_type: str, args) -> list:
+    if index_type == "HNSW":
+        return [{"ef": int(ef)} for ef in args.ef.split(",")]
+    if index_type.startswith("IVF"):
+        return [{"nprobe": int(nprobe)} for nprobe in args.nprobe.split(",")]
+    return [{}]
+
+
+def run_index(pool, vectors, queries, truth, index_type, index_params, vector_type, dimension, args) -> list:
+    name = f"ann_bench_{uuid.uuid4().hex[:8]}"
+    manager = MilvusManager(pool=pool, collection_name=name, dimension=dimension, index_type=index_type,
+                            index_params=index_params, search_params={}, vector_type=vector_type)
+    if not manager.client.has_collection(name):
+        raise RuntimeError(f"Could not create a {index_type} / {vector_type} collection (see log)")
+    try:
+        stored = normalize(vectors[:, :dimension])
+        probes = normalize(queries[:, :dimension])
+
+        start = time.perf_counter()
+        row_of_id = {}
+        for offset in range(0, len(stored), args.insert_batch):
+            batch = stored[offset:offset + args.insert_batch]
+            result = manager.insert_documents(batch, [""] * len(batch), [{} for _ in batch])
+            row_of_id.update((vector_id, offset + i) for i, vector_id in enumerate(result["ids"]))
+        insert_seconds = time.perf_counter() - start
+        manager.client.flush(name)
+        wait_for_index(manager.client, name, args.index_timeout)
+        build_seconds = time.perf_counter() - start
+
+        results = []
+        for search_params in sweep_values(index_type, args):
+            manager.search_params = search_params
+            manager.search(probes[0], top_k=args.k)  # warm-up
+            samples, hits = [], 0
+            for probe, expected in zip(probes, truth):
+                query_start = time.perf_counter()
+                found = manager.search(probe, top_k=args.k)
+                samples.append(time.perf_counter() - query_start)
+                hits += len({row_of_id.get(hit["id"]) for hit in found} & set(expected.tolist()))
+            results.append({
+                "case": f"{index_type}/{vector_type}/{dimension}",
+                "index_type": index_type,
+                "index_params": manager.index_params,
+                "search_params": search_params,
+                "vector_type": vector_type,
+                "dimension": dimension,
+                "vectors": len(stored),
+                f"recall_at_{args.k}": round(hits / (len(probes) * args.k), 4),
+                "insert_seconds": round(insert_seconds, 3),
+                "build_seconds": round(build_seconds, 3),
+                "vector_bytes": len(stored) * dimension * VECTOR_BYTES[vector_type],
+                **summarize(samples)
+            })
+        return results
+    finally:
+        if not args.keep:
+            manager.delete_collection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=os.getenv("MILVUS_HOST"), help="Milvus URI (default: MILVUS_HOST)")
+    parser.add_argument("--token", default=os.getenv("MILVUS_TOKEN"))
+    parser.add_argument("--fake", action="store_true", help="Use the in-process fake Milvus (exact search)")
+    parser.add_argument("--vectors", default="20000", help="Number of synthetic vectors, or a .npy file")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=1536, help="Size of synthetic vectors")
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--indexes", default="HNSW:M=16,efConstruction=200;IVF_FLAT:nlist=1024;"
+                                             "IVF_SQ8:nlist=1024;IVF_PQ:nlist=1024,m=16,nbits=8")
+    parser.add_argument("--ef", default="16,32,64,128,256", help="HNSW search sweep")
+    parser.add_argument("--nprobe", default="1,4,16,64", help="IVF search sweep")
+    parser.add_argument("--vector-types", default="float32", help="float32, float16 and/or int8 (HNSW only)")
+    parser.add_argument("--dimensions", default="", help="Stored dimensions (default: the vectors' own)")
+    parser.add_argument("--insert-batch", type=int, default=2000)
+    parser.add_argument("--index-timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark collections")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.vectors.endswith(".npy"):
+        vectors, queries = load_vectors(args.vectors, args.queries, args.seed)
+    else:
+        vectors, queries = make_vectors(int(args.vectors), args.queries, args.dimension, args.clusters, args.seed)
+    dimensions = [int(d) for d in args.dimensions.split(",")] if args.dimensions else [vectors.shape[1]]
+
+    if args.fake:
+        from benchmarks.fake_milvus import FakeMilvusServer
+        factory = FakeMilvusServer(latency=0.0).client
+    else:
+        from pymilvus import MilvusClient
+        if not args.uri:
+            parser.error("pass --uri or set MILVUS_HOST, or use --fake")
+        factory = lambda: MilvusClient(uri=args.uri, token=args.token or "")
+    pool = MilvusConnectionPool(factory, size=1)
+
+    # Ground truth: exact search over the full-size float32 vectors
+    start = time.perf_counter()
+    truth = exact_top_k(vectors, queries, args.k)
+    results = [{"case": "exact/numpy", "vectors": len(vectors), "dimension": vectors.shape[1],
+                "seconds_per_query": round((time.perf_counter() - start) / len(queries), 6)}]
+    try:
+        for index_type, index_params in parse_indexes(args.indexes):
+            for vector_type in args.vector_types.split(","):
+                if vector_type == "int8" and index_type != "HNSW":
+                    continue
+                for dimension in dimensions:
+                    results.extend(run_index(pool, vectors, queries, truth, index_type, index_params,
+                                             vector_type, dimension, args))
+    finally:
+        pool.close()
+
+    write_results(results, args.output, "ann_recall", vars(args))
+
+
+if __name__ == "__main__":
+    main()
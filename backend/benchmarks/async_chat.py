@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+Concurrent chat throughput of the blocking and the async RAG engine, offline.
+
+Builds the engine in this process against a FakeOpenAIServer and an in-process
+fake Milvus, indexes --docs synthetic contracts, then for each concurrency
+level runs that many asyncio tasks for --duration seconds, each sending chats
+back to back. Every query is unique, so no cache answers it. Cases:
+
+- blocking: RAGEngine.chat called on the event loop, as the /chat handler did
+  before the async engine: one chat at a time, whatever the concurrency
+- threads: RAGEngine.chat on a pool of --threads worker threads, Starlette's
+  default for sync handlers
+- async: AsyncRAGEngine.chat, one task per chat
+
+Usage (from backend/):
+    python -m benchmarks.async_chat --concurrency 1,8,32,128,256 --output async_chat.json
+    python -m benchmarks.async_chat --cases threads,async --chat-latency 1.0
+
+The fake OpenAI server shares this process, so on a machine with few cores
+its CPU time caps throughput at high concurrency for every case alike.
+"""
+import argparse
+import asyncio
+import sys
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_contract_pdf
+from benchmarks.fake_milvus import FakeMilvusServer
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.report import summarize, write_results
+
+QUESTIONS = [
+    "What are the termination notice requirements?",
+    "Who must indemnify the other party for losses?",
+    "Which law governs the agreement?",
+    "What limits apply to liability for damages?",
+]
+
+
+async def run_level(case: str, concurrency: int, duration: float, engine, async_engine, executor) -> dict:
+    loop = asyncio.get_running_loop()
+    samples, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client(worker: int):
+        nonlocal errors
+        sent = 0
+        while time.perf_counter() < deadline:
+            # A unique suffix defeats the retrieval and answer caches
+            query = (f"{QUESTIONS[sent % len(QUESTIONS)]} "
+                     f"(case {case} level {concurrency} client {worker} request {sent})")
+            sent += 1
+            start = time.perf_counter()
+            if case == "blocking":
+                response = engine.chat(query)
+                # Let the other clients take their turn, as the server would between requests
+                await asyncio.sleep(0)
+            elif case == "threads":
+                response = await loop.run_in_executor(executor, engine.chat, query)
+            else:
+                response = await async_engine.chat(query)
+            if response["reply"].startswith("Error"):
+                errors += 1
+            else:
+                samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(worker) for worker in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "case": case,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "chats": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        **summarize(samples)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32,128,256")
+    parser.add_argument("--cases", default="blocking,threads,async")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per case and concurrency level")
+    parser.add_argument("--threads", type=int, default=40, help="Worker threads for the threads case")
+    parser.add_argument("--max-connections", type=int, default=512,
+                        help="OpenAI connection pool size (OPENAI_MAX_CONNECTIONS)")
+    parser.add_argument("--docs", type=int, default=5, help="Synthetic contracts indexed first")
+    parser.add_argument("--doc-kb", type=float, default=32)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Fake OpenAI embeddings latency (s)")
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Fake OpenAI time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Fake OpenAI seconds per reply token")
+    parser.add_argument("--milvus-latency", type=float, default=0.002, help="Fake Milvus latency per call (s)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    fake_openai = FakeOpenAIServer(latency=args.embed_latency, chat_latency=args.chat_latency,
+                                   token_latency=args.token_latency).start()
+
+    # Settings are read at import time, so the environment is prepared before the app is imported
+    data_dir = tempfile.mkdtemp(prefix="legalbot-bench-")
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+    os.environ["OPENAI_BASE_URL"] = fake_openai.base_url
+    os.environ["OPENAI_MAX_CONNECTIONS"] = str(args.max_connections)
+    os.environ["OPENAI_MAX_KEEPALIVE"] = str(args.max_connections)
+    os.environ["VECTOR_STORE_BACKEND"] = "milvus"
+    os.environ["MILVUS_HOST"] = "http://fake-milvus"
+    os.environ["NUMPY_STORE_PATH"] = ""
+    os.environ["DOCUMENT_REGISTRY_PATH"] = os.path.join(data_dir, "document_registry.sqlite3")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(data_dir, "embedding_cache.sqlite3")
+    os.environ["OCR_CACHE_PATH"] = os.path.join(data_dir, "ocr_cache.sqlite3")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(data_dir, "lexical_index.jsonl")
+    FakeMilvusServer(latency=args.milvus_latency).install()
+
+    from app.core.clients import create_service_clients
+    from app.features.chat_pdf.async_rag_engine import AsyncRAGEngine
+    from app.features.chat_pdf.rag_engine import RAGEngine
+
+    clients = create_service_clients()
+    engine = RAGEngine(clients=clients)
+    executor = ThreadPoolExecutor(max_workers=args.threads)
+    try:
+        for i in range(args.docs):
+            engine.upload_and_index_document(file_bytes=make_contract_pdf(args.doc_kb, seed=i),
+                                             file_type="pdf", filename=f"contract-{i}.pdf")
+
+        async def run_all() -> list:
+            # The serving client binds to this loop, as it would to the server's
+            async_engine = AsyncRAGEngine(engine, clients.serving_openai)
+            results = []
+            try:
+                for case in args.cases.split(","):
+                    for concurrency in (int(c) for c in args.concurrency.split(",")):
+                        results.append(await run_level(case, concurrency, args.duration,
+                                                        engine, async_engine, executor))
+            finally:
+                await clients.aclose()
+            return results
+
+        results = asyncio.run(run_all())
+    finally:
+        executor.shutdown()
+        engine.close()
+        clients.close()
+        fake_openai.stop()
+
+    write_results(results, args.output, "async_chat", vars(args))
+
+
+if __name__ == "__main__":
+    main()
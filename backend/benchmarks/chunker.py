@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Chunking benchmark on multi-megabyte synthetic contracts.
+
+Compares the original character-based DocumentProcessor._split_text (kept
+below as legacy_split_text) with the token-aware streaming TokenChunker, and
+reports throughput plus the token size distribution of the chunks each produces.
+
+Usage (from backend/):
+    python -m benchmarks.chunker --sizes-mb 1,4,8
+"""
+import argparse
+import json
+import random
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.features.chat_pdf.chunker import TokenChunker
+from app.utils.tokens import count_tokens
+
+WORDS = ("party shall indemnify defend hold harmless against losses claims damages arising from "
+         "breach agreement termination notice days written consent assignment governing law "
+         "confidential information obligations warranties representations liability").split()
+
+
+def legacy_split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list:
+    """The original DocumentProcessor._split_text, for comparison"""
+    if not text.strip():
+        return []
+
+    text = text.replace('\n\n', ' ').replace('\n', ' ').strip()
+
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+
+    while start < len(text):
+        end = start + chunk_size
+
+        if end < len(text):
+            for sep in ['. ', '? ', '! ', '\n']:
+                last_sep = text.rfind(sep, start, end)
+                if last_sep != -1:
+                    end = last_sep + len(sep)
+                    break
+            else:
+                last_space = text.rfind(' ', start, end)
+                if last_space != -1:
+                    end = last_space + 1
+
+        chunks.append(text[start:end].strip())
+
+        start = end - chunk_overlap
+
+    return chunks
+
+
+def make_pages(size_mb: float, page_chars: int = 3000, seed: int = 0) -> list:
+    """Synthetic contract pages: numbered sections and lettered clauses, one per line
+
+    Clauses end in full stops: legacy_split_text never terminates when the only
+    sentence break in a window falls inside the overlap, as it would with ";".
+    """
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    pages, page, total, section = [], [], 0, 0
+    while total < target:
+        section += 1
+        paragraph = [f"Section {section // 10}.{section % 10} {rng.choice(WORDS).title()}."]
+        for letter in "abcd"[:rng.randint(1, 4)]:
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+            paragraph.append(f"({letter}) The {sentence}.")
+        text = "\n".join(paragraph)
+        page.append(text)
+        total += len(text) + 2
+        if sum(len(p) for p in page) >= page_chars:
+            pages.append("\n\n".join(page))
+            page = []
+    if page:
+        pages.append("\n\n".join(page))
+    return pages
+
+
+def token_stats(chunks: list) -> dict:
+    sizes = sorted(count_tokens(chunk) for chunk in chunks)
+    return {
+        "chunks": len(chunks),
+        "tokens_total": sum(sizes),
+        "tokens_p50": sizes[len(sizes) // 2] if sizes else 0,
+        "tokens_max": sizes[-1] if sizes else 0
+    }
+
+
+def run_case(name: str, size_mb: float, pages: list, split) -> dict:
+    start = time.perf_counter()
+    chunks = split(pages)
+    elapsed = time.perf_counter() - start
+    result = {
+        "case": name,
+        "size_mb": size_mb,
+        "seconds": round(elapsed, 3),
+        "mb_per_second": round(size_mb / elapsed, 2)
+    }
+    result.update(token_stats(chunks))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", default="1,4,8")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Legacy chunk size in characters")
+    parser.add_argument("--chunk-overlap", type=int, default=200, help="Legacy overlap in characters")
+    parser.add_argument("--chunk-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    chunker = TokenChunker(args.chunk_tokens, args.overlap_tokens)
+    results = []
+    for size_mb in [float(size) for size in args.sizes_mb.split(",")]:
+        pages = make_pages(size_mb)
+        # The original code chunked page by page
+        results.append(run_case("legacy-chars", size_mb, pages, lambda pages: [
+            chunk for page in pages
+            for chunk in legacy_split_text(page, args.chunk_size, args.chunk_overlap)
+        ]))
+        results.append(run_case("token-stream", size_mb, pages, lambda pages: [
+            chunk["text"] for chunk in chunker.chunk_pages(enumerate(pages, start=1))
+        ]))
+
+    for result in results:
+        print(json.dumps(result))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
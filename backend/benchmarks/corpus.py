@@ -0,0 +1,39 @@
+"""Synthetic documents for the benchmarks"""
+from benchmarks.chunker import make_pages
+
+
+def make_pdf(pages: list) -> bytes:
+    """A minimal PDF with one page of Helvetica text per string in pages, lines split on newlines"""
+    n = len(pages)
+    font_id = 3 + 2 * n
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(n))}] /Count {n} >>"
+    ]
+    for i, text in enumerate(pages):
+        lines = " ".join(
+            "(%s) '" % line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            for line in text.split("\n")
+        )
+        content = f"BT /F1 9 Tf 20 780 Td 11 TL {lines} ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>")
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("ascii")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    return bytes(out)
+
+
+def make_contract_pdf(size_kb: float, seed: int = 0) -> bytes:
+    """A synthetic contract PDF with roughly size_kb of text"""
+    return make_pdf(make_pages(size_kb / 1024, seed=seed))
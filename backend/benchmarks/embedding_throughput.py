@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Embedding throughput benchmark against a local fake OpenAI server.
+
+Compares the original strategy (sequential batches of 100 texts) with the
+concurrent token-packed EmbeddingScheduler at several concurrency limits.
+
+Usage (from backend/):
+    python -m benchmarks.embedding_throughput --texts 2000 --latency 0.05
+"""
+import argparse
+import json
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.embedding_scheduler import EmbeddingScheduler
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def make_texts(count: int, words: int) -> list:
+    return [" ".join(f"clause{i}-term{j}" for j in range(words)) for i in range(count)]
+
+
+def run_case(name: str, server: FakeOpenAIServer, texts: list, **scheduler_kwargs) -> dict:
+    scheduler = EmbeddingScheduler(
+        "text-embedding-ada-002",
+        api_key="fake-key",
+        base_url=server.base_url,
+        base_backoff=0.05,
+        **scheduler_kwargs
+    )
+    requests_before, limited_before = server.requests, server.rate_limited
+    start = time.perf_counter()
+    embeddings = scheduler.embed(texts)
+    elapsed = time.perf_counter() - start
+    assert len(embeddings) == len(texts)
+    return {
+        "case": name,
+        "texts": len(texts),
+        "seconds": round(elapsed, 3),
+        "texts_per_second": round(len(texts) / elapsed, 1),
+        "requests": server.requests - requests_before,
+        "rate_limited": server.rate_limited - limited_before
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=150, help="Words per text (~ chunk size)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake server latency per request (s)")
+    parser.add_argument("--per-item-latency", type=float, default=0.0005)
+    parser.add_argument("--max-concurrent", type=int, default=0,
+                        help="Fake server answers 429 beyond this many requests in flight (0 = unlimited)")
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--batch-tokens", type=int, default=20000)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts, args.words)
+    results = []
+    with FakeOpenAIServer(latency=args.latency, per_item_latency=args.per_item_latency,
+                          max_concurrent=args.max_concurrent) as server:
+        # The original behaviour: one request of 100 texts at a time
+        results.append(run_case("sequential-100", server, texts, concurrency=1,
+                                max_batch_items=100, max_batch_tokens=10 ** 9))
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            results.append(run_case(f"packed-c{concurrency}", server, texts, concurrency=concurrency,
+                                    max_batch_tokens=args.batch_tokens))
+
+    for result in results:
+        print(json.dumps(result))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Run the API against local stand-ins: a fake Milvus in this process and the
+OpenAI API at OPENAI_BASE_URL (point it at a FakeOpenAIServer).
+
+The document registry, lexical index and embedding cache are kept in a
+temporary directory, so benchmark runs never touch the real ones.
+
+Usage (from backend/; benchmarks.load starts this for you):
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 python -m benchmarks.fake_app --port 8100
+"""
+import argparse
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--milvus-latency", type=float, default=0.002, help="Fake Milvus latency per call (s)")
+    parser.add_argument("--backend", default="milvus", help="milvus (fake server) or numpy")
+    args = parser.parse_args()
+
+    # Settings are read at import time, so the environment is prepared before the app is imported
+    data_dir = tempfile.mkdtemp(prefix="legalbot-bench-")
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+    os.environ["VECTOR_STORE_BACKEND"] = args.backend
+    os.environ["MILVUS_HOST"] = "http://fake-milvus"
+    os.environ["NUMPY_STORE_PATH"] = ""
+    os.environ["DOCUMENT_REGISTRY_PATH"] = os.path.join(data_dir, "document_registry.sqlite3")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(data_dir, "embedding_cache.sqlite3")
+    os.environ["OCR_CACHE_PATH"] = os.path.join(data_dir, "ocr_cache.sqlite3")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(data_dir, "lexical_index.jsonl")
+
+    from benchmarks.fake_milvus import FakeMilvusServer
+    FakeMilvusServer(latency=args.milvus_latency).install()
+
+    import uvicorn
+    from app.main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
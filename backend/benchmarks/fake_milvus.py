@@ -0,0 +1,301 @@
+"""
+In-process stand-in for a Milvus server, for benchmarks that must not need one.
+
+FakeMilvusServer holds the collections; server.client() returns an object with
+the MilvusClient methods MilvusManager calls, each delayed by the configured
+latency. Use it through the real connection pool:
+
+    pool = MilvusConnectionPool(server.client, size=4)
+    store = MilvusManager(pool=pool)
+
+or call server.install() before the app is imported, so every MilvusClient the
+app opens talks to the fake.
+"""
+import importlib.abc
+import importlib.util
+import re
+import sys
+import threading
+import time
+import numpy as np
+
+# Matches the expressions MilvusManager.build_filter_expr produces: conditions on the primary key,
+# a scalar field or the metadata JSON, comparing with == "value" or in [values], joined with
+# and / or and grouped in parentheses
+_CONDITION = r'(?:metadata\["([^"]+)"\]|(\w+)) (?:== ("(?:[^"\\]|\\.)*")|in \[([^\]]*)\])'
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|(and|or)\b|' + _CONDITION + ')')
+_VALUE = re.compile(r'"((?:[^"\\]|\\.)*)"|(-?\d+)')
+
+
+def _condition(key: str, field: str, value: str, values: str):
+    accepted = {quoted.replace('\\"', '"').replace("\\\\", "\\") if quoted or not number else number
+                for quoted, number in _VALUE.findall(value or values)}
+    return lambda row: str(row.get("metadata", {}).get(key) if key else row.get(field)) in accepted
+
+
+def _parse_filter(expr: str):
+    """A predicate on stored rows for expr, or None for no filter"""
+    expr = (expr or "").strip()
+    if not expr:
+        return None
+    tokens, pos = [], 0
+    while pos < len(expr):
+        match = _TOKEN.match(expr, pos)
+        if match is None:
+            raise ValueError(f"Unsupported filter expression: {expr}")
+        opening, closing, operator, *condition = match.groups()
+        tokens.append(opening or closing or operator or _condition(*condition))
+        pos = match.end()
+
+    def parse(i: int, operator: str):
+        """Parse the operands joined by operator from tokens[i]; "or" binds loosest"""
+        operands = []
+        while True:
+            if operator == "and" and tokens[i] == "(":
+                operand, i = parse(i + 1, "or")
+                i += 1  # the closing parenthesis
+            elif operator == "and":
+                operand, i = tokens[i], i + 1
+            else:
+                operand, i = parse(i, "and")
+            operands.append(operand)
+            if i < len(tokens) and tokens[i] == operator:
+                i += 1
+                continue
+            combine = all if operator == "and" else any
+            return (lambda row: combine(operand(row) for operand in operands)), i
+
+    return parse(0, "or")[0]
+
+
+class _Schema:
+    def __init__(self, **kwargs):
+        self.fields = []
+
+    def add_field(self, **kwargs):
+        self.fields.append(kwargs)
+
+
+class _IndexParams:
+    def __init__(self):
+        self.indexes = []
+
+    def add_index(self, **kwargs):
+        self.indexes.append(kwargs)
+
+
+class _Collection:
+    def __init__(self, dimension: int, fields=()):
+        self.fields = list(fields)
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.rows = []
+        self.next_id = 1
+
+
+class _PatchOnImport(importlib.abc.MetaPathFinder):
+    """Calls patch(module) right after the named module is first imported"""
+
+    def __init__(self, name: str, patch):
+        self.name = name
+        self.patch = patch
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != self.name:
+            return None
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(fullname)
+        exec_module = spec.loader.exec_module
+
+        def exec_and_patch(module):
+            exec_module(module)
+            self.patch(module)
+
+        spec.loader.exec_module = exec_and_patch
+        return spec
+
+
+class FakeMilvusServer:
+    """Collections in memory with brute-force cosine search
+
+    latency is added to every call, as network round trip and server overhead,
+    and per_vector_latency to every query vector of a search.
+    """
+
+    def __init__(self, latency: float = 0.002, per_vector_latency: float = 0.0):
+        self.latency = latency
+        self.per_vector_latency = per_vector_latency
+        self.collections = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def client(self, *args, **kwargs) -> "FakeMilvusClient":
+        return FakeMilvusClient(self)
+
+    def install(self):
+        """Make pymilvus.MilvusClient (and the app's import of it) open clients of this server
+
+        If pymilvus is not imported yet, it is patched when the app first imports
+        it, so installing the fake does not move that import forward.
+        """
+        if "pymilvus" in sys.modules:
+            self._patch(sys.modules["pymilvus"])
+        else:
+            sys.meta_path.insert(0, _PatchOnImport("pymilvus", self._patch))
+
+    def _patch(self, pymilvus):
+        pymilvus.MilvusClient = self.client
+        milvus_client = sys.modules.get("app.core.milvus_client")
+        if milvus_client is not None:
+            milvus_client.MilvusClient = self.client
+
+    def _call(self, extra: float = 0.0):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency + extra)
+
+
+class FakeMilvusClient:
+    def __init__(self, server: FakeMilvusServer):
+        self.server = server
+
+    def has_collection(self, collection_name, **kwargs):
+        self.server._call()
+        return collection_name in self.server.collections
+
+    def create_schema(self, **kwargs):
+        return _Schema(**kwargs)
+
+    def prepare_index_params(self, **kwargs):
+        return _IndexParams()
+
+    def create_collection(self, collection_name, schema=None, index_params=None, dimension=1536, **kwargs):
+        self.server._call()
+        for field in getattr(schema, "fields", []):
+            if "dim" in field:
+                dimension = field["dim"]
+        with self.server._lock:
+            self.server.collections[collection_name] = _Collection(dimension, getattr(schema, "fields", []))
+
+    def drop_collection(self, collection_name, **kwargs):
+        self.server._call()
+        with self.server._lock:
+            self.server.collections.pop(collection_name, None)
+
+    def rename_collection(self, old_name, new_name, **kwargs):
+        self.server._call()
+        with self.server._lock:
+            self.server.collections[new_name] = self.server.collections.pop(old_name)
+
+    def describe_collection(self, collection_name, **kwargs):
+        self.server._call()
+        collection = self.server.collections[collection_name]
+        return {"collection_name": collection_name, "fake": True,
+                "fields": [{"name": field["field_name"]} for field in collection.fields]}
+
+    def insert(self, collection_name, data, **kwargs):
+        self.server._call()
+        with self.server._lock:
+            collection = self.server.collections[collection_name]
+            vectors = np.asarray([row["embedding"] for row in data], dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            collection.vectors = np.vstack([collection.vectors, vectors / np.where(norms == 0, 1, norms)])
+            ids = list(range(collection.next_id, collection.next_id + len(data)))
+            collection.next_id += len(data)
+            for vector_id, row in zip(ids, data):
+                collection.rows.append({**{k: v for k, v in row.items() if k != "embedding"}, "id": vector_id})
+        return {"insert_count": len(ids), "ids": ids}
+
+    def delete(self, collection_name, ids=None, **kwargs):
+        self.server._call()
+        remove = set(ids or [])
+        with self.server._lock:
+            collection = self.server.collections[collection_name]
+            keep = [i for i, row in enumerate(collection.rows) if row["id"] not in remove]
+            removed = len(collection.rows) - len(keep)
+            collection.vectors = collection.vectors[keep]
+            collection.rows = [collection.rows[i] for i in keep]
+        return {"delete_count": removed}
+
+    def search(self, collection_name, data, limit=10, filter=None, output_fields=None, **kwargs):
+        self.server._call(self.server.per_vector_latency * len(data))
+        with self.server._lock:
+            collection = self.server.collections[collection_name]
+            vectors, rows = collection.vectors, list(collection.rows)
+        positions = np.arange(len(rows))
+        matches = _parse_filter(filter)
+        if matches is not None:
+            positions = np.array([i for i, row in enumerate(rows) if matches(row)], dtype=np.int64)
+        if len(positions) == 0:
+            return [[] for _ in data]
+
+        queries = np.asarray(data, dtype=np.float32)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        scores = queries @ vectors[positions].T
+        results = []
+        for row_scores in scores:
+            top = np.argsort(-row_scores)[:limit]
+            results.append([
+                {"id": rows[positions[i]]["id"], "distance": float(row_scores[i]),
+                 "entity": {field: rows[positions[i]].get(field) for field in output_fields or []}}
+                for i in top
+            ])
+        return results
+
+    def query(self, collection_name, filter="", output_fields=None, **kwargs):
+        self.server._call()
+        collection = self.server.collections.get(collection_name)
+        if output_fields == ["count(*)"]:
+            return [{"count(*)": len(collection.rows) if collection else 0}]
+        return [dict(row) for row in (collection.rows if collection else [])]
+
+    def query_iterator(self, collection_name, batch_size=1000, output_fields=None, **kwargs):
+        return _QueryIterator(self, collection_name, batch_size, output_fields)
+
+    # Search is always exact, so index management only costs a round trip
+    def flush(self, collection_name, **kwargs):
+        self.server._call()
+
+    def create_index(self, collection_name, index_params=None, **kwargs):
+        self.server._call()
+
+    def drop_index(self, collection_name, index_name, **kwargs):
+        self.server._call()
+
+    def describe_index(self, collection_name, index_name, **kwargs):
+        self.server._call()
+        rows = len(self.server.collections[collection_name].rows)
+        return {"index_name": index_name, "state": "Finished", "total_rows": rows,
+                "indexed_rows": rows, "pending_index_rows": 0}
+
+    def load_collection(self, collection_name, **kwargs):
+        self.server._call()
+
+    def release_collection(self, collection_name, **kwargs):
+        self.server._call()
+
+    def close(self):
+        pass
+
+
+class _QueryIterator:
+    def __init__(self, client: FakeMilvusClient, collection_name: str, batch_size: int, output_fields):
+        collection = client.server.collections[collection_name]
+        self.client = client
+        self.batches = []
+        for start in range(0, len(collection.rows), batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, len(collection.rows))):
+                row = {field: collection.rows[i].get(field) for field in output_fields or []}
+                row["id"] = collection.rows[i]["id"]
+                if "embedding" in (output_fields or []):
+                    row["embedding"] = collection.vectors[i].tolist()
+                rows.append(row)
+            self.batches.append(rows)
+
+    def next(self):
+        self.client.server._call()
+        return self.batches.pop(0) if self.batches else []
+
+    def close(self):
+        pass
+
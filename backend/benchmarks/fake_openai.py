@@ -0,0 +1,209 @@
+"""
+Local stand-in for the OpenAI API, for benchmarks that must not hit the network.
+
+Point a client at it with base_url=server.base_url (or OPENAI_BASE_URL).
+"""
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+
+def fake_embedding(text: str, dimension: int) -> np.ndarray:
+    """Deterministic float32 unit vector for text, so repeated texts embed identically"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeOpenAIServer:
+    """Serves /v1/embeddings and /v1/chat/completions with configurable latency and rate limiting
+
+    latency is added to every embeddings request and per_item_latency to every
+    input text. A chat completion takes chat_latency before its first token and
+    token_latency per reply token after that, streamed as server-sent events
+    when the request asks for stream. When more than max_concurrent requests are
+    in flight, or with probability rate_limit_probability, the server answers
+    429 with a Retry-After header.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05,
+                 per_item_latency: float = 0.0, max_concurrent: int = 0,
+                 rate_limit_probability: float = 0.0, dimension: int = 1536,
+                 chat_latency: float = 0.3, token_latency: float = 0.01, reply_tokens: int = 60):
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.chat_latency = chat_latency
+        self.token_latency = token_latency
+        self.reply_tokens = reply_tokens
+        self.max_concurrent = max_concurrent
+        self.rate_limit_probability = rate_limit_probability
+        self.dimension = dimension
+        self.requests = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _admit(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            over_limit = self.max_concurrent and self.in_flight >= self.max_concurrent
+            if over_limit or random.random() < self.rate_limit_probability:
+                self.rate_limited += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def _leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _embeddings(self, body: dict) -> dict:
+        inputs = body["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        time.sleep(self.latency + self.per_item_latency * len(inputs))
+
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(text, body.get("dimensions") or self.dimension)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        tokens = sum(max(1, len(text) // 4) for text in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    def _reply_words(self, body: dict) -> list:
+        question = body["messages"][-1]["content"].rsplit("Question:", 1)[-1].split()
+        words = ["Based", "on", "the", "provided", "context,"] + question
+        return [words[i % len(words)] for i in range(self.reply_tokens)]
+
+    def _chat_completion(self, body: dict) -> dict:
+        words = self._reply_words(body)
+        time.sleep(self.chat_latency + self.token_latency * len(words))
+        prompt_tokens = sum(len(message["content"]) // 4 for message in body["messages"])
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                      "total_tokens": prompt_tokens + len(words)}
+        }
+
+    def _chat_chunks(self, body: dict):
+        """Yield the server-sent events of a streamed chat completion, sleeping as a model would"""
+        words = self._reply_words(body)
+        time.sleep(self.chat_latency)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.token_latency)
+            delta = {"content": word if i == 0 else " " + word}
+            yield self._chat_chunk(body, delta, None)
+        yield self._chat_chunk(body, {}, "stop")
+        yield "data: [DONE]\n\n"
+
+    @staticmethod
+    def _chat_chunk(body: dict, delta: dict, finish_reason) -> str:
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4-turbo"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict, headers: dict = None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, events):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for event in events:
+                    data = event.encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                if not self.path.endswith(("/embeddings", "/chat/completions")):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+
+                if not server._admit():
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                    headers={"Retry-After": "0.05"})
+                    return
+                try:
+                    if self.path.endswith("/embeddings"):
+                        self._send_json(200, server._embeddings(body))
+                    elif body.get("stream"):
+                        self._send_stream(server._chat_chunks(body))
+                    else:
+                        self._send_json(200, server._chat_completion(body))
+                finally:
+                    server._leave()
+
+        return Handler
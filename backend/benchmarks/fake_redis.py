@@ -0,0 +1,141 @@
+"""
+In-process stand-in for a Redis server, for tests and benchmarks that must not need one.
+
+FakeRedis has the redis-py methods RedisConversationStore calls, on str values
+as with decode_responses=True. Keys given an expiry disappear once it passes
+on clock, which tests can replace to move time forward. With max_keys set,
+adding a key past the limit evicts the least recently used key that has an
+expiry, as Redis does under maxmemory with the volatile-lru policy.
+
+    store = RedisConversationStore(FakeRedis(max_keys=1000), ttl=3600)
+"""
+import fnmatch
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class FakeRedis:
+    def __init__(self, max_keys: Optional[int] = None, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self.evictions = 0
+        # key -> list (a Redis list) or dict of member -> score (a sorted set), least recently used first
+        self._data: "OrderedDict[str, object]" = OrderedDict()
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> bool:
+        """Whether key exists, removing it if it has expired; caller holds the lock"""
+        expires = self._expires.get(key)
+        if expires is not None and self.clock() >= expires:
+            self._remove(key)
+        return key in self._data
+
+    def _get(self, key: str, default=None):
+        """The live value of key, marking it most recently used; caller holds the lock"""
+        if not self._live(key):
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def _set(self, key: str, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if self.max_keys is not None:
+            for victim in [k for k in self._data if k in self._expires][:max(0, len(self._data) - self.max_keys)]:
+                self._remove(victim)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> bool:
+        self._expires.pop(key, None)
+        return self._data.pop(key, None) is not None
+
+    @staticmethod
+    def _range(length: int, start: int, end: int) -> slice:
+        """Redis's inclusive, negative-from-the-end start and end as a slice"""
+        start = max(length + start, 0) if start < 0 else start
+        end = length + end if end < 0 else end
+        return slice(start, end + 1)
+
+    # Lists
+
+    def rpush(self, key: str, *values: str) -> int:
+        with self._lock:
+            items = self._get(key)
+            if items is None:
+                items = []
+                self._set(key, items)
+            items.extend(values)
+            return len(items)
+
+    def lrange(self, key: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            items = self._get(key, [])
+            return list(items[self._range(len(items), start, end)])
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self._lock:
+            items = self._get(key)
+            if items is not None:
+                items[:] = items[self._range(len(items), start, end)]
+                if not items:
+                    self._remove(key)
+            return True
+
+    # Sorted sets
+
+    def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        with self._lock:
+            members = self._get(key)
+            if members is None:
+                members = {}
+                self._set(key, members)
+            added = sum(1 for member in mapping if member not in members)
+            members.update(mapping)
+            return added
+
+    def zrem(self, key: str, *members: str) -> int:
+        with self._lock:
+            stored = self._get(key, {})
+            removed = sum(1 for member in members if stored.pop(member, None) is not None)
+            if key in self._data and not stored:
+                self._remove(key)
+            return removed
+
+    def zremrangebyscore(self, key: str, min_score, max_score) -> int:
+        low, high = float(min_score), float(max_score)
+        with self._lock:
+            stored = self._get(key, {})
+            removed = [member for member, score in stored.items() if low <= score <= high]
+            for member in removed:
+                del stored[member]
+            if key in self._data and not stored:
+                self._remove(key)
+            return len(removed)
+
+    def zcard(self, key: str) -> int:
+        with self._lock:
+            return len(self._get(key, {}))
+
+    # Keys
+
+    def expire(self, key: str, seconds: float) -> bool:
+        with self._lock:
+            if self._get(key) is None:
+                return False
+            self._expires[key] = self.clock() + seconds
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._live(key) and self._remove(key))
+
+    def scan_iter(self, match: Optional[str] = None) -> Iterator[str]:
+        with self._lock:
+            keys = [key for key in list(self._data) if self._live(key)]
+        return iter([key for key in keys if match is None or fnmatch.fnmatchcase(key, match)])
+
+    def close(self):
+        pass
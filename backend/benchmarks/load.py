@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+"""
+Concurrent load test of the API, offline by default.
+
+Starts a FakeOpenAIServer and the app (benchmarks.fake_app, with a fake
+Milvus) in a subprocess, uploads --docs synthetic contracts, then for each
+concurrency level runs that many clients for --duration seconds, each sending
+a weighted mix of requests back to back. Reports throughput and p50/p95/p99
+latency per endpoint, plus time to first token for streamed chat.
+
+Usage (from backend/):
+    python -m benchmarks.load --concurrency 1,8,32 --duration 20 --output load.json
+    python -m benchmarks.load --url http://localhost:8000 --mix search=1   # an already running server
+"""
+import argparse
+import random
+import subprocess
+import sys
+import os
+import threading
+import time
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import make_contract_pdf
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.report import summarize, write_results
+
+QUESTIONS = [
+    "What are the termination notice requirements?",
+    "Who must indemnify the other party for losses?",
+    "What does Section 2.3 say about assignment?",
+    "Is written consent required before assignment?",
+    "Which law governs the agreement?",
+    "How are confidential information obligations defined?",
+    "What warranties and representations are given?",
+    "What limits apply to liability for damages?",
+    "\"hold harmless\"",
+    "Section 4.1",
+]
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"search", "chat", "stream"}
+    if unknown:
+        raise ValueError(f"Unknown request types in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+class LoadClient(threading.Thread):
+    """Sends requests back to back until stop is set, recording (kind, seconds, ok, first token seconds)"""
+
+    def __init__(self, base_url: str, worker: int, weights: dict, stop: threading.Event,
+                 unique_queries: bool, timeout: float):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.worker = worker
+        self.kinds, self.weights = list(weights), list(weights.values())
+        self.stop = stop
+        self.unique_queries = unique_queries
+        self.timeout = timeout
+        self.samples = []
+        self.rng = random.Random(worker)
+
+    def _question(self, sent: int) -> str:
+        question = self.rng.choice(QUESTIONS)
+        # A unique suffix defeats the retrieval and answer caches
+        return f"{question} (client {self.worker} request {sent})" if self.unique_queries else question
+
+    def run(self):
+        sent = 0
+        with httpx.Client(base_url=self.base_url, timeout=self.timeout) as client:
+            while not self.stop.is_set():
+                kind = self.rng.choices(self.kinds, self.weights)[0]
+                question = self._question(sent)
+                sent += 1
+                first_token = None
+                start = time.perf_counter()
+                try:
+                    if kind == "search":
+                        ok = client.post("/v1/api/search", json={"query": question}).status_code == 200
+                    elif kind == "chat":
+                        response = client.post("/v1/api/chat", json={"message": question,
+                                                                     "session_id": f"load-{self.worker}"})
+                        ok = response.status_code == 200 and not response.json()["reply"].startswith("Error")
+                    else:
+                        ok = False
+                        with client.stream("POST", "/v1/api/chat/stream",
+                                           json={"message": question, "session_id": f"load-{self.worker}"}) as response:
+                            for line in response.iter_lines():
+                                if first_token is None and line == "event: token":
+                                    first_token = time.perf_counter() - start
+                                elif line == "event: done":
+                                    ok = True
+                except httpx.HTTPError:
+                    ok = False
+                self.samples.append((kind, time.perf_counter() - start, ok, first_token))
+
+
+def seed_documents(base_url: str, docs: int, size_kb: float, timeout: float = 300.0):
+    """Upload synthetic contracts and wait until they are indexed"""
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        job_ids = []
+        for i in range(docs):
+            response = client.post("/v1/api/uploadfile", files={
+                "file": (f"contract-{i}.pdf", make_contract_pdf(size_kb, seed=i), "application/pdf")
+            })
+            response.raise_for_status()
+            job_ids.append(response.json()["job_id"])
+        deadline = time.monotonic() + timeout
+        for job_id in job_ids:
+            while True:
+                status = client.get(f"/v1/api/jobs/{job_id}").json()["status"]
+                if status in ("completed", "failed"):
+                    break
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Document job {job_id} did not finish within {timeout}s")
+                time.sleep(0.1)
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("The app exited during startup")
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{base_url} was not ready after {timeout}s")
+
+
+def run_level(base_url: str, concurrency: int, duration: float, weights: dict,
+              unique_queries: bool, timeout: float) -> dict:
+    stop = threading.Event()
+    clients = [LoadClient(base_url, worker, weights, stop, unique_queries, timeout) for worker in range(concurrency)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    time.sleep(duration)
+    stop.set()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    samples = [sample for client in clients for sample in client.samples]
+    ok = [sample for sample in samples if sample[2]]
+    result = {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "throughput_rps": round(len(ok) / elapsed, 2),
+        "latency": summarize([seconds for _, seconds, _, _ in ok]),
+        "endpoints": {}
+    }
+    for kind in weights:
+        kind_samples = [sample for sample in samples if sample[0] == kind]
+        kind_ok = [seconds for _, seconds, passed, _ in kind_samples if passed]
+        result["endpoints"][kind] = dict(summarize(kind_ok), errors=len(kind_samples) - len(kind_ok),
+                                         throughput_rps=round(len(kind_ok) / elapsed, 2))
+    first_tokens = [first_token for kind, _, passed, first_token in ok if kind == "stream" and first_token]
+    if first_tokens:
+        result["endpoints"]["stream"]["time_to_first_token"] = summarize(first_tokens)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Load an already running server instead of starting one with fakes")
+    parser.add_argument("--port", type=int, default=8100, help="Port for the app started with fakes")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--mix", default="search=3,chat=1,stream=1", help="Request types and their weights")
+    parser.add_argument("--unique-queries", action="store_true", help="Make every query unique to bypass caches")
+    parser.add_argument("--docs", type=int, default=5, help="Synthetic contracts uploaded first (0 = none)")
+    parser.add_argument("--doc-kb", type=float, default=64)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Fake OpenAI embeddings latency (s)")
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Fake OpenAI time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Fake OpenAI seconds per reply token")
+    parser.add_argument("--milvus-latency", type=float, default=0.002, help="Fake Milvus latency per call (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request (s)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+
+    fake_openai, process = None, None
+    base_url = args.url
+    try:
+        if base_url is None:
+            fake_openai = FakeOpenAIServer(latency=args.embed_latency, chat_latency=args.chat_latency,
+                                           token_latency=args.token_latency).start()
+            base_url = f"http://127.0.0.1:{args.port}"
+            process = subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.fake_app", "--port", str(args.port),
+                 "--milvus-latency", str(args.milvus_latency)],
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                env=dict(os.environ, OPENAI_BASE_URL=fake_openai.base_url)
+            )
+        wait_ready(base_url, process)
+        if args.docs:
+            seed_documents(base_url, args.docs, args.doc_kb)
+
+        results = [run_level(base_url, int(concurrency), args.duration, weights, args.unique_queries, args.timeout)
+                   for concurrency in args.concurrency.split(",")]
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if fake_openai is not None:
+            fake_openai.stop()
+
+    write_results(results, args.output, "load", vars(args))
+
+
+if __name__ == "__main__":
+    main()
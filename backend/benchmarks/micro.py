@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks for the CPU-bound steps of ingestion and chat.
+
+    split_text        DocumentProcessor._split_text on one long text
+    process_pdf       DocumentProcessor.process_pdf on a synthetic contract PDF
+    context-*         chat context assembly for top_k retrieved chunks:
+                      the original one-block-per-chunk join against ContextBuilder
+
+No network is used. Each case runs --repeat times after one warm-up run.
+
+Usage (from backend/):
+    python -m benchmarks.micro --text-kb 512 --pdf-pages 50 --output micro.json
+"""
+import argparse
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.features.chat_pdf.document_processor import DocumentProcessor
+from app.features.chat_pdf.context_builder import ContextBuilder
+from benchmarks.chunker import make_pages
+from benchmarks.corpus import make_pdf
+from benchmarks.report import summarize, write_results
+
+
+def measure(fn, repeat: int) -> list:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def case(name: str, samples: list, **extra) -> dict:
+    result = {"case": name}
+    result.update(summarize(samples))
+    result["ops_per_second"] = round(len(samples) / sum(samples), 2) if sum(samples) else 0.0
+    result.update(extra)
+    return result
+
+
+def retrieved_chunks(processor: DocumentProcessor, top_k: int) -> list:
+    """top_k chunks as retrieval returns them: runs of neighbours from two documents, scored"""
+    chunks = processor._chunk_pages(list(enumerate(make_pages(0.25), start=1)), "contract.pdf", "pdf")
+    picked = []
+    for start in (3, 40):
+        for chunk in chunks[start:start + (top_k + 1) // 2]:
+            picked.append({
+                "text": chunk["text"],
+                "metadata": dict(chunk["metadata"], filename=f"contract-{start}.pdf", doc_hash=str(start)),
+                "score": 1.0 - 0.01 * len(picked)
+            })
+    return picked[:top_k]
+
+
+def legacy_context(chunks: list) -> str:
+    """The original context: every chunk on its own, in retrieval order"""
+    return "\n\n".join(ContextBuilder.format_chunk(chunk) for chunk in chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--text-kb", type=int, default=512, help="Size of the text split by split_text")
+    parser.add_argument("--pdf-pages", type=int, default=50)
+    parser.add_argument("--extract-workers", type=int, default=1, help="PDF_EXTRACT_WORKERS for process_pdf")
+    parser.add_argument("--top-k", default="5,20")
+    parser.add_argument("--context-tokens", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    processor = DocumentProcessor(extract_workers=args.extract_workers)
+    results = []
+    try:
+        text = "\n\n".join(make_pages(args.text_kb / 1024))
+        samples = measure(lambda: processor._split_text(text), args.repeat)
+        results.append(case("split_text", samples, size_kb=args.text_kb,
+                            mb_per_second=round(len(text) / 1024 / 1024 / (sum(samples) / len(samples)), 2)))
+
+        pages = make_pages(args.pdf_pages * 4000 / 1024 / 1024)[:args.pdf_pages]
+        pdf = make_pdf(pages)
+        samples = measure(lambda: processor.process_pdf(file_bytes=pdf), args.repeat)
+        results.append(case("process_pdf", samples, pages=len(pages), pdf_kb=len(pdf) // 1024,
+                            pages_per_second=round(len(pages) / (sum(samples) / len(samples)), 1)))
+
+        builder = ContextBuilder(args.context_tokens)
+        for top_k in [int(k) for k in args.top_k.split(",")]:
+            chunks = retrieved_chunks(processor, top_k)
+            legacy_tokens = builder.count_tokens(legacy_context(chunks))
+            results.append(case(f"context-legacy-k{top_k}", measure(lambda: legacy_context(chunks), args.repeat),
+                                prompt_tokens=legacy_tokens))
+            built = builder.build(chunks)
+            results.append(case(f"context-builder-k{top_k}", measure(lambda: builder.build(chunks), args.repeat),
+                                prompt_tokens=built["tokens"], prompt_tokens_saved=built["tokens_saved"],
+                                passages=built["passages"]))
+    finally:
+        processor.close()
+
+    write_results(results, args.output, "micro", vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Latency summaries and JSON output shared by the benchmarks"""
+import json
+import math
+import platform
+import time
+from typing import Dict, List, Optional
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Count, mean, min, p50, p95, p99 and max of durations in seconds, in milliseconds"""
+    ordered = sorted(samples)
+    to_ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "count": len(ordered),
+        "mean_ms": to_ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "min_ms": to_ms(ordered[0]) if ordered else 0.0,
+        "p50_ms": to_ms(percentile(ordered, 50)),
+        "p95_ms": to_ms(percentile(ordered, 95)),
+        "p99_ms": to_ms(percentile(ordered, 99)),
+        "max_ms": to_ms(ordered[-1]) if ordered else 0.0
+    }
+
+
+def write_results(results: List[dict], path: Optional[str], benchmark: str, config: dict):
+    """Print one JSON line per result and, with a path, save them with the run's configuration"""
+    for result in results:
+        print(json.dumps(result))
+    if path:
+        with open(path, "w") as f:
+            json.dump({
+                "benchmark": benchmark,
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "config": config,
+                "results": results
+            }, f, indent=2)
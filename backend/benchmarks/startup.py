@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Cold start of the API: import-time profile and time to first /health and /ready.
+
+The import profile runs `python -X importtime -c "import app.main"` in a fresh
+interpreter and reports the total, the slowest modules by cumulative time and
+which heavy libraries (document parsing, OCR, the OpenAI and Milvus SDKs) the
+import pulled in; none of them should be there.
+
+Each startup run launches the app (benchmarks.fake_app: a fake Milvus in the
+app process, a FakeOpenAIServer here) and polls it, timing from process start
+to the first 200 from /health, and then from /ready, which waits for the
+engine. The process exits with status 1 when the median time to /health
+misses --target-health-ms.
+
+Usage (from backend/):
+    python -m benchmarks.startup --runs 5 --output startup.json
+    python -m benchmarks.startup --runs 0 --top 40    # import profile only
+"""
+import argparse
+import json
+import subprocess
+import sys
+import os
+import time
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.report import summarize, write_results
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed once a document is parsed or the engine is built
+HEAVY_MODULES = ["openai", "pymilvus", "PyPDF2", "pdf2image", "pytesseract", "PIL", "pandas", "numpy", "tiktoken"]
+
+
+def parse_importtime(stderr: str) -> list:
+    """(module, self_us, cumulative_us, depth) for each line of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def import_profile(env: dict, top: int) -> dict:
+    check = f"import app.main, json, sys; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", check], cwd=BACKEND_DIR, env=env,
+                               capture_output=True, text=True, check=True)
+    rows = parse_importtime(completed.stderr)
+    total = next(cumulative for name, _, cumulative, depth in rows if name == "app.main")
+    slowest = sorted(rows, key=lambda row: row[2], reverse=True)[:top]
+    return {
+        "case": "import app.main",
+        "import_ms": round(total / 1000, 1),
+        "heavy_modules_loaded": json.loads(completed.stdout.strip().splitlines()[-1]),
+        "slowest_modules_ms": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1),
+                                "self_ms": round(self_us / 1000, 1), "depth": depth}
+                               for name, self_us, cumulative, depth in slowest]
+    }
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float, interval: float) -> float:
+    """Poll url until it answers 200, returning time.perf_counter() when it did"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The app exited during startup")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(interval)
+    raise TimeoutError(f"{url} did not answer 200 within {timeout}s")
+
+
+def startup_run(port: int, env: dict, args) -> tuple:
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_app", "--port", str(port),
+         "--milvus-latency", str(args.milvus_latency)],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        health = wait_for(f"http://127.0.0.1:{port}/health", process, args.timeout, args.poll_interval)
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", process, args.timeout, args.poll_interval)
+        return health - start, ready - start
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Startup runs (0 = import profile only)")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to report")
+    parser.add_argument("--target-health-ms", type=float, default=1500.0,
+                        help="Median time from process start to the first /health response to stay under")
+    parser.add_argument("--milvus-latency", type=float, default=0.002, help="Fake Milvus latency per call (s)")
+    parser.add_argument("--poll-interval", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "fake-key"), LOG_LEVEL="WARNING")
+    results = [import_profile(env, args.top)]
+
+    if args.runs:
+        with FakeOpenAIServer() as fake_openai:
+            env["OPENAI_BASE_URL"] = fake_openai.base_url
+            samples = [startup_run(args.port, env, args) for _ in range(args.runs)]
+        health = summarize([health for health, _ in samples])
+        results.append({"case": "time_to_health", **health,
+                        "target_ms": args.target_health_ms, "meets_target": health["p50_ms"] <= args.target_health_ms})
+        results.append({"case": "time_to_ready", **summarize([ready for _, ready in samples])})
+
+    write_results(results, args.output, "startup", vars(args))
+    if args.runs and not results[1]["meets_target"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
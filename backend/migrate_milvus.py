@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Upgrade a Milvus collection created before scalar filter fields existed
+
+    python migrate_milvus.py
+    python migrate_milvus.py --batch-size 2000
+
+Copies every row into a collection with typed, indexed doc_id, filename,
+doc_type and matter fields (matter being the partition key), then swaps it in
+place of the old one. Copied rows get new ids, so the document registry is
+pointed at them and the lexical index is rebuilt as the copy proceeds.
+
+Stop the API and any bulk ingestion first: writes made during the copy would
+be lost. An interrupted run can simply be started again.
+
+    python migrate_milvus.py --rebuild-index
+
+Instead replaces the embedding index with the one MILVUS_INDEX_TYPE and
+MILVUS_INDEX_PARAMS describe. Searches fail until the new index is loaded.
+"""
+import argparse
+import json
+import logging
+import sys
+import os
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.core.clients import create_service_clients
+from app.features.chat_pdf.rag_engine import RAGEngine
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows copied per batch")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Rebuild the embedding index with the configured type and params instead")
+    args = parser.parse_args()
+    logging.basicConfig(level=settings.LOG_LEVEL, format="%(message)s")
+
+    if settings.VECTOR_STORE_BACKEND.lower() != "milvus":
+        parser.error("VECTOR_STORE_BACKEND is not milvus; there is nothing to migrate")
+
+    clients = create_service_clients()
+    rag_engine = RAGEngine(clients=clients)
+    try:
+        if args.rebuild_index:
+            result = rag_engine.vector_store.rebuild_index()
+        else:
+            registry, lexical_index = rag_engine.document_registry, rag_engine.lexical_index
+
+            def on_batch(ids, texts, metadata_list):
+                registry.set_vector_ids({metadata["chunk_hash"]: vector_id
+                                         for metadata, vector_id in zip(metadata_list, ids) if "chunk_hash" in metadata})
+                lexical_index.add_many(ids, texts, metadata_list)
+
+            if not rag_engine.vector_store.scalar_fields:
+                lexical_index.clear()
+            result = rag_engine.vector_store.migrate_collection(args.batch_size, on_batch=on_batch)
+            rag_engine._bump_generation()
+        print(json.dumps(result, indent=2))
+    finally:
+        rag_engine.close()
+        clients.close()
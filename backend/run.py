@@ -1,7 +1,21 @@
 #!/usr/bin/env python
 """
 Run script for LegalBot backend
+
+Development (single process, auto-reload):
+    python run.py --reload
+
+Multi-worker mode (one process per worker, for multi-core hosts):
+    python run.py --workers 4        # or WEB_WORKERS=4 python run.py
+
+Each worker builds its own engine, OpenAI connection pools and Milvus
+connection pool in the app lifespan, so budget OPENAI_MAX_CONNECTIONS and
+MILVUS_POOL_SIZE per worker. Workers share the document registry, embedding
+cache, lexical index and ingestion job status through their files on disk;
+use the Milvus vector store backend, since the NumPy store is private to each
+process.
 """
+import argparse
 import sys
 import os
 
@@ -9,7 +23,28 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import uvicorn
-from app.main import app
+from app.core.config import settings
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS)
+    parser.add_argument("--reload", action="store_true", help="Reload on code changes (single worker only)")
+    args = parser.parse_args()
+
+    if args.reload and args.workers > 1:
+        parser.error("--reload cannot be combined with more than one worker")
+    if args.workers > 1 and settings.VECTOR_STORE_BACKEND.lower() == "numpy":
+        print("Warning: the NumPy vector store is not shared between workers; use VECTOR_STORE_BACKEND=milvus")
+    if args.workers > 1 and not settings.DOCUMENT_REGISTRY_PATH:
+        print("Warning: an in-memory document registry is not shared between workers, so documents and "
+              "ingestion jobs are only visible to the worker that indexed them; set DOCUMENT_REGISTRY_PATH")
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        reload=args.reload
+    )
@@ -10,6 +10,10 @@ def test_health():
     response = requests.get(f"{BASE_URL}/health")
     print(f"Health Check: {response.status_code} - {response.json()}")
 
+def test_ready():
+    response = requests.get(f"{BASE_URL}/ready")
+    print(f"Readiness Check: {response.status_code} - {response.json()}")
+
 def test_v1():
     response = requests.get(f"{BASE_URL}/v1")
     print(f"V1 Info: {response.status_code} - {response.json()}")
@@ -28,6 +32,7 @@ if __name__ == "__main__":
     print("-" * 50)
     
     test_health()
+    test_ready()
     test_v1()
     test_stats()
     test_chat()
\ No newline at end of file
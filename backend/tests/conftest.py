@@ -0,0 +1,42 @@
+"""
+The tests run offline: NumPy vector store, in-memory registry, caches and lexical
+index, and a local fake OpenAI server (benchmarks.fake_openai).
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time, so the environment is prepared before the app is imported
+os.environ.update(
+    OPENAI_API_KEY="fake-key",
+    VECTOR_STORE_BACKEND="numpy",
+    NUMPY_STORE_PATH="",
+    DOCUMENT_REGISTRY_PATH="",
+    EMBEDDING_CACHE_PATH="",
+    OCR_CACHE_PATH="",
+    LEXICAL_INDEX_PATH="",
+    EMBEDDING_MODEL="text-embedding-3-small",
+    EMBEDDING_DIMENSION="64",
+    CHUNK_TOKENS="40",
+    CHUNK_OVERLAP_TOKENS="0",
+    PDF_EXTRACT_WORKERS="1",
+)
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+@pytest.fixture(scope="session")
+def fake_openai():
+    with FakeOpenAIServer(latency=0.0, chat_latency=0.0, token_latency=0.0) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        yield server
+
+
+@pytest.fixture
+def rag_engine(fake_openai):
+    from app.features.chat_pdf.rag_engine import RAGEngine
+    engine = RAGEngine()
+    yield engine
+    engine.close()
@@ -0,0 +1,51 @@
+import pytest
+from benchmarks.corpus import make_pdf
+from tests.test_deduplication import clause
+
+
+@pytest.fixture
+def source(tmp_path):
+    """a.pdf, then b.pdf whose chunks are all a.pdf's, so B borrows every chunk A embeds"""
+    documents = tmp_path / "documents"
+    documents.mkdir()
+    (documents / "a.pdf").write_bytes(make_pdf([clause(1), clause(2)]))
+    (documents / "b.pdf").write_bytes(make_pdf([clause(1)]))
+    return documents
+
+
+def make_ingester(rag_engine, tmp_path):
+    from app.features.chat_pdf.bulk_ingest import BulkIngester
+    # One extract worker keeps a.pdf ahead of b.pdf; the long flush interval holds A's chunks in the buffer
+    return BulkIngester(rag_engine, str(tmp_path / "manifest.jsonl"), extract_workers=1, flush_interval=60.0)
+
+
+def test_borrowing_document_waits_for_the_chunks_it_shares(rag_engine, source, tmp_path):
+    ingester = make_ingester(rag_engine, tmp_path)
+    finish = ingester._finish
+    stored_when_indexed = {}
+
+    def record(document, status, error=None):
+        if status == "indexed":
+            known = rag_engine.document_registry.known_chunks(document.chunk_hashes)
+            stored_when_indexed[document.name] = all(chunk_hash in known for chunk_hash in document.chunk_hashes)
+        finish(document, status, error)
+
+    ingester._finish = record
+    summary = ingester.run(str(source))
+
+    assert summary["indexed"] == 2
+    assert stored_when_indexed == {"a.pdf": True, "b.pdf": True}
+    assert ingester.manifest.entries["b.pdf"]["new_chunks"] == 0
+
+
+def test_borrowing_document_fails_with_the_owner(rag_engine, source, tmp_path, monkeypatch):
+    def fail(texts):
+        raise RuntimeError("embedding service unavailable")
+
+    monkeypatch.setattr(rag_engine.embedding_generator, "generate_embeddings", fail)
+    ingester = make_ingester(rag_engine, tmp_path)
+    summary = ingester.run(str(source))
+
+    assert summary["failed"] == 2
+    assert {entry["status"] for entry in ingester.manifest.entries.values()} == {"failed"}
+    assert rag_engine.document_registry.counts() == {"documents": 0, "chunks": 0}
@@ -0,0 +1,38 @@
+import json
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(fake_openai):
+    from app.main import app
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 30
+        while client.get("/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        yield client
+
+
+def test_chats_without_a_session_id_get_conversations_of_their_own(client):
+    first = client.post("/v1/api/chat", json={"message": "What is the notice period?"}).json()
+    second = client.post("/v1/api/chat", json={"message": "Who pays the rent?"}).json()
+    assert first["session_id"] and second["session_id"]
+    assert first["session_id"] != second["session_id"]
+
+    store = client.app.state.conversation_store
+    assert [m["content"] for m in store.get_history(second["session_id"])] == ["Who pays the rent?", second["reply"]]
+
+    again = client.post("/v1/api/chat", json={"message": "And for the landlord?",
+                                               "session_id": first["session_id"]}).json()
+    assert again["session_id"] == first["session_id"]
+    assert len(store.get_history(first["session_id"])) == 4
+
+
+def test_stream_sends_the_new_session_id_first(client):
+    with client.stream("POST", "/v1/api/chat/stream", json={"message": "What is the notice period?"}) as response:
+        events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+    assert events[0]["event"] == "session"
+    assert events[-1]["event"] == "done"
+    history = client.app.state.conversation_store.get_history(events[0]["session_id"])
+    assert [m["content"] for m in history] == ["What is the notice period?", events[-1]["reply"]]
@@ -0,0 +1,61 @@
+from app.features.chat_pdf.chunker import TokenChunker
+
+
+def words(text: str) -> int:
+    """One token per word, so token budgets can be checked by eye"""
+    return len(text.split())
+
+
+def sentence(n: int, length: int) -> str:
+    return " ".join(f"s{n}w{i}" for i in range(length - 1)) + f" s{n}end."
+
+
+def test_last_sentences_are_repeated_as_overlap():
+    chunker = TokenChunker(max_tokens=40, overlap_tokens=12, token_counter=words)
+    text = " ".join(sentence(n, 10) for n in range(8))
+    chunks = list(chunker.chunk_text(text))
+
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last_sentence = previous["text"].rsplit(". ", 1)[-1]
+        assert chunk["text"].startswith(last_sentence)
+    for chunk in chunks:
+        assert words(chunk["text"]) <= 40
+
+
+def test_sentence_longer_than_the_overlap_carries_its_last_words():
+    chunker = TokenChunker(max_tokens=120, overlap_tokens=32, token_counter=words)
+    text = " ".join(sentence(n, 40) for n in range(6))
+    chunks = list(chunker.chunk_text(text))
+
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        previous_words, chunk_words = previous["text"].split(), chunk["text"].split()
+        overlap = next(n for n in range(len(previous_words), -1, -1)
+                       if previous_words[len(previous_words) - n:] == chunk_words[:n])
+        assert 0 < overlap < 32
+        assert words(chunk["text"]) <= 120
+
+
+def test_chunks_record_pages_and_character_offsets():
+    # Three ten-word sentences fit a chunk, each with one token for its separator
+    chunker = TokenChunker(max_tokens=35, overlap_tokens=0, token_counter=words)
+    pages = [(1, sentence(1, 10) + "  " + sentence(2, 10)), (2, sentence(3, 10) + "\n\n" + sentence(4, 10))]
+    first, last = chunker.chunk_pages(pages)
+
+    assert (first["page"], first["page_end"], last["page"], last["page_end"]) == (1, 2, 2, 2)
+    # A new page starts a new paragraph
+    assert first["text"] == sentence(1, 10) + " " + sentence(2, 10) + "\n\n" + sentence(3, 10)
+    assert first["char_start"] == 0
+    assert pages[1][1][:first["char_end"]] == sentence(3, 10)
+    assert pages[1][1][last["char_start"]:last["char_end"]] == last["text"] == sentence(4, 10)
+
+
+def test_oversized_sentence_is_split_at_word_boundaries():
+    chunker = TokenChunker(max_tokens=50, overlap_tokens=0, token_counter=words)
+    text = sentence(1, 300)
+    chunks = list(chunker.chunk_text(text))
+
+    assert len(chunks) >= 6
+    assert all(words(chunk["text"]) <= 50 for chunk in chunks)
+    assert " ".join(chunk["text"] for chunk in chunks) == text
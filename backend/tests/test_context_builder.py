@@ -0,0 +1,51 @@
+from app.features.chat_pdf.context_builder import ContextBuilder
+
+
+def words(text: str) -> int:
+    return len(text.split())
+
+
+def chunk(doc_id: str, index: int, text: str, score: float) -> dict:
+    return {"text": text, "score": score,
+            "metadata": {"doc_id": doc_id, "filename": f"{doc_id}.pdf", "chunk_index": index}}
+
+
+FIRST = "The supplier shall indemnify the customer against third party claims arising from breach."
+# The chunker repeats the end of chunk 0 at the start of chunk 1
+SECOND = "third party claims arising from breach. Liability is capped at the fees paid."
+
+
+def test_adjacent_chunks_are_merged_with_their_overlap_kept_once():
+    builder = ContextBuilder(max_tokens=1000, token_counter=words)
+    built = builder.build([chunk("A", 1, SECOND, 0.9), chunk("B", 0, "Governing law is New York.", 0.5),
+                           chunk("A", 0, FIRST, 0.8)])
+
+    assert built["chunks_used"] == 3
+    assert built["passages"] == 2
+    merged = "The supplier shall indemnify the customer against third party claims arising from breach. " \
+             "Liability is capped at the fees paid."
+    assert built["context"] == ("[Source: A.pdf - Chunks 0-1]\n" + merged + "\n\n"
+                                "[Source: B.pdf - Chunk 0]\nGoverning law is New York.")
+    assert built["context"].count("third party claims") == 1
+    assert built["tokens_saved"] > 0
+
+
+def test_chunks_that_do_not_fit_the_budget_are_skipped_for_smaller_ones():
+    long_text = " ".join(["clause"] * 40)
+    builder = ContextBuilder(max_tokens=30, token_counter=words)
+    built = builder.build([chunk("A", 0, FIRST, 0.9), chunk("C", 0, long_text, 0.8),
+                           chunk("A", 1, SECOND, 0.7)])
+
+    # The long chunk is over the budget; the lower-scored neighbour of the first chunk still fits
+    assert built["chunks_used"] == 2
+    assert built["passages"] == 1
+    assert "clause clause" not in built["context"]
+    assert built["tokens"] <= 30
+
+
+def test_chunks_of_different_documents_or_gaps_are_not_merged():
+    builder = ContextBuilder(max_tokens=1000, token_counter=words)
+    built = builder.build([chunk("A", 0, FIRST, 0.9), chunk("B", 1, SECOND, 0.8), chunk("A", 2, SECOND, 0.7)])
+
+    assert built["passages"] == 3
+    assert built["tokens_saved"] == 0
@@ -0,0 +1,99 @@
+import types
+import pytest
+from benchmarks.fake_redis import FakeRedis
+from app.features.chat_pdf import conversation_store
+from app.features.chat_pdf.conversation_store import (
+    InMemoryConversationStore, RedisConversationStore, message_tokens
+)
+
+BACKENDS = ["memory", "redis"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(conversation_store, "time", types.SimpleNamespace(time=clock, monotonic=clock))
+    return clock
+
+
+def make_store(backend: str, clock: Clock, max_tokens: int = 2000, ttl=None, max_sessions=None):
+    if backend == "memory":
+        return InMemoryConversationStore(max_tokens=max_tokens, max_sessions=max_sessions or 10000, ttl=ttl)
+    # Every session is a key of its own, next to the session index
+    client = FakeRedis(max_keys=max_sessions + 1 if max_sessions else None, clock=clock)
+    return RedisConversationStore(client, max_tokens=max_tokens, ttl=ttl)
+
+
+def turn(n: int):
+    return [{"role": "user", "content": f"Question {n} about the termination notice period?"},
+            {"role": "assistant", "content": f"Answer {n}: the notice period is thirty days."}]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_history_is_trimmed_to_the_token_budget(backend, clock):
+    messages = turn(1) + turn(2) + turn(3)
+    # Room for the last three messages, so the oldest kept one would be an assistant reply
+    budget = sum(message_tokens(m) for m in messages[-3:])
+    store = make_store(backend, clock, max_tokens=budget)
+    for n in range(1, 4):
+        store.append("s", turn(n))
+
+    assert store.get_history("s") == turn(3)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_history_over_the_budget_alone_is_dropped(backend, clock):
+    store = make_store(backend, clock, max_tokens=1)
+    store.append("s", turn(1))
+
+    assert store.get_history("s") == []
+    assert store.stats()["sessions"] == 0
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_sessions_expire_after_the_ttl_without_use(backend, clock):
+    store = make_store(backend, clock, ttl=60)
+    store.append("a", turn(1))
+    store.append("b", turn(1))
+    clock.now += 30
+    assert store.get_history("a") == turn(1)
+    clock.now += 45
+
+    assert store.get_history("a") == turn(1)
+    assert store.get_history("b") == []
+    assert store.stats()["sessions"] == 1
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_least_recently_used_session_is_evicted(backend, clock):
+    store = make_store(backend, clock, ttl=3600, max_sessions=2)
+    store.append("a", turn(1))
+    store.append("b", turn(1))
+    clock.now += 1
+    store.get_history("a")
+    store.append("c", turn(1))
+
+    assert store.get_history("b") == []
+    assert store.get_history("a") == turn(1)
+    assert store.get_history("c") == turn(1)
+
+
+def test_redis_stats_count_sessions_without_scanning(clock):
+    store = make_store("redis", clock)
+    store.append("a", turn(1))
+    store.append("b", turn(1))
+    store.delete("a")
+
+    def scan_iter(match=None):
+        raise AssertionError("stats() scanned the keyspace")
+
+    store.client.scan_iter = scan_iter
+    assert store.stats() == {"backend": "redis", "sessions": 1}
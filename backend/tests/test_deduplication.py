@@ -0,0 +1,111 @@
+import pytest
+from benchmarks.corpus import make_pdf
+
+
+def clause(n: int) -> str:
+    return " ".join(f"Clause {n} item {i} governs the termination notice period." for i in range(14))
+
+
+@pytest.fixture
+def shared_documents(rag_engine):
+    """A.pdf, and B.pdf with all of A's text plus an appendix, so B stores only its appendix"""
+    a = rag_engine.upload_and_index_document(file_bytes=make_pdf([clause(1), clause(2)]), file_type="pdf",
+                                             filename="a.pdf", doc_id="A")
+    b = rag_engine.upload_and_index_document(file_bytes=make_pdf([clause(1), clause(2), clause(3)]),
+                                             file_type="pdf", filename="b.pdf", doc_id="B")
+    assert a["new_chunks"] == a["chunks_count"]
+    assert b["deduplicated_chunks"] == a["chunks_count"]
+    return a, b
+
+
+@pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+@pytest.mark.parametrize("conditions", [{"doc_id": "B"}, {"filename": "b.pdf"}])
+def test_document_filters_include_shared_chunks(rag_engine, shared_documents, mode, conditions):
+    _, b = shared_documents
+    results = rag_engine.search_similar_chunks("termination notice", top_k=100,
+                                               filter_conditions=conditions, mode=mode)
+    assert {result["metadata"]["doc_id"] for result in results} == {"B"}
+    assert {result["metadata"]["filename"] for result in results} == {"b.pdf"}
+    # Every chunk of B contains the query terms, including the ones stored by A
+    assert len(results) == b["chunks_count"]
+
+
+def test_deleted_document_is_not_reported(rag_engine, shared_documents):
+    assert rag_engine.delete_document("A")["removed_chunks"] == 0
+
+    results = rag_engine.search_similar_chunks("termination notice", top_k=100, mode="vector")
+    assert {result["metadata"]["doc_id"] for result in results} == {"B"}
+    assert {result["metadata"]["filename"] for result in results} == {"b.pdf"}
+    assert rag_engine.search_similar_chunks("termination notice", top_k=100,
+                                            filter_conditions={"doc_id": "A"}) == []
+
+
+def test_failed_vector_delete_keeps_the_document_for_a_retry(rag_engine, shared_documents, monkeypatch):
+    _, b = shared_documents
+    delete = rag_engine.vector_store.delete
+
+    def fail(ids):
+        raise RuntimeError("vector store unavailable")
+
+    monkeypatch.setattr(rag_engine.vector_store, "delete", fail)
+    assert rag_engine.delete_document("B")["success"] is False
+    assert rag_engine.document_registry.get_document("B") is not None
+    assert rag_engine.document_registry.counts()["documents"] == 2
+
+    monkeypatch.setattr(rag_engine.vector_store, "delete", delete)
+    result = rag_engine.delete_document("B")
+    assert result["removed_chunks"] == b["new_chunks"]
+    assert rag_engine.document_registry.get_document("B") is None
+    stored = rag_engine.vector_store.get_collection_stats()["document_count"]
+    assert stored == rag_engine.document_registry.counts()["chunks"]
+
+
+def test_concurrent_writer_copies_of_shared_chunks_are_deleted(rag_engine, monkeypatch):
+    """B checks its chunks before A records them, as when both are indexed at once"""
+    a = rag_engine.upload_and_index_document(file_bytes=make_pdf([clause(1), clause(2)]), file_type="pdf",
+                                             filename="a.pdf", doc_id="A")
+    monkeypatch.setattr(rag_engine.document_registry, "known_chunks", lambda chunk_hashes: {})
+    b = rag_engine.upload_and_index_document(file_bytes=make_pdf([clause(1), clause(2), clause(3)]),
+                                             file_type="pdf", filename="b.pdf", doc_id="B")
+
+    assert b["deduplicated_chunks"] == a["chunks_count"]
+    stored = rag_engine.document_registry.counts()["chunks"]
+    assert stored == a["new_chunks"] + b["new_chunks"]
+    assert rag_engine.vector_store.get_collection_stats()["document_count"] == stored
+    results = rag_engine.search_similar_chunks("termination notice", top_k=100, mode="hybrid")
+    assert len(results) == len({result["text"] for result in results}) == stored
+
+
+def test_document_filter_on_a_large_document_stays_a_scalar_expression(rag_engine, shared_documents):
+    from app.core.milvus_client import MilvusManager
+
+    big = rag_engine.upload_and_index_document(file_bytes=make_pdf([clause(n) for n in range(10, 60)]),
+                                               file_type="pdf", filename="big.pdf", doc_id="BIG")
+    a, _ = shared_documents
+    scalar_fields = {"doc_id": "doc_id", "filename": "filename"}
+
+    search = rag_engine._start_search(["notice"], 5, [{"doc_id": "BIG"}], "vector", 0)
+    rag_engine._resolve_document_filters(search)
+    assert big["chunks_count"] > 100
+    assert MilvusManager.build_filter_expr(search.filters[0], scalar_fields) == 'doc_id == "BIG"'
+
+    # B only adds the ids of the chunks A stored for it
+    search = rag_engine._start_search(["notice"], 5, [{"doc_id": "B", "matter": "m"}], "vector", 0)
+    rag_engine._resolve_document_filters(search)
+    borrowed = search.filters[0]["any_of"][1]["id"]
+    assert len(borrowed) == a["chunks_count"]
+    assert MilvusManager.build_filter_expr(search.filters[0], scalar_fields) == (
+        f'metadata["matter"] == "m" and (doc_id == "B" or id in [{", ".join(map(str, borrowed))}])'
+    )
+
+
+def test_chunks_of_a_deleted_document_do_not_match_its_filename(rag_engine, shared_documents):
+    """A's chunks keep a.pdf as their stored filename after A is deleted, while B still uses them"""
+    rag_engine.delete_document("A")
+    rag_engine.upload_and_index_document(file_bytes=make_pdf([clause(7)]), file_type="pdf",
+                                         filename="a.pdf", doc_id="C")
+
+    results = rag_engine.search_similar_chunks("termination notice", top_k=100,
+                                               filter_conditions={"filename": "a.pdf"}, mode="hybrid")
+    assert results
+    assert {result["metadata"]["doc_id"] for result in results} == {"C"}
@@ -0,0 +1,66 @@
+from benchmarks.corpus import make_pdf
+from tests.test_deduplication import clause
+
+
+def test_sparse_pages_are_ocrd_as_the_pages_stream(monkeypatch):
+    from app.features.chat_pdf.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor(chunk_tokens=40, chunk_overlap_tokens=0, token_model="text-embedding-3-small",
+                                  ocr_workers=1, ocr_page_batch_size=2)
+    # Pages 1-2 have text, 3-12 are scans, with text on every third page after that
+    texts = [clause(1), clause(2)] + ["" if page % 3 else clause(page) for page in range(3, 31)]
+    extracted = []
+    iter_pdf_pages = processor.iter_pdf_pages
+
+    def tracked(file_path=None, file_bytes=None):
+        for page in iter_pdf_pages(file_path, file_bytes):
+            extracted.append(page[0])
+            yield page
+
+    ocr_calls = []
+
+    def ocr_pages(page_numbers, file_path=None, file_bytes=None):
+        ocr_calls.append((list(page_numbers), len(extracted)))
+        return {page_num: clause(page_num) for page_num in page_numbers}
+
+    monkeypatch.setattr(processor, "iter_pdf_pages", tracked)
+    monkeypatch.setattr(processor, "ocr_pages", ocr_pages)
+    chunks = processor.process_pdf(file_bytes=make_pdf(texts))
+
+    sparse = [page for page, text in enumerate(texts, start=1) if not text]
+    assert [page for pages, _ in ocr_calls for page in pages] == sparse
+    # Each batch is OCR'd once its pages are read, not after the whole document
+    for pages, pages_read in ocr_calls:
+        assert pages_read <= pages[-1] + 1
+    assert max(len(pages) for pages, _ in ocr_calls) == 2
+
+    # Every page, OCR'd or not, reaches the chunks in page order
+    assert [chunk["metadata"]["page"] for chunk in chunks] == sorted(chunk["metadata"]["page"] for chunk in chunks)
+    assert {chunk["metadata"]["page"] for chunk in chunks} == set(range(1, 31))
+    processor.close()
+
+
+def test_chunks_are_yielded_as_the_pages_are_read(monkeypatch):
+    from app.features.chat_pdf.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor(chunk_tokens=40, chunk_overlap_tokens=0, token_model="text-embedding-3-small",
+                                  ocr_workers=1)
+    pdf = make_pdf([clause(page) for page in range(1, 21)])
+    extracted = []
+    iter_pdf_pages = processor.iter_pdf_pages
+
+    def tracked(file_path=None, file_bytes=None):
+        for page in iter_pdf_pages(file_path, file_bytes):
+            extracted.append(page[0])
+            yield page
+
+    monkeypatch.setattr(processor, "iter_pdf_pages", tracked)
+    chunks = processor.iter_file_chunks(file_bytes=pdf, file_type="pdf")
+    first = next(chunks)
+
+    assert first["metadata"]["page"] == 1
+    assert len(extracted) < 20
+    rest = list(chunks)
+    assert [chunk["metadata"]["chunk_index"] for chunk in [first] + rest] == list(range(len(rest) + 1))
+    assert "total_chunks" not in first["metadata"]
+    processor.close()
@@ -0,0 +1,118 @@
+import asyncio
+import types
+import pytest
+from app.core.embedding_scheduler import EmbeddingScheduler
+
+
+class Embeddings:
+    """client.embeddings whose requests take `latency` seconds; "bad" inputs fail at once"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.started = 0
+        self.completed = 0
+
+    async def create(self, input, model, **kwargs):
+        self.started += 1
+        if "bad" in input:
+            raise RuntimeError("permanent failure")
+        await asyncio.sleep(self.latency)
+        self.completed += 1
+        data = [types.SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(input)]
+        return types.SimpleNamespace(data=data, usage=None)
+
+
+def scheduler(**kwargs) -> EmbeddingScheduler:
+    return EmbeddingScheduler("text-embedding-3-small", **{"max_batch_items": 1, "base_backoff": 0.0, **kwargs})
+
+
+def test_permanent_failure_cancels_the_other_batches():
+    embeddings = Embeddings()
+    client = types.SimpleNamespace(embeddings=embeddings)
+
+    async def run():
+        with pytest.raises(RuntimeError, match="permanent failure"):
+            await scheduler(concurrency=2).aembed(["a", "bad"] + ["c"] * 10, client)
+        # Long enough for every batch to have run, had they not been cancelled
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    # The two in flight, and at most one that took the failed batch's slot before it was cancelled
+    assert embeddings.started <= 3
+    assert embeddings.completed == 0
+
+
+def rate_limit_error(retry_after=None):
+    import httpx
+    import openai
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "http://api/embeddings"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_limiter_halves_when_rate_limited_and_grows_back_per_success():
+    from app.core.embedding_scheduler import _AdaptiveLimiter
+
+    async def run():
+        limiter = _AdaptiveLimiter(8)
+        for _ in range(3):
+            await limiter.acquire()
+        await limiter.release(rate_limited=True)
+        assert limiter.limit == 4
+        await limiter.release(rate_limited=True)
+        await limiter.release(rate_limited=True)
+        assert limiter.limit == 1
+
+        await limiter.acquire()
+        # At the limit, a second request waits until the first is released
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await limiter.release(succeeded=True)
+        await asyncio.wait_for(waiting, 1)
+        assert limiter.limit == 2
+        for _ in range(10):
+            await limiter.release(succeeded=True)
+            await limiter.acquire()
+        assert limiter.limit == 8
+
+    asyncio.run(run())
+
+
+def test_backoff_is_jittered_and_honours_retry_after():
+    embedder = scheduler(base_backoff=0.5, max_backoff=4.0)
+    for attempt in range(8):
+        delay = embedder._backoff_delay(attempt, rate_limit_error())
+        assert 0 <= delay <= min(4.0, 0.5 * 2 ** attempt)
+    assert 2.0 <= embedder._backoff_delay(0, rate_limit_error("2")) <= 2.5
+    assert 4.0 <= embedder._backoff_delay(0, rate_limit_error("60")) <= 4.5
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """Rate limits the first `failures` requests, then answers"""
+
+    def __init__(self, failures: int):
+        super().__init__(latency=0.0)
+        self.failures = failures
+
+    async def create(self, input, model, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            self.started += 1
+            raise rate_limit_error()
+        return await super().create(input, model, **kwargs)
+
+
+def test_rate_limited_batches_are_retried_until_max_retries():
+    embeddings = RateLimitedEmbeddings(failures=3)
+    client = types.SimpleNamespace(embeddings=embeddings)
+    texts = ["a", "bb", "ccc"]
+    assert asyncio.run(scheduler(max_retries=3).aembed(texts, client)) == [[1.0], [2.0], [3.0]]
+    assert embeddings.started == 6
+
+    import openai
+    embeddings = RateLimitedEmbeddings(failures=10)
+    client = types.SimpleNamespace(embeddings=embeddings)
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(scheduler(max_retries=2).aembed(["a"], client))
+    assert embeddings.started == 3
@@ -0,0 +1,44 @@
+import asyncio
+import types
+from app.core.embedding_cache import EmbeddingCache
+from app.core.embeddings import AsyncEmbeddingGenerator, EmbeddingGenerator
+
+
+class Embeddings:
+    """client.embeddings that records each request's input and answers out of order, as the API may"""
+
+    def __init__(self):
+        self.inputs = []
+
+    def respond(self, input, model, **kwargs):
+        self.inputs.append(list(input))
+        data = [types.SimpleNamespace(index=i, embedding=[float(len(text)), float(i)]) for i, text in enumerate(input)]
+        return types.SimpleNamespace(data=data[::-1], usage=types.SimpleNamespace(total_tokens=len(input)))
+
+    def create(self, **kwargs):
+        return self.respond(**kwargs)
+
+
+class AsyncEmbeddings(Embeddings):
+    async def create(self, **kwargs):
+        return self.respond(**kwargs)
+
+
+def test_sync_and_async_query_embeddings_share_the_cache():
+    sync_embeddings, async_embeddings = Embeddings(), AsyncEmbeddings()
+    generator = EmbeddingGenerator("text-embedding-3-small", cache=EmbeddingCache(),
+                                   client=types.SimpleNamespace(embeddings=sync_embeddings))
+    async_generator = AsyncEmbeddingGenerator(generator, types.SimpleNamespace(embeddings=async_embeddings))
+
+    first = generator.generate_query_embeddings(["notice", "term", "notice"])
+    # Repeats are embedded once, and each query gets its own embedding whatever the response order
+    assert sync_embeddings.inputs == [["notice", "term"]]
+    assert first == [[6.0, 0.0], [4.0, 1.0], [6.0, 0.0]]
+
+    second = asyncio.run(async_generator.generate_query_embeddings(["term", "indemnity", "indemnity"]))
+    assert async_embeddings.inputs == [["indemnity"]]
+    assert second == [[4.0, 1.0], [9.0, 0.0], [9.0, 0.0]]
+
+    assert generator.generate_query_embedding("indemnity") == [9.0, 0.0]
+    assert asyncio.run(async_generator.generate_query_embedding("notice")) == [6.0, 0.0]
+    assert len(sync_embeddings.inputs) == len(async_embeddings.inputs) == 1
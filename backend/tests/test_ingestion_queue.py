@@ -0,0 +1,29 @@
+import time
+import types
+from benchmarks.corpus import make_pdf
+from tests.test_deduplication import clause
+
+
+def test_jobs_are_reported_by_every_worker(rag_engine, tmp_path):
+    from app.core.document_registry import DocumentRegistry
+    from app.features.chat_pdf.ingestion_queue import IngestionQueue
+
+    path = str(tmp_path / "registry.sqlite3")
+    rag_engine.document_registry = DocumentRegistry(path)
+    queue = IngestionQueue(rag_engine, max_workers=1)
+    # Another worker process: its own queue over the same registry file, running nothing
+    other = IngestionQueue(types.SimpleNamespace(document_registry=DocumentRegistry(path)), max_workers=1)
+
+    job = queue.submit(file_bytes=make_pdf([clause(1), clause(2)]), file_type="pdf", filename="a.pdf")
+    deadline = time.time() + 30
+    while job.status not in ("completed", "failed") and time.time() < deadline:
+        time.sleep(0.05)
+    queue.shutdown()
+
+    seen = other.get_job(job.job_id)
+    assert seen.status == "completed"
+    assert seen.to_dict() == job.to_dict()
+    assert [j.job_id for j in other.list_jobs()] == [job.job_id]
+    assert other.list_jobs(all_workers=False) == []
+    assert other.get_job("missing") is None
+    other.shutdown()
@@ -0,0 +1,86 @@
+import pytest
+from benchmarks.corpus import make_pdf
+from app.features.chat_pdf.lexical_index import BM25Index
+from tests.test_deduplication import clause
+
+
+def add(index, ids):
+    index.add_many(ids, [f"clause {i} governing law of state{i}" for i in ids],
+                   [{"doc_id": f"d{i}"} for i in ids])
+
+
+def log_lines(path) -> int:
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+def test_log_is_compacted_once_most_entries_are_dead(tmp_path):
+    path = str(tmp_path / "lexical.jsonl")
+    index = BM25Index(path, compact_min_entries=10)
+    other = BM25Index(path, compact_min_entries=10)
+    add(index, list(range(10)))
+    index.remove_many([0, 1, 2])
+    assert log_lines(path) == 11
+
+    # Another process's removal leaves 8 of 12 entries dead, so it rewrites the log as the live chunks
+    other.remove_many([3, 4, 5])
+    assert log_lines(path) == 4
+    for reader in (index, other, BM25Index(path)):
+        assert len(reader) == 4
+        assert sorted(hit["id"] for hit in reader.search("state9 state8 state3", top_k=5)) == [8, 9]
+
+    add(index, [10])
+    assert len(other) == 5
+    assert other.search("state10")[0]["metadata"] == {"doc_id": "d10"}
+
+
+def test_reciprocal_rank_fusion_favours_results_both_lists_rank():
+    from app.features.chat_pdf.lexical_index import reciprocal_rank_fusion
+
+    vector = [{"id": 1, "text": "a"}, {"id": 2, "text": "b"}, {"id": 3, "text": "c"}]
+    lexical = [{"id": 3, "text": "c"}, {"id": 4, "text": "d"}, {"id": 1, "text": "a"}]
+    fused = reciprocal_rank_fusion([vector, lexical], top_k=3, k=60)
+
+    # 1 and 3 tie, each ranked first and third, and keep the order they were first seen in
+    assert [result["id"] for result in fused] == [1, 3, 2]
+    assert [result["score"] for result in fused] == pytest.approx([1 / 61 + 1 / 63, 1 / 61 + 1 / 63, 1 / 62])
+
+
+def test_citations_and_phrases_must_appear_verbatim():
+    index = BM25Index()
+    index.add_many([1, 2, 3], [
+        "Termination under section 12.3(b) requires thirty days notice.",
+        "Section 12.4 covers termination for convenience with notice.",
+        "The Confidential Information survives termination of this agreement.",
+    ], [{}, {}, {}])
+
+    assert [hit["id"] for hit in index.search("termination under 12.3(b)")] == [1]
+    # 12.3(b) also indexes its base number, so a query for the section finds its subsections
+    assert [hit["id"] for hit in index.search("section 12.3")] == [1]
+    assert [hit["id"] for hit in index.search('"confidential information" termination')] == [3]
+    assert {hit["id"] for hit in index.search("termination notice")} == {1, 2, 3}
+
+
+@pytest.fixture
+def indexed(rag_engine):
+    text = " ".join(f"Section 14.2 item {i} caps liability at the fees paid in the prior year." for i in range(14))
+    rag_engine.upload_and_index_document(file_bytes=make_pdf([text, clause(1)]), file_type="pdf",
+                                         filename="msa.pdf", doc_id="MSA")
+    return rag_engine
+
+
+def test_auto_mode_answers_citations_lexically_without_an_embedding(indexed):
+    response = indexed.search_chunks("Section 14.2 liability cap", top_k=3, mode="auto")
+
+    assert response["mode"] == "lexical"
+    assert "embedding" not in response["timings_ms"]
+    assert all("14.2" in result["text"] for result in response["results"])
+
+
+def test_auto_mode_falls_back_from_citations_the_index_lacks(indexed):
+    assert indexed.search_chunks("Section 99.9 termination", top_k=3, mode="auto")["mode"] == "vector"
+
+    response = indexed.search_chunks("termination notice period", top_k=3, mode="auto")
+    assert response["mode"] == "hybrid"
+    assert {"lexical", "embedding", "vector", "fusion"} <= set(response["timings_ms"])
+    assert len(response["results"]) == 3
@@ -0,0 +1,32 @@
+import types
+import pytest
+from benchmarks.fake_milvus import FakeMilvusServer
+
+
+def test_int8_vectors_are_created_as_int8_vector_fields():
+    from app.core.clients import MilvusConnectionPool
+    from app.core.milvus_client import MilvusManager
+    from pymilvus import DataType
+
+    store = MilvusManager(pool=MilvusConnectionPool(FakeMilvusServer(latency=0.0).client, size=1),
+                          dimension=8, index_type="HNSW", vector_type="int8")
+    assert store.vector_datatype == DataType.INT8_VECTOR
+
+
+def test_int8_vectors_are_refused_when_pymilvus_lacks_them(monkeypatch):
+    from app.core import milvus_client
+
+    # DataType as in pymilvus releases before INT8_VECTOR
+    monkeypatch.setattr(milvus_client, "DataType", types.SimpleNamespace(
+        FLOAT_VECTOR=milvus_client.DataType.FLOAT_VECTOR, FLOAT16_VECTOR=milvus_client.DataType.FLOAT16_VECTOR
+    ))
+    with pytest.raises(ValueError, match="INT8_VECTOR"):
+        milvus_client.MilvusManager(dimension=8, index_type="HNSW", vector_type="int8")
+
+
+@pytest.mark.parametrize("index_type", ["AUTOINDEX", "IVF_FLAT"])
+def test_int8_vectors_are_refused_without_an_hnsw_index(index_type):
+    from app.core.milvus_client import MilvusManager
+
+    with pytest.raises(ValueError, match=f"needs MILVUS_INDEX_TYPE HNSW, not {index_type}"):
+        MilvusManager(dimension=8, index_type=index_type, vector_type="int8")
@@ -0,0 +1,75 @@
+import os
+import numpy as np
+from app.core.numpy_store import NumpyVectorStore
+
+DIMENSION = 8
+
+
+def vectors(count: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(count, DIMENSION)).astype(np.float32)
+
+
+def insert(store, matrix, offset: int = 0):
+    return store.insert_documents(matrix, [f"chunk {offset + i}" for i in range(len(matrix))],
+                                  [{"doc_id": f"d{(offset + i) % 3}"} for i in range(len(matrix))])["ids"]
+
+
+def test_tombstones_are_compacted_away_keeping_ids(tmp_path):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, dimension=DIMENSION, initial_capacity=4, compact_min_rows=4)
+    matrix = vectors(10)
+    ids = insert(store, matrix)
+    store.delete(ids[:5])
+    assert store._count == 10  # Half deleted: not past the ratio yet
+
+    store.delete([ids[5], ids[9]])
+    assert store._count == 3
+    assert store._vectors.shape[0] == 4
+    with open(os.path.join(path, "records.jsonl")) as f:
+        assert sum(1 for _ in f) == 4  # next_id and the three live rows
+
+    for reopened in (store, NumpyVectorStore(path, dimension=DIMENSION)):
+        for i in (6, 7, 8):
+            hit = reopened.search(matrix[i], top_k=1)[0]
+            assert (hit["id"], hit["entity"]["text"]) == (ids[i], f"chunk {i}")
+        hits = reopened.search(matrix[0], top_k=5, filter_conditions={"doc_id": "d0"})
+        assert [hit["id"] for hit in hits] == [ids[6]]
+        assert reopened.get_collection_stats()["document_count"] == 3
+
+    # The last id was deleted and compacted away, but is never handed out again
+    assert insert(store, vectors(1, seed=1), offset=10) == [ids[-1] + 1]
+
+
+def test_interrupted_compaction_is_finished_on_load(tmp_path, monkeypatch):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, dimension=DIMENSION, compact_min_rows=2)
+    matrix = vectors(4)
+    ids = insert(store, matrix)
+    # The process dies once both compacted files are written, before either is swapped in
+    monkeypatch.setattr(NumpyVectorStore, "_finish_compaction", lambda self: None)
+    store.delete(ids[:3])
+    monkeypatch.undo()
+
+    reopened = NumpyVectorStore(path, dimension=DIMENSION)
+    assert reopened._count == 1
+    assert reopened.search(matrix[3], top_k=1)[0]["id"] == ids[3]
+
+
+def test_deleted_rows_stay_hidden_after_a_reload(tmp_path):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, dimension=DIMENSION, initial_capacity=2)
+    matrix = vectors(6)
+    ids = insert(store, matrix)
+    assert store.delete([ids[0], ids[3], 999]) == 2
+
+    for reopened in (store, NumpyVectorStore(path, dimension=DIMENSION)):
+        assert reopened.get_collection_stats()["document_count"] == 4
+        # The nearest rows to deleted vectors are other rows
+        assert reopened.search(matrix[0], top_k=1)[0]["id"] != ids[0]
+        assert {hit["id"] for hit in reopened.search(matrix[0], top_k=10)} == set(ids) - {ids[0], ids[3]}
+        hits = reopened.search(matrix[3], top_k=10, filter_conditions={"doc_id": "d0"})
+        assert [hit["id"] for hit in hits] == []
+        hits = reopened.search(matrix[1], top_k=10, filter_conditions={"id": (ids[0], ids[1])})
+        assert [hit["id"] for hit in hits] == [ids[1]]
+        # Rows grew past the initial capacity and were reloaded in place
+        assert reopened.search(matrix[5], top_k=1)[0]["entity"]["text"] == "chunk 5"
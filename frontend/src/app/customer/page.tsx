@@ -96,6 +96,8 @@ export default function CustomerPage() {
   const [filePreviewUrl, setFilePreviewUrl] = useState<string | null>(null);
   const [showInitialGreeting, setShowInitialGreeting] = useState(true);
   const [activeChat, setActiveChat] = useState<string | null>(null);
+  // Conversation id the backend returns with the first reply; sent back to continue the conversation
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const [chatHistory, setChatHistory] = useState<
     { id: string; title: string; date: string; preview?: string }[]
   >([]);
@@ -172,7 +174,7 @@ export default function CustomerPage() {
           headers: {
             "Content-Type": "application/json",
           },
-          body: JSON.stringify({ message: userMessage.text }),
+          body: JSON.stringify({ message: userMessage.text, session_id: sessionId ?? undefined }),
         });
 
         if (!response.ok) {
@@ -180,6 +182,7 @@ export default function CustomerPage() {
         }
 
         const data = await response.json();
+        setSessionId(data.session_id ?? null);
         const botMessage: Message = { 
           text: data.reply, 
           sender: "bot",
@@ -291,7 +294,7 @@ export default function CustomerPage() {
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify({ message: question }),
+        body: JSON.stringify({ message: question, session_id: sessionId ?? undefined }),
       });
 
       if (!response.ok) {
@@ -299,6 +302,7 @@ export default function CustomerPage() {
       }
 
       const data = await response.json();
+      setSessionId(data.session_id ?? null);
       const botMessage: Message = { 
         text: data.reply, 
         sender: "bot",
@@ -326,6 +330,7 @@ export default function CustomerPage() {
     setShowInitialGreeting(true);
     setActiveChat(null);
     setIsDocumentAnalysisMode(false);
+    setSessionId(null);
   };
 
   const handleDocumentAnalysisClick = () => {
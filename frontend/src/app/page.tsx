@@ -100,6 +100,8 @@ export default function Home() {
   const [filePreviewUrl, setFilePreviewUrl] = useState<string | null>(null);
   const [showInitialGreeting, setShowInitialGreeting] = useState(true);
   const [activeChat, setActiveChat] = useState<string | null>(null);
+  // Conversation id the backend returns with the first reply; sent back to continue the conversation
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const [chatHistory, setChatHistory] = useState<
     { id: string; title: string; date: string; preview?: string }[]
   >([]);
@@ -177,7 +179,7 @@ export default function Home() {
           headers: {
             "Content-Type": "application/json",
           },
-          body: JSON.stringify({ message: userMessage.text }),
+          body: JSON.stringify({ message: userMessage.text, session_id: sessionId ?? undefined }),
         });
 
         if (!response.ok) {
@@ -185,6 +187,7 @@ export default function Home() {
         }
 
         const data = await response.json();
+        setSessionId(data.session_id ?? null);
         const botMessage: Message = { 
           text: data.reply, 
           sender: "bot",
@@ -296,7 +299,7 @@ export default function Home() {
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify({ message: question }),
+        body: JSON.stringify({ message: question, session_id: sessionId ?? undefined }),
       });
 
       if (!response.ok) {
@@ -304,6 +307,7 @@ export default function Home() {
       }
 
       const data = await response.json();
+      setSessionId(data.session_id ?? null);
       const botMessage: Message = { 
         text: data.reply, 
         sender: "bot",
@@ -331,6 +335,7 @@ export default function Home() {
     setShowInitialGreeting(true);
     setActiveChat(null);
     setIsDocumentAnalysisMode(false);
+    setSessionId(null);
   };
 
   const handleDocumentAnalysisClick = () => {
@@ -27,6 +27,26 @@ export default function ChatWithPDF() {
   const [uploading, setUploading] = useState(false);
   const fileInputRef = useRef<HTMLInputElement>(null);
   const [stats, setStats] = useState<any>(null);
+  // Conversation id the backend returns with the first reply; sent back to continue the conversation
+  const [sessionId, setSessionId] = useState<string | null>(null);
+
+  // Uploads are indexed in the background; poll the job until it finishes
+  const waitForJob = async (jobId: string) => {
+    while (true) {
+      const response = await fetch(`http://localhost:8000/v1/api/jobs/${jobId}`);
+      if (!response.ok) {
+        throw new Error('Failed to get indexing status');
+      }
+      const job = await response.json();
+      if (job.status === 'completed') {
+        return job;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.message || 'Indexing failed');
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  };
 
   const handleFileUpload = async (event: React.ChangeEvent<HTMLInputElement>) => {
     const file = event.target.files?.[0];
@@ -78,7 +98,8 @@ export default function ChatWithPDF() {
         throw new Error('Upload failed');
       }
 
-      const data = await response.json();
+      const upload = await response.json();
+      const data = await waitForJob(upload.job_id);
       setUploadedFiles([...uploadedFiles, { name: data.filename, chunks: data.chunks_count }]);
       
       // Add system message
@@ -115,7 +136,7 @@ export default function ChatWithPDF() {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ message: userMessage }),
+        body: JSON.stringify({ message: userMessage, session_id: sessionId ?? undefined }),
       });
 
       if (!response.ok) {
@@ -123,6 +144,7 @@ export default function ChatWithPDF() {
       }
 
       const data = await response.json();
+      setSessionId(data.session_id ?? null);
       setMessages(prev => [...prev, { role: 'assistant', content: data.reply }]);
     } catch (error) {
       console.error('Chat error:', error);
@@ -145,6 +167,7 @@ export default function ChatWithPDF() {
         setUploadedFiles([]);
         setMessages([]);
         setStats(null);
+        setSessionId(null);
       }
     } catch (error) {
       console.error('Clear error:', error);